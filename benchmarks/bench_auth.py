@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""
+Load testing the authorization app with a stub identity provider
+
+The app and the stub provider run in their own processes on local ports,
+the app with a fresh database and any number of worker processes sharing
+its port. Simulated users run the whole login flow concurrently and then
+load the logged-in index page. Every request is timed per route, and the
+app workers report how long writers waited for the SQLite lock.
+
+Run from the repository root:
+    python -m benchmarks.bench_auth --output bench_auth.json
+    python -m benchmarks.bench_auth --baseline bench_auth.json
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+from benchmarks import harness
+from benchmarks.harness import add_baseline_arguments, finish, percentiles
+from tests.projects.authorization.stub_idp import QuietRequestHandler, StubIdentityProvider
+
+HOST = "127.0.0.1"
+ROUTES = ("/login", "/authorize", "/login/callback", "/")
+
+
+def _run_provider(conn) -> None:
+    """Serve the stub provider until asked to stop, then send its request counts"""
+    with StubIdentityProvider(HOST) as provider:
+        conn.send((provider.discovery_url, provider.client_id, provider.client_secret))
+        conn.recv()
+        conn.send(dict(provider.requests))
+
+
+def _bind(port: int) -> socket.socket:
+    """Socket bound to a port shared with the other workers"""
+    sckt = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sckt.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sckt.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sckt.bind((HOST, port))
+    return sckt
+
+
+def _run_app(port: int, database: str, secret_key: bytes, provider: tuple, conn) -> None:
+    """Serve the app on the shared port until asked to stop, then send its stats"""
+    os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
+    # Imported here so that the environment is set first
+    from werkzeug.serving import make_server
+
+    from src.projects.authorization import db, user
+    from src.projects.authorization.app import app, provider_configs, provider_keys
+
+    discovery_url, client_id, client_secret = provider
+    # Session cookies must be valid on whichever worker gets the next request
+    app.secret_key = secret_key
+    app.config.update(
+        DATABASE=database,
+        GOOGLE_DISCOVERY_URL=discovery_url,
+        GOOGLE_CLIENT_ID=client_id,
+        GOOGLE_CLIENT_SECRET=client_secret,
+    )
+    with app.app_context():
+        db.init_db()
+    listener = _bind(port)
+    listener.listen(1024)
+    server = make_server(
+        HOST, port, app, threaded=True, request_handler=QuietRequestHandler, fd=listener.fileno()
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn.send("ready")
+    conn.recv()
+    server.shutdown()
+    conn.send(
+        {
+            "lock_wait": db.lock_waits.as_dict(),
+            "user_cache": {"hits": user.cache.hits, "misses": user.cache.misses},
+            "discovery_fetches": provider_configs.fetches,
+            "jwks_fetches": provider_keys.fetches,
+        }
+    )
+
+
+def simulate_user(
+    app_url: str, login: str, page_views: int, timings: Dict[str, List[float]]
+) -> None:
+    """Log in through the provider like a browser, then load the index page
+
+    :raise: AssertionError or requests.RequestException if a step fails
+    """
+    session = requests.Session()
+
+    def get(route: str, url: str, status: int) -> requests.Response:
+        start = time.perf_counter()
+        response = session.get(url, allow_redirects=False)
+        timings[route].append(time.perf_counter() - start)
+        assert response.status_code == status, f"{route}: {response.status_code}"
+        return response
+
+    authorize_url = get("/login", app_url + "/login", 302).headers["Location"]
+    callback_url = get("/authorize", authorize_url + "&login_hint=" + login, 302).headers[
+        "Location"
+    ]
+    get("/login/callback", callback_url, 302)
+    for _ in range(page_views):
+        assert b"Hello" in get("/", app_url + "/", 200).content
+    session.close()
+
+
+def lock_wait_total(stats: List[dict]) -> dict:
+    """Lock waits summed over the app workers"""
+    total = {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0}
+    for worker in stats:
+        for key in ("count", "total", "timeouts"):
+            total[key] += worker["lock_wait"][key]
+        total["max"] = max(total["max"], worker["lock_wait"]["max"])
+    total["mean"] = total["total"] / total["count"] if total["count"] else 0.0
+    return total
+
+
+def run(users: int, page_views: int, concurrency: int, workers: int) -> dict:
+    """Start the provider and the app workers, run all users, and summarize"""
+    provider_conn, child = multiprocessing.Pipe()
+    provider = multiprocessing.Process(target=_run_provider, args=(child,))
+    provider.start()
+    processes, conns = [provider], []
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            provider_args = provider_conn.recv()
+            # Hold the port until every worker listens on it; only listening
+            # sockets get connections, so the forked copies of this one do not
+            reserved = _bind(0)
+            port = reserved.getsockname()[1]
+            secret_key = os.urandom(24)
+            for _ in range(workers):
+                conn, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_run_app,
+                    args=(
+                        port,
+                        os.path.join(directory, "sqlite_db"),
+                        secret_key,
+                        provider_args,
+                        child,
+                    ),
+                )
+                process.start()
+                processes.append(process)
+                conns.append(conn)
+            for conn in conns:
+                conn.recv()
+            reserved.close()
+
+            app_url = f"http://{HOST}:{port}"
+            timings: Dict[str, List[float]] = defaultdict(list)
+            errors = []
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                futures = [
+                    executor.submit(simulate_user, app_url, f"user{index}", page_views, timings)
+                    for index in range(users)
+                ]
+                for future in futures:
+                    try:
+                        future.result()
+                    except (AssertionError, requests.RequestException) as err:
+                        errors.append(str(err))
+            elapsed = time.perf_counter() - start
+
+            for conn in conns + [provider_conn]:
+                conn.send("stop")
+            stats = [conn.recv() for conn in conns]
+            provider_requests = provider_conn.recv()
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
+
+    logins = len(timings["/login/callback"])
+    return {
+        "users": users,
+        "workers": workers,
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "logins_per_sec": logins / elapsed,
+        "requests_per_sec": sum(len(samples) for samples in timings.values()) / elapsed,
+        "routes": {
+            route: dict(percentiles(timings[route]), count=len(timings[route]))
+            for route in ROUTES
+        },
+        "lock_wait": lock_wait_total(stats),
+        "user_cache": {
+            key: sum(worker["user_cache"][key] for worker in stats) for key in ("hits", "misses")
+        },
+        "discovery_fetches": sum(worker["discovery_fetches"] for worker in stats),
+        "jwks_fetches": sum(worker["jwks_fetches"] for worker in stats),
+        "provider_requests": provider_requests,
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """List metrics that got more than `tolerance` worse than the baseline
+
+    The overall rates are compared as the "total" case, the latencies by route.
+    """
+    return harness.compare(
+        {"total": result, **result["routes"]},
+        {"total": baseline, **baseline["routes"]},
+        tolerance,
+        higher=("logins_per_sec", "requests_per_sec"),
+        lower=("p99",),
+    )
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="login flows to run")
+    parser.add_argument("--page-views", type=int, default=10, help="index loads per user")
+    parser.add_argument("--concurrency", type=int, default=32, help="simultaneous users")
+    parser.add_argument("--workers", type=int, default=1, help="app processes")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    result = run(args.users, args.page_views, args.concurrency, args.workers)
+    print(
+        f"{result['users']} users, {args.workers} workers, {args.concurrency} concurrent: "
+        f"{result['logins_per_sec']:.1f} logins/s, {result['requests_per_sec']:.0f} req/s, "
+        f"{result['errors']} errors"
+    )
+    for error in result["first_errors"]:
+        print(f"  error: {error}")
+    for route in ROUTES:
+        latency = result["routes"][route]
+        if latency["count"]:
+            print(
+                f"  {route:<16} {latency['count']:>7}  p50 {latency['p50']:7.2f} ms  "
+                f"p90 {latency['p90']:7.2f} ms  p99 {latency['p99']:7.2f} ms  "
+                f"max {latency['max']:7.2f} ms"
+            )
+    lock_wait = result["lock_wait"]
+    print(
+        f"  SQLite lock wait: {lock_wait['count']} writes, total {lock_wait['total'] * 1000:.1f} ms, "
+        f"mean {lock_wait['mean'] * 1e6:.0f} us, max {lock_wait['max'] * 1000:.2f} ms, "
+        f"{lock_wait['timeouts']} timeouts"
+    )
+    print(
+        f"  user cache {result['user_cache']['hits']} hits / "
+        f"{result['user_cache']['misses']} misses, "
+        f"{result['discovery_fetches']} discovery and {result['jwks_fetches']} JWKS fetches"
+    )
+    finish(args, result, compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""
+Benchmarking the ciphers and the VPN record layer over growing inputs
+
+Every case encrypts or decrypts one input per call, from 1 KB up to 100 MB.
+Calls are repeated for at least `--min-time` seconds to get the per-call
+latencies and the throughput, then one more call runs under tracemalloc to
+get its peak memory. The pure Python ciphers are far too slow for the large
+sizes: once the next size would take longer than `--budget` seconds per
+call, the remaining sizes of that case are skipped.
+
+Run from the repository root:
+    python -m benchmarks.bench_ciphers --output bench_ciphers.json
+    python -m benchmarks.bench_ciphers --baseline bench_ciphers.json
+"""
+
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from Crypto.Cipher import AES
+
+from benchmarks import harness
+from benchmarks.harness import add_baseline_arguments, finish, percentiles
+from src.projects.a51 import a51_cipher
+from src.projects.caesar import caesar_cipher
+from src.projects.knapsack import knapsack_cipher
+from src.projects.vpn.record import GCMRecordLayer, RecordLayer
+from src.projects.vpn.transfer import CHUNK_SIZE
+
+SIZES = {
+    "1KB": 10 ** 3,
+    "10KB": 10 ** 4,
+    "100KB": 10 ** 5,
+    "1MB": 10 ** 6,
+    "10MB": 10 ** 7,
+    "100MB": 10 ** 8,
+}
+TEXT = b"The quick brown fox jumps over the lazy dog, then naps. "
+A51_SECRET = "martin"
+SHIFT = 3
+KEY = b"49094793659111181547021843208480"
+IV = b"7a0b2d6c4f8e9a1d"
+# Input and output files of the file cases, removed at exit
+SCRATCH = tempfile.TemporaryDirectory(prefix="bench_ciphers_")
+
+
+def sample_text(size: int) -> str:
+    """Printable ASCII text of `size` characters"""
+    return (TEXT * (size // len(TEXT) + 1))[:size].decode("ascii")
+
+
+def knapsack_keys() -> tuple:
+    """Fixed 64-item knapsack key pair, (sik, n, m, gk)"""
+    state = random.getstate()
+    random.seed(0)
+    sik = knapsack_cipher.generate_sik()
+    random.setstate(state)
+    n = knapsack_cipher.calculate_n(sik)
+    m = knapsack_cipher.calculate_m(sik, n)
+    return sik, n, m, knapsack_cipher.generate_gk(sik, n, m)
+
+
+def seal_all(layer: RecordLayer, data: bytes) -> List[bytes]:
+    """Records of `data` in transfer-sized chunks"""
+    view = memoryview(data)
+    return [bytes(layer.seal(view[i : i + CHUNK_SIZE])) for i in range(0, len(view), CHUNK_SIZE)]
+
+
+def open_all(layer: RecordLayer, records: List[bytes]) -> int:
+    """Open every record, returning the plaintext length"""
+    return sum(len(layer.open(record)) for record in records)
+
+
+# Each case turns an input size into a function that processes one input of
+# that size per call; everything built outside of it is not measured. The
+# record layer cases set up a new session per call, as a file transfer does
+def a51_encrypt(size: int) -> Callable[[], object]:
+    text = sample_text(size)
+
+    def call():
+        x, y, z = a51_cipher.populate_registers(A51_SECRET)
+        return a51_cipher.encrypt(text, a51_cipher.generate_keystream(text, x, y, z))
+
+    return call
+
+
+def knapsack_encrypt(size: int) -> Callable[[], object]:
+    text = sample_text(size)
+    gk = knapsack_keys()[3]
+    return lambda: knapsack_cipher.encrypt(text, gk)
+
+
+def knapsack_decrypt(size: int) -> Callable[[], object]:
+    sik, n, m, gk = knapsack_keys()
+    ciphertext = knapsack_cipher.encrypt(sample_text(size), gk)
+    return lambda: knapsack_cipher.decrypt(ciphertext, sik, n, m)
+
+
+def caesar_encrypt(size: int) -> Callable[[], object]:
+    text = sample_text(size)
+    return lambda: caesar_cipher.encrypt(text, SHIFT)
+
+
+def caesar_decrypt(size: int) -> Callable[[], object]:
+    cipher = caesar_cipher.encrypt(sample_text(size), SHIFT)
+    return lambda: caesar_cipher.decrypt(cipher, SHIFT)
+
+
+def caesar_encrypt_file(size: int) -> Callable[[], object]:
+    file_in = f"{SCRATCH.name}/plain_{size}"
+    with open(file_in, "w", encoding="ascii") as file_out:
+        file_out.write(sample_text(size))
+    return lambda: caesar_cipher.encrypt_file(file_in, f"{SCRATCH.name}/cipher", SHIFT)
+
+
+def record_cbc_seal(size: int) -> Callable[[], object]:
+    data = sample_text(size).encode("ascii")
+    return lambda: seal_all(RecordLayer(AES, KEY, IV), data)
+
+
+def record_cbc_open(size: int) -> Callable[[], object]:
+    records = seal_all(RecordLayer(AES, KEY, IV), sample_text(size).encode("ascii"))
+    return lambda: open_all(RecordLayer(AES, KEY, IV, initiator=False), records)
+
+
+def record_gcm_seal(size: int) -> Callable[[], object]:
+    data = sample_text(size).encode("ascii")
+    return lambda: seal_all(GCMRecordLayer(KEY, IV, initiator=True), data)
+
+
+def record_gcm_open(size: int) -> Callable[[], object]:
+    records = seal_all(GCMRecordLayer(KEY, IV, initiator=True), sample_text(size).encode("ascii"))
+    return lambda: open_all(GCMRecordLayer(KEY, IV, initiator=False), records)
+
+
+CASES: Dict[str, Callable[[int], Callable[[], object]]] = {
+    "a51-encrypt": a51_encrypt,
+    "knapsack-encrypt": knapsack_encrypt,
+    "knapsack-decrypt": knapsack_decrypt,
+    "caesar-encrypt": caesar_encrypt,
+    "caesar-decrypt": caesar_decrypt,
+    "caesar-encrypt-file": caesar_encrypt_file,
+    "record-aes-cbc-seal": record_cbc_seal,
+    "record-aes-cbc-open": record_cbc_open,
+    "record-aes-gcm-seal": record_gcm_seal,
+    "record-aes-gcm-open": record_gcm_open,
+}
+
+
+def peak_memory(call: Callable[[], object]) -> int:
+    """Peak bytes allocated by one call, not counting what already existed"""
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case: Callable[[int], Callable[[], object]], size: int, min_time: float) -> dict:
+    """Time calls on one input size until `min_time` has passed"""
+    call = case(size)
+    latencies = []
+    start = time.perf_counter()
+    while not latencies or time.perf_counter() - start < min_time:
+        call_start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = sum(latencies)
+    return {
+        "bytes": size,
+        "calls": len(latencies),
+        "bytes_per_sec": size * len(latencies) / elapsed,
+        "latency": percentiles(latencies),
+        "peak_memory": peak_memory(call),
+    }
+
+
+def run(names: List[str], sizes: List[str], min_time: float, budget: float) -> dict:
+    """Run cases over ascending sizes, skipping sizes predicted to exceed `budget`"""
+    sizes = sorted(sizes, key=SIZES.get)
+    results = {}
+    for name in names:
+        results[name] = {}
+        for index, label in enumerate(sizes):
+            result = run_case(CASES[name], SIZES[label], min_time)
+            results[name][label] = result
+            print(
+                f"{name:<20} {label:>6} {result['bytes_per_sec'] / 1e6:>10.2f} MB/s  "
+                f"p50 {result['latency']['p50']:10.3f} ms  "
+                f"peak {result['peak_memory'] / 1e6:8.2f} MB"
+            )
+            if index + 1 < len(sizes):
+                # Time grows linearly with the input in every case
+                predicted = SIZES[sizes[index + 1]] / result["bytes_per_sec"]
+                if predicted > budget:
+                    print(f"{name:<20} skipping {', '.join(sizes[index + 1 :])}")
+                    break
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """List cases slower or using more memory than `tolerance` past the baseline
+
+    Only the case and size pairs measured in both runs are compared.
+    """
+
+    def by_size(results: dict) -> dict:
+        return {
+            f"{name} {label}": result
+            for name, sizes in results.items()
+            for label, result in sizes.items()
+        }
+
+    return harness.compare(
+        by_size(results),
+        by_size(baseline),
+        tolerance,
+        higher=("bytes_per_sec",),
+        lower=("peak_memory",),
+    )
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=list(SIZES))
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per size")
+    parser.add_argument("--budget", type=float, default=10.0, help="longest call in seconds")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    results = run(args.cases, args.sizes, args.min_time, args.budget)
+    finish(args, results, compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""
+Benchmarking the password cracker on fixed wordlist slices
+
+Run from the repository root:
+    python -m benchmarks.bench_cracker --output bench_cracker.json
+    python -m benchmarks.bench_cracker --baseline bench_cracker.json
+"""
+
+import argparse
+from itertools import islice
+
+from benchmarks import harness
+from benchmarks.harness import add_baseline_arguments, finish
+from src.projects.passwords import cracker
+
+WORDLIST = "data/projects/passwords/english.txt"
+
+# (name, hash file, words taken from the top of the wordlist)
+# Slices are sized so each case takes a few seconds on a single core
+CASES = [
+    ("sam-ntlm", "data/projects/passwords/sam", 200000),
+    ("passwd-md5crypt", "data/projects/passwords/passwd", 1000),
+    ("shadow-sha512crypt", "data/projects/passwords/shadow", 100),
+]
+
+
+def run_case(hash_file: str, words: int, workers: int, chunk_size: int) -> dict:
+    """Crack one hash file with a slice of the wordlist and summarize the stats"""
+    stats = cracker.CrackStats()
+    cracker.crack(
+        cracker.load_hashes(hash_file),
+        islice(cracker.read_wordlist(WORDLIST), words),
+        workers=workers,
+        chunk_size=chunk_size,
+        stats=stats,
+        status_interval=0,
+    )
+    summary = stats.as_dict()
+    return {
+        "words": words,
+        "elapsed": summary["elapsed"],
+        "first_crack": summary["first_crack"],
+        "max_queue_depth": summary["queue"]["max"],
+        "rate": sum(counters["rate"] for counters in summary["types"].values()),
+        "worker_rates": {
+            name: counters["rate"] for name, counters in summary["workers"].items()
+        },
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """List cases whose throughput dropped more than `tolerance` below the baseline"""
+    return harness.compare(results, baseline, tolerance, higher=("rate",))
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=cracker.CHUNK_SIZE)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    results = {}
+    for name, hash_file, words in CASES:
+        results[name] = run_case(hash_file, words, args.workers, args.chunk_size)
+        print(
+            f"{name:<20} {results[name]['rate']:>12.0f} c/s  "
+            f"elapsed {results[name]['elapsed']:.2f}s  "
+            f"first crack {results[name]['first_crack']}"
+        )
+    finish(args, results, compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""
+Load testing the VPN server with many simulated clients
+
+Every case runs the server in its own process, restricted to one cipher
+and key size so that negotiation picks it. Simulated clients first run the
+full handshake concurrently, then the encrypted message loop.
+
+Run from the repository root:
+    python -m benchmarks.bench_vpn --output bench_vpn.json
+    python -m benchmarks.bench_vpn --baseline bench_vpn.json
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import Tuple
+
+from benchmarks import harness
+from benchmarks.harness import add_baseline_arguments, finish, percentiles
+from src.projects.vpn import client, server
+from src.projects.vpn.dhpool import DHKeyPool, generate_dh_keypair
+from src.projects.vpn.framing import PROPOSAL, CHOSEN_CIPHER, DHMKE, DATA, TICKET
+from src.projects.vpn.framing import expect, read_frame_async, write_frame
+from src.projects.vpn.record import RecordLayer, new_record_layer
+
+# Every cipher and key size the client can negotiate
+CASES = [
+    (cipher_name, key_size)
+    for cipher_name, key_sizes in client.SUPPORTED_CIPHERS.items()
+    for key_size in key_sizes
+]
+
+
+def _run_server(cipher_name: str, key_size: int, dh_pool: bool, conn) -> None:
+    """Serve on an ephemeral port until SIGTERM, sending the port through `conn`"""
+
+    async def run():
+        stop = asyncio.get_running_loop().create_future()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set_result, None)
+        with ProcessPoolExecutor() as executor:
+            pool = DHKeyPool([key_size], executor=executor) if dh_pool else None
+            handler = partial(
+                server.handle_client,
+                supported={cipher_name: [key_size]},
+                executor=executor,
+                verbose=False,
+                dh_pool=pool,
+            )
+            listener = await asyncio.start_server(handler, "127.0.0.1", 0, backlog=1024)
+            conn.send(listener.sockets[0].getsockname()[1])
+            async with listener:
+                await stop
+            if pool is not None:
+                pool.close()
+
+    asyncio.run(run())
+
+
+async def handshake(port: int, executor: Executor) -> tuple:
+    """Connect and run the full handshake like `client.negotiate`
+
+    :return: (reader, writer, record layer, (cipher_name, key_size)) tuple
+    """
+    loop = asyncio.get_running_loop()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    proposal = client.generate_cipher_proposal(client.SUPPORTED_CIPHERS)
+    write_frame(writer, PROPOSAL, proposal.encode())
+    msg_in = expect(await read_frame_async(reader), CHOSEN_CIPHER).decode("utf-8")
+    cipher_name, key_size = client.parse_cipher_selection(msg_in)
+    client_diffiehellman = await loop.run_in_executor(executor, generate_dh_keypair, key_size)
+    write_frame(
+        writer, DHMKE, client.generate_dhm_request(client_diffiehellman.public_key).encode()
+    )
+    dhm_in = expect(await read_frame_async(reader), DHMKE).decode("utf-8")
+    client_diffiehellman = await loop.run_in_executor(
+        executor,
+        server.generate_dh_secret,
+        client_diffiehellman,
+        client.parse_dhm_response(dhm_in),
+    )
+    expect(await read_frame_async(reader), TICKET)
+    shared_key = client_diffiehellman.shared_key
+    record = new_record_layer(
+        cipher_name, *client.get_key_and_iv(shared_key, cipher_name, key_size), initiator=True
+    )
+    return reader, writer, record, (cipher_name, key_size)
+
+
+async def message_loop(reader, writer, record: RecordLayer, messages: int, size: int) -> tuple:
+    """Send messages one at a time and time each round trip
+
+    :return: (latencies, bytes sent and received) tuple
+    """
+    message = b"x" * size
+    latencies = []
+    transferred = 0
+    for _ in range(messages):
+        start = time.perf_counter()
+        sealed = record.seal(message)
+        write_frame(writer, DATA, sealed)
+        await writer.drain()
+        reply = expect(await read_frame_async(reader), DATA)
+        latencies.append(time.perf_counter() - start)
+        transferred += len(sealed) + len(reply)
+    writer.close()
+    return latencies, transferred
+
+
+async def load(port: int, clients: int, messages: int, size: int, executor: Executor) -> dict:
+    """Run all clients against a running server and summarize"""
+
+    async def timed_handshake():
+        start = time.perf_counter()
+        connection = await handshake(port, executor)
+        return connection, time.perf_counter() - start
+
+    start = time.perf_counter()
+    handshakes = await asyncio.gather(*(timed_handshake() for _ in range(clients)))
+    handshake_elapsed = time.perf_counter() - start
+    negotiated = {connection[3] for connection, _ in handshakes}
+
+    start = time.perf_counter()
+    loops = await asyncio.gather(
+        *(message_loop(*connection[:3], messages, size) for connection, _ in handshakes)
+    )
+    loop_elapsed = time.perf_counter() - start
+
+    latencies = [latency for samples, _ in loops for latency in samples]
+    transferred = sum(total for _, total in loops)
+    return {
+        "negotiated": sorted(f"{cipher_name}{key_size}" for cipher_name, key_size in negotiated),
+        "clients": clients,
+        "messages": len(latencies),
+        "handshake_elapsed": handshake_elapsed,
+        "loop_elapsed": loop_elapsed,
+        "handshakes_per_sec": clients / handshake_elapsed,
+        "messages_per_sec": len(latencies) / loop_elapsed,
+        "bytes_per_sec": transferred / loop_elapsed,
+        "handshake_latency": percentiles([elapsed for _, elapsed in handshakes]),
+        "message_latency": percentiles(latencies),
+    }
+
+
+def run_case(
+    cipher_name: str, key_size: int, clients: int, messages: int, size: int, dh_pool: bool
+) -> dict:
+    """Start a server restricted to one cipher and load it"""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_run_server, args=(cipher_name, key_size, dh_pool, child)
+    )
+    process.start()
+    try:
+        port = parent.recv()
+        with ProcessPoolExecutor() as executor:
+            return asyncio.run(load(port, clients, messages, size, executor))
+    finally:
+        process.terminate()
+        process.join()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """List cases whose throughput dropped more than `tolerance` below the baseline"""
+    return harness.compare(
+        results, baseline, tolerance, higher=("handshakes_per_sec", "messages_per_sec")
+    )
+
+
+def parse_case(case: str) -> Tuple[str, int]:
+    """Parse `AES256` style case names"""
+    for cipher_name, key_size in CASES:
+        if case == f"{cipher_name}{key_size}":
+            return cipher_name, key_size
+    raise argparse.ArgumentTypeError(f"Unknown case {case}")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--messages", type=int, default=200, help="messages per client")
+    parser.add_argument("--size", type=int, default=256, help="message size in bytes")
+    parser.add_argument(
+        "--case",
+        type=parse_case,
+        action="append",
+        help="cipher and key size such as AES256, all of them by default",
+    )
+    parser.add_argument("--dh-pool", action="store_true", help="pre-generate server key pairs")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    results = {}
+    for cipher_name, key_size in args.case or CASES:
+        name = f"{cipher_name}{key_size}"
+        results[name] = run_case(
+            cipher_name, key_size, args.clients, args.messages, args.size, args.dh_pool
+        )
+        result = results[name]
+        print(
+            f"{name:<12} {result['handshakes_per_sec']:>8.1f} hs/s  "
+            f"{result['messages_per_sec']:>9.0f} msg/s  "
+            f"{result['bytes_per_sec'] / 1e6:>7.2f} MB/s  "
+            f"handshake p50 {result['handshake_latency']['p50']:.1f} ms "
+            f"p99 {result['handshake_latency']['p99']:.1f} ms  "
+            f"message p50 {result['message_latency']['p50']:.2f} ms "
+            f"p99 {result['message_latency']['p99']:.2f} ms"
+        )
+    finish(args, results, compare)
+
+
+if __name__ == "__main__":
+    main()
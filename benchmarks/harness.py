@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""
+Helpers shared by the benchmarks
+
+Every benchmark takes the same `--output`, `--baseline`, and `--tolerance`
+options: `add_baseline_arguments` declares them and `finish` writes the
+results and exits with status 1 if `compare` finds a regression.
+"""
+
+import argparse
+import json
+import sys
+from typing import Callable, Dict, Iterable, List
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50, p90, p99 and max of latencies, in milliseconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(quantile: float) -> float:
+        return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)] * 1000
+
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": ordered[-1] * 1000}
+
+
+def compare(
+    results: Dict[str, dict],
+    baseline: Dict[str, dict],
+    tolerance: float,
+    higher: Iterable[str] = (),
+    lower: Iterable[str] = (),
+) -> List[str]:
+    """List metrics more than `tolerance` worse than the baseline
+
+    :param results: metrics by case name
+    :param baseline: the same from a previous run
+    :param tolerance: allowed change, 0.2 for 20%
+    :param higher: metrics where higher is better, such as throughput
+    :param lower: metrics where lower is better, such as latency or memory
+    Only cases and metrics present, and not zero, in both runs are compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name, {})
+        for metric in higher:
+            if result.get(metric) and expected.get(metric):
+                if result[metric] < expected[metric] * (1 - tolerance):
+                    regressions.append(
+                        f"{name}: {metric} {result[metric]:.2f} vs {expected[metric]:.2f}"
+                    )
+        for metric in lower:
+            if result.get(metric) and expected.get(metric):
+                if result[metric] > expected[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{name}: {metric} {result[metric]:.2f} vs {expected[metric]:.2f}"
+                    )
+    return regressions
+
+
+def add_baseline_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the --output, --baseline, and --tolerance options"""
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previous JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown")
+
+
+def finish(
+    args: argparse.Namespace, results: dict, regressions: Callable[[dict, dict, float], list]
+) -> None:
+    """Write the results to --output and compare them with --baseline
+
+    :param args: parsed options, see `add_baseline_arguments`
+    :param results: results of the run, as stored in JSON
+    :param regressions: function of (results, baseline, tolerance) listing the regressions
+    Exits with status 1 if there is any regression.
+    """
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file_out:
+            json.dump(results, file_out, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file_in:
+            found = regressions(results, json.load(file_in), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Socket Client that loads an echo server with many connections
+
+Opens N connections to selector_server.py at once and, on each, sends a
+message, waits for the whole echo, and repeats. All connections are driven
+from one thread with `selectors`. Prints the round-trip latencies and the
+throughput.
+"""
+
+import argparse
+import selectors
+import time
+from socket import socket, gethostname, AF_INET, SOCK_STREAM, IPPROTO_TCP, TCP_NODELAY
+
+HOST = gethostname()
+PORT = 4600
+RECV_SIZE = 64 * 1024
+
+
+class Connection:
+    """One connection's progress through its messages"""
+
+    __slots__ = ("sckt", "remaining", "sent", "received", "started", "latencies")
+
+    def __init__(self, sckt: socket, messages: int):
+        self.sckt = sckt
+        self.remaining = messages
+        self.sent = 0
+        self.received = 0
+        self.started = 0.0
+        self.latencies = []
+
+
+def run(host: str, port: int, connections: int, messages: int, size: int) -> dict:
+    """Run all connections to completion
+
+    :return: round-trip latencies in seconds, bytes echoed, and elapsed time
+    """
+    payload = memoryview(b"x" * size)
+    finished = []
+    with selectors.DefaultSelector() as selector:
+        for _ in range(connections):
+            sckt = socket(AF_INET, SOCK_STREAM)
+            # Send small messages right away instead of waiting to fill a packet
+            sckt.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+            sckt.connect((host, port))
+            sckt.setblocking(False)
+            selector.register(sckt, selectors.EVENT_WRITE, Connection(sckt, messages))
+
+        start = time.perf_counter()
+        while selector.get_map():
+            for key, events in selector.select():
+                conn = key.data
+                if events & selectors.EVENT_WRITE:
+                    if conn.sent == 0:
+                        conn.started = time.perf_counter()
+                    try:
+                        conn.sent += conn.sckt.send(payload[conn.sent :])
+                    except BlockingIOError:
+                        continue
+                    if conn.sent == size:
+                        # The whole message is out, wait for the echo
+                        selector.modify(conn.sckt, selectors.EVENT_READ, conn)
+                elif events & selectors.EVENT_READ:
+                    data = conn.sckt.recv(RECV_SIZE)
+                    if not data:
+                        raise ConnectionError("Server closed the connection")
+                    conn.received += len(data)
+                    if conn.received < size:
+                        continue
+                    conn.latencies.append(time.perf_counter() - conn.started)
+                    conn.sent = conn.received = 0
+                    conn.remaining -= 1
+                    if conn.remaining:
+                        selector.modify(conn.sckt, selectors.EVENT_WRITE, conn)
+                    else:
+                        selector.unregister(conn.sckt)
+                        conn.sckt.close()
+                        finished.append(conn)
+        elapsed = time.perf_counter() - start
+
+    latencies = [latency for conn in finished for latency in conn.latencies]
+    return {"latencies": latencies, "bytes": 2 * size * len(latencies), "elapsed": elapsed}
+
+
+def main():
+    """Main Client loop"""
+    parser = argparse.ArgumentParser(description="Load an echo server with many connections")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--connections", type=int, default=100, help="concurrent connections")
+    parser.add_argument("--messages", type=int, default=100, help="messages per connection")
+    parser.add_argument("--size", type=int, default=1024, help="message size in bytes")
+    args = parser.parse_args()
+
+    result = run(args.host, args.port, args.connections, args.messages, args.size)
+    latencies = sorted(result["latencies"])
+
+    def percentile(quantile: float) -> float:
+        return latencies[min(int(quantile * len(latencies)), len(latencies) - 1)] * 1000
+
+    print(f"{len(latencies)} round trips over {args.connections} connections")
+    print(
+        f"Latency p50 {percentile(0.5):.3f} ms, p90 {percentile(0.9):.3f} ms, "
+        f"p99 {percentile(0.99):.3f} ms, max {latencies[-1] * 1000:.3f} ms"
+    )
+    print(
+        f"Throughput {len(latencies) / result['elapsed']:.0f} messages/s, "
+        f"{result['bytes'] / result['elapsed'] / 1e6:.2f} MB/s"
+    )
+    print("Done")
+
+
+if __name__ == "__main__":
+    main()
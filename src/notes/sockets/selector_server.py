@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Socket Server for many clients at once
+
+Unlike server.py, which serves one client with blocking calls, this server
+uses non-blocking sockets and `selectors` (epoll on Linux) to serve any
+number of clients in one thread. It echoes back whatever each client sends.
+"""
+
+import argparse
+import selectors
+import threading
+from typing import Optional
+from socket import socket, gethostname, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
+
+HOST = gethostname()
+PORT = 4600
+RECV_SIZE = 64 * 1024
+# Stop reading from a client that does not read its replies once this much is queued
+MAX_PENDING = 1024 * 1024
+
+
+class Connection:
+    """A client's socket and the bytes still to be sent back to it"""
+
+    __slots__ = ("sckt", "client", "outgoing")
+
+    def __init__(self, sckt: socket, client: tuple):
+        self.sckt = sckt
+        self.client = client
+        self.outgoing = bytearray()
+
+
+def accept(selector: selectors.BaseSelector, server_socket: socket) -> None:
+    """Accept a new client and watch it for incoming data"""
+    conn, client = server_socket.accept()
+    print(f"New client: {client[0]}:{client[1]}")
+    conn.setblocking(False)
+    selector.register(conn, selectors.EVENT_READ, Connection(conn, client))
+
+
+def close(selector: selectors.BaseSelector, connection: Connection) -> None:
+    """Forget a client and close its socket"""
+    print(f"Client {connection.client[0]}:{connection.client[1]} left")
+    selector.unregister(connection.sckt)
+    connection.sckt.close()
+
+
+def service(selector: selectors.BaseSelector, connection: Connection, events: int) -> None:
+    """Read what the client sent and send as much of the reply as the socket takes"""
+    if events & selectors.EVENT_READ:
+        try:
+            data = connection.sckt.recv(RECV_SIZE)
+        except BlockingIOError:
+            data = None
+        except ConnectionError:
+            data = b""
+        if data == b"":
+            # The client closed the connection
+            close(selector, connection)
+            return
+        if data:
+            connection.outgoing += data
+
+    if connection.outgoing:
+        # Try right away, usually the socket can take the whole reply
+        try:
+            sent = connection.sckt.send(connection.outgoing)
+        except BlockingIOError:
+            sent = 0
+        except ConnectionError:
+            close(selector, connection)
+            return
+        # A partial write keeps the rest for when the socket is writable again
+        del connection.outgoing[:sent]
+
+    wanted = 0
+    if len(connection.outgoing) < MAX_PENDING:
+        wanted |= selectors.EVENT_READ
+    if connection.outgoing:
+        wanted |= selectors.EVENT_WRITE
+    selector.modify(connection.sckt, wanted, connection)
+
+
+def serve(server_socket: socket, stop: Optional[threading.Event] = None) -> None:
+    """Serve clients on a listening socket until interrupted or `stop` is set
+
+    Clients still connected when serving stops are closed.
+    """
+    server_socket.setblocking(False)
+    # Wake up now and then to notice `stop`, otherwise wait for events only
+    timeout = None if stop is None else 0.1
+    with selectors.DefaultSelector() as selector:
+        selector.register(server_socket, selectors.EVENT_READ, None)
+        try:
+            while stop is None or not stop.is_set():
+                for key, events in selector.select(timeout):
+                    if key.data is None:
+                        accept(selector, server_socket)
+                    else:
+                        service(selector, key.data, events)
+        finally:
+            for key in list(selector.get_map().values()):
+                if key.data is not None:
+                    close(selector, key.data)
+
+
+def main():
+    """Main Server loop"""
+    parser = argparse.ArgumentParser(description="Echo server for many clients")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    # Create TCP socket
+    server_socket = socket(AF_INET, SOCK_STREAM)
+    # Restart right away without waiting for old connections to time out
+    server_socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    # Bind to a port
+    server_socket.bind((args.host, args.port))
+    # Start listening for incoming connections, with room for many at once
+    server_socket.listen(1024)
+    print(f"Listening for incoming connections on {args.host}:{args.port}")
+    try:
+        serve(server_socket)
+    except KeyboardInterrupt:
+        pass
+    server_socket.close()
+    print("Done")
+
+
+if __name__ == "__main__":
+    main()
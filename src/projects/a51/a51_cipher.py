@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 # encoding: UTF-8
 """A5/1 cipher"""
+from functools import partial
 from hashlib import sha256
 
+from src.projects import streaming
+from src.projects.profiling import profiled
+
 
 def populate_registers(init_keyword: str) -> tuple:
     """Populate registers
@@ -23,7 +27,6 @@ def populate_registers(init_keyword: str) -> tuple:
     y = xyz[19:41]
     z = xyz[41:]
     
-    print(len(z))
     return (x , y, z)
 
 
@@ -123,6 +126,7 @@ def generate_bit(x: str, y: str, z: str) -> int:
     return (int(cal_XOR(cal_XOR(x[18], y[21]), z[22])))
 
 
+@profiled
 def generate_keystream(plaintext: str, x: str, y: str, z: str) -> str:
     """Generate stream of bits to match length of plaintext
     
@@ -133,15 +137,26 @@ def generate_keystream(plaintext: str, x: str, y: str, z: str) -> str:
 
     return keystream
     """
-    result = ""
-    
     plaintext_binary = ""
     for char in plaintext:
         plaintext_binary += bin(ord(char))[2:].zfill(8)
-    
-    #print("binary", plaintext_binary)
 
-    for i in range(0, len(plaintext_binary)):
+    return clock(len(plaintext_binary), x, y, z)[0]
+
+
+def clock(count: int, x: str, y: str, z: str) -> tuple:
+    """Clock the registers to generate keystream bits
+
+    count -- number of bits
+    x -- X register
+    y -- Y register
+    z -- Z register
+
+    return keystream and the new X, Y, Z registers as a tuple
+    """
+    result = []
+
+    for i in range(0, count):
         maj = majority(x[8], y[10], z[10])
         if x[8] == maj:
             x = step_x(x)
@@ -150,13 +165,11 @@ def generate_keystream(plaintext: str, x: str, y: str, z: str) -> str:
         if z[10] == maj:
             z = step_z(z)
 
-        bit = generate_bit(x, y, z)
-        
-        result += str(bit)
-        #print(result)
-    return result
+        result.append(str(generate_bit(x, y, z)))
+    return ("".join(result), x, y, z)
 
 
+@profiled
 def encrypt(plaintext: str, keystream: str) -> str:
     """Encrypt plaintext using A5/1
     
@@ -177,23 +190,60 @@ def encrypt(plaintext: str, keystream: str) -> str:
     return result
 
 
-def encrypt_file(filename: str, secret: str) -> None:
-    """Encrypt a file
+def stream(secret: str) -> streaming.Stage:
+    """Streaming stage XORing bytes with the keystream, to encrypt or decrypt
+
+    secret -- secret to initialize registers
+
+    return stage for `streaming.pipeline`, the registers carry over from
+    one chunk to the next so the output does not depend on the chunk size
+    """
+
+    def stage(chunks):
+        x, y, z = populate_registers(secret)
+        for chunk in chunks:
+            if not chunk:
+                continue
+            keystream, x, y, z = clock(8 * len(chunk), x, y, z)
+            data = int.from_bytes(chunk, "big") ^ int(keystream, 2)
+            yield data.to_bytes(len(chunk), "big")
+
+    return stage
+
+
+def encrypt_line(line: bytes, secret: str) -> bytes:
+    """Encrypt a line with freshly initialized registers
+
+    line -- line of text, its line break is not encrypted
+    secret -- secret to initialize registers
+
+    return ciphertext in hex on its own line
+    """
+    plaintext = line.rstrip(b"\n").decode("utf-8")
+    x, y, z = populate_registers(secret)
+    keystream = generate_keystream(plaintext, x, y, z)
+    dcm = encrypt(plaintext, keystream)
+    return (hex(int(dcm or "0", 2)) + "\n").encode("ascii")
+
+
+def encrypt_file(filename: str, secret: str, file_out_name: str = None) -> None:
+    """Encrypt a file line by line
     
     filename -- filename to be encrypted
     secret -- secret to initialize registers
+    file_out_name -- where to write the result, filename.secret by default
 
     return write the result to filename.secret
     """
-    r = open(filename, "r")
-    w = open("data/projects/a51/roster.secret", "w")
-    
-    for line in r:
-        x, y, z = populate_registers(secret)
-        keystream = generate_keystream(line, x, y, z)
-        dcm =  encrypt(line, keystream)
-        
-        w.write(hex(int(dcm, 2)) + '\n')
+    if file_out_name is None:
+        file_out_name = f"{filename}.secret"
+    streaming.process_file(
+        filename,
+        file_out_name,
+        streaming.lines,
+        streaming.map_chunks(partial(encrypt_line, secret=secret)),
+    )
+
 
 def main():
     """Main function"""
@@ -1,10 +1,9 @@
 # Python standard libraries
-import json
 import os
-import sqlite3
 
 # Third-party libraries
-from flask import Flask, redirect, request, url_for
+import requests
+from flask import Flask, current_app, redirect, request, url_for
 from flask_login import (
     LoginManager,
     current_user,
@@ -13,37 +12,45 @@ from flask_login import (
     logout_user,
 )
 from oauthlib.oauth2 import WebApplicationClient
-import requests
 
 # Internal imports
-from db import init_db_command
-from user import User
-
-# Configuration
-GOOGLE_CLIENT_ID = "37055598095-99258chpg2060g62ansue3qg5f3o144j.apps.googleusercontent.com"
-GOOGLE_CLIENT_SECRET = "l_yL_JM8PmXYRYtbdFZGsIvQ"
-GOOGLE_DISCOVERY_URL = (
-    "https://accounts.google.com/.well-known/openid-configuration"
+from src.projects.authorization import db
+from src.projects.authorization.oidc import TIMEOUT, DiscoveryCache, JWKSCache, new_session
+from src.projects.authorization.oidc import verify_id_token
+from src.projects.authorization.user import User
+
+# Configuration, overridable from the environment, e.g. to use a stub provider
+GOOGLE_CLIENT_ID = os.environ.get(
+    "GOOGLE_CLIENT_ID",
+    "37055598095-99258chpg2060g62ansue3qg5f3o144j.apps.googleusercontent.com",
+)
+GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET", "l_yL_JM8PmXYRYtbdFZGsIvQ")
+GOOGLE_DISCOVERY_URL = os.environ.get(
+    "GOOGLE_DISCOVERY_URL", "https://accounts.google.com/.well-known/openid-configuration"
 )
 
 # Flask app setup
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY") or os.urandom(24)
+app.config.from_mapping(
+    DATABASE=os.environ.get("DATABASE", os.path.join(app.root_path, "sqlite_db")),
+    GOOGLE_CLIENT_ID=GOOGLE_CLIENT_ID,
+    GOOGLE_CLIENT_SECRET=GOOGLE_CLIENT_SECRET,
+    GOOGLE_DISCOVERY_URL=GOOGLE_DISCOVERY_URL,
+)
 
 # User session management setup
 # https://flask-login.readthedocs.io/en/latest
 login_manager = LoginManager()
 login_manager.init_app(app)
 
-# Naive database setup
-try:
-    init_db_command()
-except sqlite3.OperationalError:
-    # Assume it's already been created
-    pass
+# Database setup, the tables are created before the first request (or by `flask init-db`)
+db.init_app(app)
 
-# OAuth 2 client setup
-client = WebApplicationClient(GOOGLE_CLIENT_ID)
+# Pooled connections to the provider, its configuration and keys cached per Cache-Control
+http = new_session()
+provider_configs = DiscoveryCache(http)
+provider_keys = JWKSCache(http)
 
 # Flask-Login helper to retrieve a user from our db
 @login_manager.user_loader
@@ -65,7 +72,12 @@ def index():
         return '<a class="button" href="/login">Google Login</a>'
 
 def get_google_provider_cfg():
-    return requests.get(GOOGLE_DISCOVERY_URL).json()
+    return provider_configs.get(current_app.config["GOOGLE_DISCOVERY_URL"])
+
+
+def get_client():
+    # The client keeps the state of one login, so every login gets its own
+    return WebApplicationClient(current_app.config["GOOGLE_CLIENT_ID"])
 
 
 @app.route("/login")
@@ -77,7 +89,7 @@ def login():
 
     # Use library to construct the request for Google login and provide
     # scopes that let you retrieve user's profile from Google
-    request_uri = client.prepare_request_uri(
+    request_uri = get_client().prepare_request_uri(
         authorization_endpoint,
         redirect_uri=request.base_url + "/callback",
         scope=["openid", "email", "profile"],
@@ -89,54 +101,69 @@ def login():
 @app.route("/login/callback")
 def callback():
     # Get authorization code Google sent back to you
-	code = request.args.get("code")
-	
-	google_provider_cfg = get_google_provider_cfg()
-	token_endpoint = google_provider_cfg["token_endpoint"]
-
-	# Prepare and send a request to get tokens! Yay tokens!
-	token_url, headers, body = client.prepare_token_request(
-	    token_endpoint,
-	    authorization_response=request.url,
-	    redirect_url=request.base_url,
-	    code=code
-	)
-	token_response = requests.post(
-	    token_url,
-	    headers=headers,
-	    data=body,
-	    auth=(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET),
-	)
-
-	# Parse the tokens!
-	client.parse_request_body_response(json.dumps(token_response.json()))
-
-	userinfo_endpoint = google_provider_cfg["userinfo_endpoint"]
-	uri, headers, body = client.add_token(userinfo_endpoint)
-	userinfo_response = requests.get(uri, headers=headers, data=body)
-
-
-	if userinfo_response.json().get("email_verified"):
-	    unique_id = userinfo_response.json()["sub"]
-	    users_email = userinfo_response.json()["email"]
-	    picture = userinfo_response.json()["picture"]
-	    users_name = userinfo_response.json()["given_name"]
-	else:
-	    return "User email not available or not verified by Google.", 400
-
-	user = User(
-	    id_=unique_id, name=users_name, email=users_email, profile_pic=picture
-	)
-
-	# Doesn't exist? Add it to the database.
-	if not User.get(unique_id):
-	    User.create(unique_id, users_name, users_email, picture)
-
-	# Begin user session by logging the user in
-	login_user(user)
-
-	# Send user back to homepage
-	return redirect(url_for("index"))
+    code = request.args.get("code")
+
+    google_provider_cfg = get_google_provider_cfg()
+    token_endpoint = google_provider_cfg["token_endpoint"]
+
+    # Prepare and send a request to get tokens! Yay tokens!
+    client = get_client()
+    token_url, headers, body = client.prepare_token_request(
+        token_endpoint,
+        authorization_response=request.url,
+        redirect_url=request.base_url,
+        code=code,
+    )
+    token_response = http.post(
+        token_url,
+        headers=headers,
+        data=body,
+        auth=(current_app.config["GOOGLE_CLIENT_ID"], current_app.config["GOOGLE_CLIENT_SECRET"]),
+        timeout=TIMEOUT,
+    )
+
+    # Parse the tokens! The ID token already holds the user's profile
+    try:
+        tokens = token_response.json()
+    except ValueError:
+        tokens = {}
+    if not isinstance(tokens, dict) or "id_token" not in tokens:
+        return "Could not get tokens from Google.", 400
+    try:
+        claims = verify_id_token(
+            tokens["id_token"],
+            provider_keys,
+            google_provider_cfg,
+            current_app.config["GOOGLE_CLIENT_ID"],
+        )
+    except requests.RequestException:
+        # Google's keys could not be fetched, e.g. while refreshing them for a new key ID
+        return "Could not get Google's signing keys.", 502
+    except ValueError:
+        return "Google's ID token could not be verified.", 400
+
+    if claims.get("email_verified"):
+        unique_id = claims["sub"]
+        users_email = claims["email"]
+        # Profile claims are optional, e.g. without the profile scope
+        picture = claims.get("picture", "")
+        users_name = claims.get("given_name") or claims.get("name", "")
+    else:
+        return "User email not available or not verified by Google.", 400
+
+    user = User(
+        id_=unique_id, name=users_name, email=users_email, profile_pic=picture
+    )
+
+    # Add it to the database, or update it if it is already there
+    User.create(unique_id, users_name, users_email, picture)
+
+    # Begin user session by logging the user in
+    login_user(user)
+
+    # Send user back to homepage
+    return redirect(url_for("index"))
+
 
 @app.route("/logout")
 @login_required
@@ -145,7 +172,12 @@ def logout():
     return redirect(url_for("index"))
 
 
-
-
 if __name__ == "__main__":
-    app.run(host="leth02.luther.edu",port=5000,ssl_context=('cert.pem', 'key.pem'))
\ No newline at end of file
+    app.run(
+        host="leth02.luther.edu",
+        port=5000,
+        ssl_context=(
+            os.path.join(app.root_path, "cert.pem"),
+            os.path.join(app.root_path, "key.pem"),
+        ),
+    )
@@ -1,24 +1,156 @@
 # http://flask.pocoo.org/docs/1.0/tutorial/database/
 import sqlite3
+import threading
+from contextlib import contextmanager
+from time import perf_counter
 
 import click
 from flask import current_app, g
 from flask.cli import with_appcontext
 
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+
+
+def connect(path):
+    # Autocommit, writes open their transactions explicitly with `transaction`
+    db = sqlite3.connect(
+        path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS,
+    )
+    db.row_factory = sqlite3.Row
+    # Readers do not block the writer and vice versa; a writer waits for the lock
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return db
+
+
+class ConnectionPool:
+    """Long-lived connections to one database, lent to one request at a time
+
+    A connection is only ever used by the thread that borrowed it, so each
+    request thread effectively has its own. Up to `size` idle connections
+    are kept; a request that finds none opens another one. The pool is shared
+    rather than thread-local because the threaded server starts a thread per
+    request, which would never reuse a thread-local connection.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.opened = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                # Most recently used first, its pages are the most likely cached
+                return self._idle.pop()
+            self.opened += 1
+        return connect(self.path)
+
+    def release(self, db):
+        if db.in_transaction:
+            db.rollback()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(db)
+                return
+        db.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for db in idle:
+            db.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path)
+        return _pools[path]
+
+
 def get_db():
     if "db" not in g:
-        g.db = sqlite3.connect(
-            "sqlite_db", detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = get_pool(current_app.config["DATABASE"]).acquire()
 
     return g.db
 
+
 def close_db(e=None):
     db = g.pop("db", None)
 
     if db is not None:
-        db.close()
+        get_pool(current_app.config["DATABASE"]).release(db)
+
+
+class LockWaits:
+    """Time writers spent waiting for the database lock in BEGIN IMMEDIATE"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, timed_out=False):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.timeouts += timed_out
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "total": self.total,
+                "max": self.max,
+                "mean": self.total / self.count if self.count else 0.0,
+                "timeouts": self.timeouts,
+            }
+
+
+lock_waits = LockWaits()
+
+
+@contextmanager
+def transaction():
+    """Write transaction that takes the database lock up front
+
+    A deferred transaction that starts reading and later writes can fail
+    with "database is locked" without waiting for busy_timeout; BEGIN
+    IMMEDIATE waits for the lock before doing anything.
+    """
+    db = get_db()
+    start = perf_counter()
+    try:
+        db.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError:
+        # Still locked after busy_timeout
+        lock_waits.observe(perf_counter() - start, timed_out=True)
+        raise
+    lock_waits.observe(perf_counter() - start)
+    try:
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+
 
 def init_db():
     db = get_db()
@@ -26,13 +158,33 @@ def init_db():
     with current_app.open_resource("schema.sql") as f:
         db.executescript(f.read().decode("utf8"))
 
+
+# Databases whose tables were created by this process
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def init_db_once():
+    # Run before each request, so the tables exist without any work at import time
+    path = current_app.config["DATABASE"]
+    if path in _initialized:
+        return
+    with _init_lock:
+        if path in _initialized:
+            return
+        init_db()
+        _initialized.add(path)
+
+
 @click.command("init-db")
 @with_appcontext
 def init_db_command():
-    """Clear the existing data and create new tables."""
+    """Create the tables if they do not exist yet."""
     init_db()
     click.echo("Initialized the database.")
 
+
 def init_app(app):
+    app.before_request(init_db_once)
     app.teardown_appcontext(close_db)
     app.cli.add_command(init_db_command)
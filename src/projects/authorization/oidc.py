@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""HTTP access to the OpenID Connect provider
+
+All calls to the provider go through one `requests.Session`, so connections
+(and their TLS handshakes) are pooled and reused across logins. The
+discovery document and the provider's signing keys are cached for as long as
+the provider's Cache-Control header allows, and ID tokens are verified
+locally against those keys instead of asking the userinfo endpoint.
+"""
+
+import base64
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+import requests
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TTL = 300.0
+MIN_REFRESH = 5.0
+LEEWAY = 60.0
+POOL_SIZE = 16
+TIMEOUT = 10.0
+
+
+def new_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """Session keeping up to `pool_size` connections per host alive"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def cache_lifetime(headers: Mapping[str, str], default: float = DEFAULT_TTL) -> float:
+    """How long a response may be cached according to its headers
+
+    :param headers: response headers, case-insensitive like `requests`'
+    :param default: lifetime if the response does not say
+    :return: seconds, 0 if the response must not be reused
+    """
+    directives = {}
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name.lower()] = value.strip('"')
+    if "no-store" in directives or "no-cache" in directives:
+        return 0.0
+    max_age = directives.get("s-maxage") or directives.get("max-age")
+    if not max_age:
+        return default
+    try:
+        # Age is the time the response already spent in intermediate caches
+        return max(0.0, float(max_age) - float(headers.get("Age", 0)))
+    except ValueError:
+        return default
+
+
+class DiscoveryCache:
+    """JSON documents of the provider by URL, kept until they expire
+
+    Used for the discovery document, and through `JWKSCache` for the keys.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        default_ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.monotonic,
+        min_refresh: float = MIN_REFRESH,
+    ):
+        """
+        :param session: session to fetch documents with
+        :param default_ttl: lifetime of documents without a Cache-Control max-age
+        :param clock: monotonic time in seconds, replaceable in tests
+        :param min_refresh: forced refreshes of a document are at least this many seconds apart
+        """
+        self.session = session
+        self.default_ttl = default_ttl
+        self.min_refresh = min_refresh
+        self.fetches = 0
+        self._clock = clock
+        # URL -> (expiry time, decoded document, fetch time)
+        self._entries: Dict[str, Tuple[float, Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def _usable(self, entry: Optional[tuple], refresh: bool) -> bool:
+        """Whether a cached entry may be returned instead of fetching again"""
+        if entry is None:
+            return False
+        expires, _, fetched = entry
+        now = self._clock()
+        if refresh:
+            return now - fetched < self.min_refresh
+        return expires > now
+
+    def decode(self, document: dict) -> Any:
+        """What to cache for a fetched document, the document itself by default"""
+        return document
+
+    def get(self, url: str, refresh: bool = False) -> Any:
+        """Document at `url`, fetched only if the cached one expired
+
+        :param url: document URL, e.g. ending in /.well-known/openid-configuration
+        :param refresh: fetch again even if the cached document has not expired,
+        unless it was fetched less than `min_refresh` seconds ago
+        :return: decoded document
+        :raise: requests.RequestException if the provider cannot be reached
+        """
+        entry = self._entries.get(url)
+        if self._usable(entry, refresh):
+            return entry[1]
+        # Concurrent logins after expiry wait for one fetch instead of each fetching
+        with self._lock:
+            entry = self._entries.get(url)
+            if self._usable(entry, refresh):
+                return entry[1]
+            response = self.session.get(url, timeout=TIMEOUT)
+            response.raise_for_status()
+            self.fetches += 1
+            value = self.decode(response.json())
+            now = self._clock()
+            self._entries[url] = (
+                now + cache_lifetime(response.headers, self.default_ttl),
+                value,
+                now,
+            )
+            return value
+
+    def clear(self) -> None:
+        """Forget every cached document"""
+        with self._lock:
+            self._entries.clear()
+
+
+def b64url_decode(data: str) -> bytes:
+    """Decode unpadded base64url as used by JWS and JWK"""
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class JWKSCache(DiscoveryCache):
+    """Public keys of the provider by key ID, from its JSON Web Key Set
+
+    A token signed with an unknown key ID triggers a refresh, so keys the
+    provider rotated in are picked up before the cached set expires.
+    """
+
+    def decode(self, document: dict) -> Dict[str, rsa.RSAPublicKey]:
+        """RSA signing keys of a key set by key ID"""
+        keys = {}
+        for jwk in document.get("keys", []):
+            if jwk.get("kty") != "RSA" or jwk.get("use", "sig") != "sig":
+                continue
+            numbers = rsa.RSAPublicNumbers(
+                int.from_bytes(b64url_decode(jwk["e"]), "big"),
+                int.from_bytes(b64url_decode(jwk["n"]), "big"),
+            )
+            keys[jwk.get("kid")] = numbers.public_key(default_backend())
+        return keys
+
+    def key(self, url: str, kid: Optional[str]) -> rsa.RSAPublicKey:
+        """Public key with the given ID
+
+        :param url: the provider's jwks_uri
+        :param kid: key ID from the token header
+        :raise: ValueError if the provider does not have that key
+        :raise: requests.RequestException if the key set cannot be fetched
+        """
+        keys = self.get(url)
+        if kid not in keys:
+            keys = self.get(url, refresh=True)
+        if kid not in keys:
+            raise ValueError("Unknown signing key")
+        return keys[kid]
+
+
+def verify_id_token(
+    token: str,
+    keys: JWKSCache,
+    provider_cfg: dict,
+    audience: str,
+    now: float = None,
+    leeway: float = LEEWAY,
+) -> dict:
+    """Check an ID token's signature and claims without asking the provider
+
+    :param token: compact JWS from the token response
+    :param keys: key cache to find the signing key in
+    :param provider_cfg: discovery document, for the issuer and jwks_uri
+    :param audience: our client ID
+    :param now: current Unix time, for tests
+    :param leeway: allowed clock difference with the provider, in seconds
+    :return: the token's claims
+    :raise: ValueError if the token is malformed, forged, expired, or not for us
+    :raise: requests.RequestException if the provider's keys cannot be fetched
+    """
+    try:
+        header, payload, signature = token.split(".")
+        header_fields = json.loads(b64url_decode(header))
+        claims = json.loads(b64url_decode(payload))
+        signature = b64url_decode(signature)
+    except (AttributeError, ValueError) as err:
+        raise ValueError("Malformed ID token") from err
+    if not isinstance(header_fields, dict) or not isinstance(claims, dict):
+        raise ValueError("Malformed ID token")
+    if header_fields.get("alg") != "RS256":
+        raise ValueError("Unsupported ID token algorithm")
+    public_key = keys.key(provider_cfg["jwks_uri"], header_fields.get("kid"))
+    try:
+        public_key.verify(
+            signature, f"{header}.{payload}".encode("ascii"), padding.PKCS1v15(), hashes.SHA256()
+        )
+    except InvalidSignature:
+        raise ValueError("Bad ID token signature") from None
+
+    issuer = provider_cfg["issuer"]
+    # Google issues tokens for both forms of its issuer
+    if claims.get("iss") not in (issuer, issuer.split("://", 1)[-1]):
+        raise ValueError("Wrong ID token issuer")
+    audiences = claims.get("aud")
+    if audience != audiences and audience not in (audiences if isinstance(audiences, list) else []):
+        raise ValueError("ID token is for another client")
+    now = time.time() if now is None else now
+    if not isinstance(claims.get("exp"), (int, float)) or claims["exp"] + leeway < now:
+        raise ValueError("Expired ID token")
+    return claims
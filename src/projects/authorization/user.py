@@ -1,16 +1,109 @@
-from flask_login import UserMixin
+import threading
+import time
+from collections import OrderedDict
 
-from db import get_db
+from flask import current_app
+
+from src.projects.authorization.db import get_db, transaction
+
+CACHE_SIZE = 1024
+CACHE_TTL = 60.0
+
+
+class UserCache:
+    """Least recently used users, each kept for at most `ttl` seconds"""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, user):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Users loaded by Flask-Login on every request, shared by all threads
+cache = UserCache()
+
+
+def _cache_key(user_id):
+    # Tests and benchmarks switch databases, so the same id may be another user
+    return current_app.config["DATABASE"], user_id
+
+
+class User:
+    # Flask-Login's UserMixin has no __slots__, so its interface is spelled out here
+    __slots__ = ("id", "name", "email", "profile_pic")
 
-class User(UserMixin):
     def __init__(self, id_, name, email, profile_pic):
         self.id = id_
         self.name = name
         self.email = email
         self.profile_pic = profile_pic
 
+    @property
+    def is_active(self):
+        return True
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        # Equal users hash alike, whether they came from the cache or the database
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"User({self.id!r}, {self.name!r}, {self.email!r})"
+
     @staticmethod
     def get(user_id):
+        key = _cache_key(user_id)
+        user = cache.get(key)
+        if user is not None:
+            return user
+
         db = get_db()
         user = db.execute(
             "SELECT * FROM user WHERE id = ?", (user_id,)
@@ -21,14 +114,19 @@ class User(UserMixin):
         user = User(
             id_=user[0], name=user[1], email=user[2], profile_pic=user[3]
         )
+        cache.put(key, user)
         return user
 
     @staticmethod
     def create(id_, name, email, profile_pic):
-        db = get_db()
-        db.execute(
-            "INSERT INTO user (id, name, email, profile_pic) "
-            "VALUES (?, ?, ?, ?)",
-            (id_, name, email, profile_pic),
-        )
-        db.commit()
+        # Upsert, so logging in also picks up a changed name or picture
+        with transaction() as db:
+            db.execute(
+                "INSERT INTO user (id, name, email, profile_pic) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET "
+                "name = excluded.name, email = excluded.email, "
+                "profile_pic = excluded.profile_pic",
+                (id_, name, email, profile_pic),
+            )
+        cache.invalidate(_cache_key(id_))
@@ -2,50 +2,161 @@
 # encoding: UTF-8
 """Caesar cipher"""
 
+import string
+from functools import lru_cache, partial
+
+from src.projects import streaming
+from src.projects.profiling import profiled
+
 DICT_ENG = set()
+PUNCTUATION = ";:,.!?'() \n\t"
+# Files are processed as bytes, where Windows line breaks keep their \r
+PUNCTUATION_BYTES = PUNCTUATION.encode("ascii") + b"\r"
+# Letters of a file tried with each shift by `analyze_file`
+SAMPLE_SIZE = 1000
+# Lengths of the dictionary words looked for in the sample
+WORD_LENGTHS = range(4, 11)
+
+
+@lru_cache(maxsize=None)
+def _shift_table(shift: int) -> dict:
+    """`str.translate` table shifting ASCII letters by `shift`, keeping their case"""
+    lower = string.ascii_lowercase[shift:] + string.ascii_lowercase[:shift]
+    return str.maketrans(string.ascii_letters, lower + lower.upper())
+
+
+@lru_cache(maxsize=None)
+def translation_table(shift: int, upper: bool) -> bytes:
+    """`bytes.translate` table shifting ASCII letters by `shift`, all made upper or lower case"""
+    shift %= 26
+    letters = string.ascii_lowercase[shift:] + string.ascii_lowercase[:shift]
+    if upper:
+        letters = letters.upper()
+    return bytes.maketrans(string.ascii_letters.encode("ascii"), (letters * 2).encode("ascii"))
 
 
+@profiled
 def shift_by_n(word: str, shift: int, direction: int) -> str:
     """Shifting all letters in a word by n. Direction specifies encryption (>0) or decryption (<0)"""
-    raise NotImplementedError
+    shift = shift % 26 if direction > 0 else -shift % 26
+    return word.translate(_shift_table(shift))
 
 
+@profiled
 def encrypt(plaintext: str, shift: int, obfuscate=False) -> str:
     """Encrypt and optionally obfuscate a string"""
     cipher = shift_by_n(plaintext, shift, 1).upper()  # 1 for encryption
     if obfuscate:
-        punctuation = ";:,.!?'() \n\t"
-        for symbol in punctuation:
+        for symbol in PUNCTUATION:
             cipher = cipher.replace(symbol, "")
     return cipher
 
 
-def encrypt_file(file_in_name: str, file_out_name: str, shift: int, obfuscate=False):
-    """Encrypt a file and write the cipher to a file"""
-    with open(file_in_name, "r", encoding="utf-8") as file_in:
-        plaintext = file_in.read().lower()
-    cipher = encrypt(plaintext, shift, obfuscate)
-    with open(file_out_name, "w", encoding="utf-8") as file_out:
-        file_out.write(cipher)
+def encrypt_chunk(chunk: bytes, shift: int, obfuscate=False) -> bytes:
+    """Encrypt and optionally obfuscate a chunk of a file
 
-
-def decrypt(cipher: str, shift: int) -> str:
-    """Decrypt a string"""
-    raise NotImplementedError
+    Only ASCII bytes change, so chunks may split UTF-8 characters anywhere.
+    """
+    delete = PUNCTUATION_BYTES if obfuscate else b""
+    return bytes(chunk).translate(translation_table(shift, True), delete)
 
 
-def decrypt_file(file_in_name: str, file_out_name: str, shift: int):
-    """Decrypt a file that has not been obfuscated"""
-    with open(file_in_name, "r", encoding="utf-8") as file_in:
-        cipher = file_in.read()
-    plaintext = decrypt(cipher, shift)
-    with open(file_out_name, "w", encoding="utf-8") as file_out:
-        file_out.write(plaintext)
+def encrypt_file(
+    file_in_name: str,
+    file_out_name: str,
+    shift: int,
+    obfuscate=False,
+    chunk_size=streaming.MAP_CHUNK_SIZE,
+):
+    """Encrypt a file and write the cipher to a file, a memory-mapped chunk at a time"""
+    streaming.process_file(
+        file_in_name,
+        file_out_name,
+        streaming.map_chunks(partial(encrypt_chunk, shift=shift, obfuscate=obfuscate)),
+        chunk_size=chunk_size,
+        mapped=True,
+    )
 
 
-def analyze_file(file_in_name: str, file_out_name: str, dictionary: set):
-    """Analyze a file that has been obfuscated"""
-    raise NotImplementedError
+@profiled
+def decrypt(cipher: str, shift: int) -> str:
+    """Decrypt a string"""
+    return shift_by_n(cipher, shift, -1).lower()  # -1 for decryption
+
+
+def decrypt_chunk(chunk: bytes, shift: int) -> bytes:
+    """Decrypt a chunk of a file, see `encrypt_chunk`"""
+    return bytes(chunk).translate(translation_table(-shift, False))
+
+
+def decrypt_file(
+    file_in_name: str, file_out_name: str, shift: int, chunk_size=streaming.MAP_CHUNK_SIZE
+):
+    """Decrypt a file that has not been obfuscated, a memory-mapped chunk at a time"""
+    streaming.process_file(
+        file_in_name,
+        file_out_name,
+        streaming.map_chunks(partial(decrypt_chunk, shift=shift)),
+        chunk_size=chunk_size,
+        mapped=True,
+    )
+
+
+def decrypt_shifts(sample: bytes, use_numpy: bool = None) -> list:
+    """Decryptions of a sample with every shift, the one at index i with shift i
+
+    NumPy decodes all 26 at once, indexing a table of 26 rows of 256 bytes
+    with the sample.
+    :param use_numpy: True to require NumPy, False to do without, None to use it if installed
+    :raise: ImportError if NumPy is required and not installed
+    """
+    if use_numpy is not False:
+        try:
+            import numpy
+        except ImportError:
+            if use_numpy:
+                raise
+        else:
+            tables = b"".join(translation_table(-shift, False) for shift in range(26))
+            tables = numpy.frombuffer(tables, dtype=numpy.uint8).reshape(26, 256)
+            decoded = tables[:, numpy.frombuffer(sample, dtype=numpy.uint8)]
+            return [row.tobytes() for row in decoded]
+    return [sample.translate(translation_table(-shift, False)) for shift in range(26)]
+
+
+def load_dictionary(file_name: str) -> set:
+    """Read a wordlist, one word per line, into a set of lowercase words"""
+    with open(file_name, "r", encoding="utf-8") as file_in:
+        return {line.strip().lower() for line in file_in if line.strip()}
+
+
+def count_words(text: str, dictionary: set) -> int:
+    """Count the distinct dictionary words found in a text, spaces or not"""
+    letters = "".join(char for char in text.lower() if char.isalpha())
+    found = {
+        letters[start : start + length]
+        for length in WORD_LENGTHS
+        for start in range(len(letters) - length + 1)
+    }
+    return len(found & dictionary)
+
+
+def analyze_file(
+    file_in_name: str, file_out_name: str, dictionary: set, use_numpy: bool = None
+) -> int:
+    """Analyze a file that has been obfuscated
+
+    Tries every shift on the start of the file, keeps the one revealing the
+    most dictionary words, and decrypts the file with it.
+    :param use_numpy: see `decrypt_shifts`
+    :return: the shift found
+    """
+    with open(file_in_name, "rb") as file_in:
+        sample = file_in.read(SAMPLE_SIZE)
+    candidates = [text.decode("latin-1") for text in decrypt_shifts(sample, use_numpy)]
+    shift = max(range(26), key=lambda shift: count_words(candidates[shift], dictionary))
+    decrypt_file(file_in_name, file_out_name, shift)
+    return shift
 
 
 def main():
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""One command line for the ciphers, the password cracker, and the VPN
+
+Run from the repository root, e.g.:
+    python -m src.projects.cli caesar encrypt plain.txt cipher.txt --shift 3
+    python -m src.projects.cli caesar analyze data/projects/caesar/cipher_2.txt plain.txt
+    python -m src.projects.cli a51 encrypt data/projects/a51/roster --secret martin
+    python -m src.projects.cli knapsack encrypt plain.txt cipher.txt --key knapsack.public
+    python -m src.projects.cli crack data/projects/passwords/sam --mask '?l?l?l?d'
+    python -m src.projects.cli vpn-server --workers 4
+
+Every subcommand imports its module, and with it the crypto libraries, only
+once it is chosen, so starting the tool costs little more than argparse.
+"""
+
+import argparse
+import sys
+
+CAESAR_DICTIONARY = "data/projects/caesar/wordlist_english.txt"
+WORDLIST = "data/projects/passwords/english.txt"
+
+
+def a51_encrypt(args: argparse.Namespace) -> None:
+    """Encrypt a file line by line"""
+    from src.projects.a51 import a51_cipher
+
+    a51_cipher.encrypt_file(args.file_in, args.secret, args.output)
+
+
+def caesar_encrypt(args: argparse.Namespace) -> None:
+    """Encrypt a file, optionally removing punctuation and whitespace"""
+    from src.projects.caesar import caesar_cipher
+
+    caesar_cipher.encrypt_file(args.file_in, args.file_out, args.shift, args.obfuscate)
+
+
+def caesar_decrypt(args: argparse.Namespace) -> None:
+    """Decrypt a file with a known shift"""
+    from src.projects.caesar import caesar_cipher
+
+    caesar_cipher.decrypt_file(args.file_in, args.file_out, args.shift)
+
+
+def caesar_analyze(args: argparse.Namespace) -> None:
+    """Find the shift of a file and decrypt it"""
+    from src.projects.caesar import caesar_cipher
+
+    dictionary = caesar_cipher.load_dictionary(args.dictionary)
+    shift = caesar_cipher.analyze_file(args.file_in, args.file_out, dictionary)
+    print(f"Shift {shift}")
+
+
+def knapsack_keygen(args: argparse.Namespace) -> None:
+    """Write a new key pair"""
+    from src.projects.knapsack import knapsack_cipher
+
+    knapsack_cipher.write_keys(args.public, args.private, args.size)
+
+
+def knapsack_encrypt(args: argparse.Namespace) -> None:
+    """Encrypt a file with a public key"""
+    from src.projects.knapsack import knapsack_cipher
+
+    gk = knapsack_cipher.read_public_key(args.key)
+    knapsack_cipher.encrypt_file(args.file_in, args.file_out, gk)
+
+
+def knapsack_decrypt(args: argparse.Namespace) -> None:
+    """Decrypt a file with a private key"""
+    from src.projects.knapsack import knapsack_cipher
+
+    sik, n, m = knapsack_cipher.read_private_key(args.key)
+    knapsack_cipher.decrypt_file(args.file_in, args.file_out, sik, n, m)
+
+
+def crack(args: argparse.Namespace) -> None:
+    """Run a wordlist or mask attack and print the cracked passwords"""
+    from src.projects.passwords import cracker
+    from src.projects.passwords.mask import Mask
+
+    hashes = []
+    for filename in args.hash_files:
+        hashes += cracker.load_hashes(filename)
+    stats = cracker.CrackStats()
+    options = dict(workers=args.workers, stats=stats)
+    if args.chunk_size:
+        options["chunk_size"] = args.chunk_size
+    if args.mask:
+        mask = Mask(args.mask, dict(args.custom))
+        cracked = cracker.crack_mask(hashes, mask, args.start, **options)
+    else:
+        cracked = cracker.crack(hashes, cracker.read_wordlist(args.wordlist), **options)
+    for user in sorted(cracked):
+        print(f"{user}:{cracked[user]}")
+    print(stats.status_line())
+    if args.stats:
+        stats.export(args.stats)
+
+
+def vpn_server(args: argparse.Namespace) -> None:
+    """Run the VPN server with the remaining arguments"""
+    from src.projects.vpn import server
+
+    server.main(args.args)
+
+
+def vpn_client(args: argparse.Namespace) -> None:
+    """Run the VPN client with the remaining arguments"""
+    from src.projects.vpn import client
+
+    client.main(args.args)
+
+
+def custom_charset(value: str) -> tuple:
+    """Parse a `--custom` value such as 1=xyz into the pair ("1", "xyz")"""
+    name, sep, chars = value.partition("=")
+    if not (name and sep and chars):
+        raise argparse.ArgumentTypeError("expected N=CHARS")
+    return name, chars
+
+
+def mask_pattern(value: str) -> str:
+    """Check a `--mask` value, its custom charsets are checked with the `--custom` values"""
+    from src.projects.passwords.mask import CHARSETS, tokenize
+
+    try:
+        tokens = tokenize(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err)) from None
+    for token in tokens:
+        if len(token) == 2 and token != "??" and not (token[1] in CHARSETS or token[1].isdigit()):
+            raise argparse.ArgumentTypeError(f"Unknown charset {token}")
+    return value
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Parser of every subcommand, each dispatching to its function as `func`"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", metavar="command", required=True)
+
+    a51 = commands.add_parser("a51", help="A5/1 stream cipher")
+    a51_actions = a51.add_subparsers(dest="action", metavar="action", required=True)
+    command = a51_actions.add_parser("encrypt", help="encrypt a file line by line")
+    command.add_argument("file_in")
+    command.add_argument("--secret", required=True, help="secret to fill the registers")
+    command.add_argument("-o", "--output", help="output file, FILE_IN.secret by default")
+    command.set_defaults(func=a51_encrypt)
+
+    caesar = commands.add_parser("caesar", help="Caesar cipher")
+    caesar_actions = caesar.add_subparsers(dest="action", metavar="action", required=True)
+    command = caesar_actions.add_parser("encrypt", help="encrypt a file")
+    command.add_argument("file_in")
+    command.add_argument("file_out")
+    command.add_argument("--shift", type=int, required=True)
+    command.add_argument("--obfuscate", action="store_true", help="remove punctuation and spaces")
+    command.set_defaults(func=caesar_encrypt)
+    command = caesar_actions.add_parser("decrypt", help="decrypt a file with a known shift")
+    command.add_argument("file_in")
+    command.add_argument("file_out")
+    command.add_argument("--shift", type=int, required=True)
+    command.set_defaults(func=caesar_decrypt)
+    command = caesar_actions.add_parser("analyze", help="find the shift and decrypt a file")
+    command.add_argument("file_in")
+    command.add_argument("file_out")
+    command.add_argument("--dictionary", default=CAESAR_DICTIONARY, help="wordlist file")
+    command.set_defaults(func=caesar_analyze)
+
+    knapsack = commands.add_parser("knapsack", help="Merkle-Hellman knapsack cipher")
+    knapsack_actions = knapsack.add_subparsers(dest="action", metavar="action", required=True)
+    command = knapsack_actions.add_parser("keygen", help="write a new key pair")
+    command.add_argument("public")
+    command.add_argument("private")
+    command.add_argument("--size", type=int, default=64, help="knapsack items, bits per block")
+    command.set_defaults(func=knapsack_keygen)
+    command = knapsack_actions.add_parser("encrypt", help="encrypt a file")
+    command.add_argument("file_in")
+    command.add_argument("file_out")
+    command.add_argument("--key", required=True, help="public key file")
+    command.set_defaults(func=knapsack_encrypt)
+    command = knapsack_actions.add_parser("decrypt", help="decrypt a file")
+    command.add_argument("file_in")
+    command.add_argument("file_out")
+    command.add_argument("--key", required=True, help="private key file")
+    command.set_defaults(func=knapsack_decrypt)
+
+    command = commands.add_parser("crack", help="crack passwd, shadow, and sam hashes")
+    command.add_argument("hash_files", nargs="+", metavar="hash_file")
+    attack = command.add_mutually_exclusive_group()
+    attack.add_argument("--wordlist", default=WORDLIST)
+    attack.add_argument(
+        "--mask", type=mask_pattern, help="hashcat-style mask such as ?l?l?d?d"
+    )
+    command.add_argument(
+        "--custom",
+        action="append",
+        default=[],
+        type=custom_charset,
+        metavar="N=CHARS",
+        help="custom charset ?N of the mask, may be repeated",
+    )
+    command.add_argument("--start", type=int, default=0, help="mask index to resume from")
+    command.add_argument("--workers", type=int, help="worker processes, one per CPU by default")
+    command.add_argument("--chunk-size", type=int, help="candidates sent to a worker at once")
+    command.add_argument("--stats", help="write the run's counters to this JSON file")
+    command.set_defaults(func=crack)
+
+    # The VPN endpoints parse their own arguments, so that `--help` is theirs
+    for name, help_text, func in (
+        ("vpn-server", "run the VPN server", vpn_server),
+        ("vpn-client", "run the VPN client", vpn_client),
+    ):
+        command = commands.add_parser(name, help=help_text, add_help=False)
+        command.add_argument("args", nargs=argparse.REMAINDER)
+        command.set_defaults(func=func)
+    return parser
+
+
+def main(argv: list = None):
+    """Main function
+
+    :param argv: command line arguments, sys.argv[1:] if None
+    """
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if "args" in args:
+        # Options such as --help go to the VPN endpoint rather than to this parser
+        args.args = extra + args.args
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    if getattr(args, "mask", None):
+        from src.projects.passwords.mask import Mask
+
+        # --custom may come after --mask, so a ?N without its charset is caught only here
+        try:
+            Mask(args.mask, dict(args.custom))
+        except ValueError as err:
+            parser.error(f"argument --mask: {err}")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
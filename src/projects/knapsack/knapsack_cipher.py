@@ -4,6 +4,10 @@
 import math
 import pathlib
 import random
+from typing import Iterable, Iterator
+
+from src.projects import streaming
+from src.projects.profiling import profiled
 
 BLOCK_SIZE = 64
 
@@ -110,61 +114,176 @@ def generate_gk(sik: tuple, n: int = None, m: int = None) -> tuple:
     return tuple(sik[i]*m%n for i in range(len(sik)))
 
 
+def _block_bits(chars: str, size: int) -> str:
+    """Bits of a block of characters, fitted to a knapsack of `size` items
+
+    A block shorter than the knapsack is padded with zero bits on the right,
+    a longer one (a byte for a knapsack under 8 items) keeps its low bits.
+    """
+    bits = "".join(format(ord(char), "b").zfill(8) for char in chars)
+    if len(bits) > size:
+        return bits[-size:]
+    return bits.ljust(size, "0")
+
+
+@profiled
 def encrypt(plaintext: str, gk: tuple, block: int = BLOCK_SIZE) -> list:
-    """Encrypt a message"""
-    plaintext_l = len(plaintext)
-    
-    binary_val = ""
-    
-    for i in range(plaintext_l):
-        print(plaintext[i])
-        binary_val += format(ord(plaintext[i]), 'b').zfill(8)
-    
-    
-    result = 0
-    
-    gk_idx = len(gk) - 1
-    bi_idx = len(binary_val) - 1
-    print(gk)
-    print(gk_idx, bi_idx)
-    while gk_idx >=0 and bi_idx >= 0:
-        
-        if binary_val[bi_idx] == "1":
-            result += gk[gk_idx]
-        gk_idx -= 1
-        bi_idx -= 1
-        
-            
-    return [result]
+    """Encrypt a message
+
+    Every `len(gk) // 8` characters (at least one) make a block, encrypted
+    to one number of the returned list. `block` is kept for compatibility,
+    the block size is that of the knapsack.
+
+    The last block is padded with NULs and its length is not recorded, so a
+    plaintext ending in "\x00" loses those characters in `decrypt`.
+    """
+    size = len(gk)
+    chars = max(size // 8, 1)
+    result = []
+    for start in range(0, len(plaintext), chars):
+        bits = _block_bits(plaintext[start : start + chars], size)
+        result.append(sum(weight for weight, bit in zip(gk, bits) if bit == "1"))
+    return result
 
+
+@profiled
 def decrypt(
     ciphertext: list, sik: tuple, n: int = None, m: int = None, block: int = BLOCK_SIZE,
 ) -> str:
-    """Decrypt a single block"""
-    
-    decimal_val = ciphertext[0] * calculate_inverse(sik, n, m) % n
-    print(decimal_val)
-    
-    l = len(sik) - 1
-    
-    result = ""
-    while l >= 0 and decimal_val > 0:
-        if decimal_val >= sik[l]:
-            result = "1" + result
-            decimal_val -= sik[l]
+    """Decrypt a message, one block per number of the ciphertext
+
+    Trailing "\x00" characters are taken for the padding of the last block
+    and removed, see `encrypt`.
+    """
+    if n is None:
+        n = calculate_n(sik)
+        m = calculate_m(sik, n)
+    # The last block was padded with zero bits
+    return _decrypt_blocks(ciphertext, sik, n, calculate_inverse(sik, n, m)).rstrip("\x00")
+
+
+def _decrypt_blocks(ciphertext: list, sik: tuple, n: int, inverse: int) -> str:
+    """Characters of the blocks, padding included"""
+    result = []
+    for number in ciphertext:
+        decimal_val = number * inverse % n
+        bits = []
+        for weight in reversed(sik):
+            if decimal_val >= weight:
+                bits.append("1")
+                decimal_val -= weight
+            else:
+                bits.append("0")
+        bits = "".join(reversed(bits))
+        if len(bits) < 8:
+            result.append(chr(int(bits, 2)))
         else:
-            result = "0" + result
-        l -=1
-    
-    print(result)
-    result = int(result, 2)
-    print(result)
-    result = chr(result)
-    print(result)
-    return result
-    
-    
-    
+            result.extend(chr(int(bits[i : i + 8], 2)) for i in range(0, len(bits) - 7, 8))
+    return "".join(result)
+
+
+def encrypt_stream(gk: tuple) -> streaming.Stage:
+    """Stage encrypting bytes to the lines of numbers written by `encrypt_file`"""
+    chars = max(len(gk) // 8, 1)
+
+    def stage(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        pending = b""
+        for chunk in chunks:
+            data = pending + bytes(chunk)
+            # A block split across chunks waits for the rest of its bytes
+            full = len(data) - len(data) % chars
+            pending = data[full:]
+            if full:
+                yield _number_lines(encrypt(data[:full].decode("latin-1"), gk))
+        if pending:
+            yield _number_lines(encrypt(pending.decode("latin-1"), gk))
+
+    return stage
+
+
+def _number_lines(numbers: list) -> bytes:
+    """Numbers of the ciphertext, one per line"""
+    return "".join(f"{number}\n" for number in numbers).encode("ascii")
+
+
+def decrypt_stream(sik: tuple, n: int, m: int) -> streaming.Stage:
+    """Stage undoing `encrypt_stream`, trailing NULs are removed as by `decrypt`
+
+    :raise: ValueError if a line is not a number
+    """
+    inverse = calculate_inverse(sik, n, m)
+
+    def stage(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        pending = held = b""
+        for chunk in chunks:
+            data = pending + bytes(chunk)
+            # A number split across chunks waits for its line break
+            end = data.rfind(b"\n") + 1
+            pending = data[end:]
+            plaintext = held + _decrypt_blocks(
+                [int(number) for number in data[:end].split()], sik, n, inverse
+            ).encode("latin-1")
+            # Trailing NULs may be the padding of the last block, known only at the end
+            kept = plaintext.rstrip(b"\x00")
+            held = plaintext[len(kept) :]
+            if kept:
+                yield kept
+        plaintext = held + _decrypt_blocks(
+            [int(number) for number in pending.split()], sik, n, inverse
+        ).encode("latin-1")
+        yield plaintext.rstrip(b"\x00")
+
+    return stage
+
+
+def read_public_key(file_name: str) -> tuple:
+    """Read a general knapsack, its values on one line separated by commas"""
+    with open(file_name, "r", encoding="utf-8") as file_in:
+        return tuple(map(int, file_in.readline().strip().split(", ")))
+
+
+def read_private_key(file_name: str) -> tuple:
+    """Read a superincreasing knapsack line followed by N and M lines
+
+    return (sik, n, m) tuple
+    """
+    with open(file_name, "r", encoding="utf-8") as file_in:
+        sik = tuple(map(int, file_in.readline().strip().split(", ")))
+        n = int(file_in.readline().strip())
+        m = int(file_in.readline().strip())
+    return sik, n, m
+
+
+def write_keys(public_name: str, private_name: str, size: int = BLOCK_SIZE) -> None:
+    """Generate a key pair and write it in the format of the read functions"""
+    sik = generate_sik(size)
+    n = calculate_n(sik)
+    m = calculate_m(sik, n)
+    with open(public_name, "w", encoding="utf-8") as file_out:
+        file_out.write(", ".join(map(str, generate_gk(sik, n, m))) + "\n")
+    with open(private_name, "w", encoding="utf-8") as file_out:
+        file_out.write(", ".join(map(str, sik)) + f"\n{n}\n{m}\n")
+
+
+def encrypt_file(
+    file_in_name: str, file_out_name: str, gk: tuple, chunk_size: int = streaming.CHUNK_SIZE
+) -> None:
+    """Encrypt a file, writing one number per block on its own line"""
+    streaming.process_file(file_in_name, file_out_name, encrypt_stream(gk), chunk_size=chunk_size)
+
+
+def decrypt_file(
+    file_in_name: str,
+    file_out_name: str,
+    sik: tuple,
+    n: int,
+    m: int,
+    chunk_size: int = streaming.CHUNK_SIZE,
+) -> None:
+    """Decrypt a file written by `encrypt_file`"""
+    streaming.process_file(
+        file_in_name, file_out_name, decrypt_stream(sik, n, m), chunk_size=chunk_size
+    )
 
 
 def main():
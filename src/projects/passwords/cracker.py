@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Wordlist cracker for passwd, shadow, and sam files"""
+
+import json
+import os
+import time
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool, current_process
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from Crypto.Hash import MD4
+
+from src.projects.passwords.mask import Mask, MaskRange
+
+try:
+    import crypt
+except ImportError:
+    # Removed in Python 3.13, passwd and shadow hashes are then skipped like locked ones
+    crypt = None
+
+HASH_TYPES = {"$1$": "md5crypt", "$6$": "sha512crypt"} if crypt is not None else {}
+CHUNK_SIZE = 1000
+STATUS_INTERVAL = 5.0
+
+# Targets grouped by hash type, set once per worker by `_init_worker`
+_TARGETS: Dict[str, List[Tuple[str, str]]] = {}
+
+
+def load_hashes(filename: str) -> List[Tuple[str, str, str]]:
+    """Read password hashes from a passwd, shadow, or sam file
+
+    :param filename: file to read
+    :return: list of (username, hash_type, hash) tuples
+    Lines with unsupported or locked hashes are skipped
+    """
+    result = []
+    with open(filename, "r", encoding="utf-8") as file_in:
+        for line in file_in:
+            fields = line.strip().split(":")
+            if len(fields) < 4:
+                continue
+            if fields[1].startswith("$"):
+                prefix = fields[1][: fields[1].find("$", 1) + 1]
+                if prefix in HASH_TYPES:
+                    result.append((fields[0], HASH_TYPES[prefix], fields[1]))
+            elif len(fields[3]) == 32:
+                result.append((fields[0], "ntlm", fields[3].lower()))
+    return result
+
+
+def read_wordlist(filename: str) -> Iterator[str]:
+    """Lazily read candidates from a wordlist, one per line
+
+    :param filename: wordlist to read
+    :return: generator of candidates
+    """
+    with open(filename, "r", encoding="utf-8", errors="ignore") as file_in:
+        for line in file_in:
+            word = line.rstrip("\r\n")
+            if word:
+                yield word
+
+
+def hash_ntlm(candidate: str) -> str:
+    """Compute the NT hash of a candidate
+
+    :param candidate: plaintext password
+    :return: MD4 of the UTF-16LE encoded password as a hex string
+    """
+    return MD4.new(candidate.encode("utf-16-le")).hexdigest()
+
+
+def check_candidates(
+    hash_type: str, targets: List[Tuple[str, str]], candidates: List[str]
+) -> List[Tuple[str, str]]:
+    """Hash candidates and compare them against targets of a single type
+
+    :param hash_type: one of `ntlm` or the values in `HASH_TYPES`
+    :param targets: list of (username, hash) tuples
+    :param candidates: plaintext passwords to try
+    :return: list of (username, password) tuples that matched
+    """
+    found = []
+    if hash_type == "ntlm":
+        # Unsalted, so every candidate is hashed once for all users
+        lookup: Dict[str, List[str]] = {}
+        for user, hashed in targets:
+            lookup.setdefault(hashed, []).append(user)
+        for candidate in candidates:
+            for user in lookup.get(hash_ntlm(candidate), ()):
+                found.append((user, candidate))
+    else:
+        for user, hashed in targets:
+            for candidate in candidates:
+                if crypt.crypt(candidate, hashed) == hashed:
+                    found.append((user, candidate))
+                    break
+    return found
+
+
+class CrackStats:
+    """Throughput, latency, and queue counters of a cracking run"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.by_type: Dict[str, dict] = {}
+        self.by_worker: Dict[str, dict] = {}
+        self.first_crack = None
+        # Candidates tried in order, an interrupted mask attack resumes from here
+        self.position = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self._queue_samples = 0
+        self._queue_total = 0
+
+    def elapsed(self) -> float:
+        """Seconds since the run started"""
+        return time.monotonic() - self.start
+
+    def record_chunk(
+        self, hash_type: str, worker: str, candidates: int, hashes: int, seconds: float
+    ) -> None:
+        """Account for a chunk of candidates processed by a worker"""
+        counters = self.by_type.setdefault(
+            hash_type,
+            {"candidates": 0, "hashes": 0, "seconds": 0.0, "cracked": 0, "first_crack": None},
+        )
+        counters["candidates"] += candidates
+        counters["hashes"] += hashes
+        counters["seconds"] += seconds
+        counters = self.by_worker.setdefault(worker, {"candidates": 0, "seconds": 0.0})
+        counters["candidates"] += candidates
+        counters["seconds"] += seconds
+
+    def record_crack(self, hash_type: str) -> None:
+        """Account for a cracked password"""
+        now = self.elapsed()
+        counters = self.by_type[hash_type]
+        counters["cracked"] += 1
+        if counters["first_crack"] is None:
+            counters["first_crack"] = now
+        if self.first_crack is None:
+            self.first_crack = now
+
+    def record_queue_depth(self, depth: int) -> None:
+        """Sample the number of chunks waiting for a worker"""
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self._queue_samples += 1
+        self._queue_total += depth
+
+    def as_dict(self) -> dict:
+        """Summarize the counters, including derived rates
+
+        Per-type rates are against wall time, per-worker rates against busy time
+        """
+        elapsed = self.elapsed()
+        return {
+            "elapsed": elapsed,
+            "first_crack": self.first_crack,
+            "position": self.position,
+            "queue": {
+                "current": self.queue_depth,
+                "max": self.max_queue_depth,
+                "mean": self._queue_total / self._queue_samples if self._queue_samples else 0.0,
+            },
+            "types": {
+                name: dict(counters, rate=counters["candidates"] / elapsed if elapsed else 0.0)
+                for name, counters in self.by_type.items()
+            },
+            "workers": {
+                name: dict(
+                    counters,
+                    rate=counters["candidates"] / counters["seconds"] if counters["seconds"] else 0.0,
+                )
+                for name, counters in self.by_worker.items()
+            },
+        }
+
+    def status_line(self) -> str:
+        """One-line progress summary"""
+        summary = self.as_dict()
+        parts = [f"[{summary['elapsed']:.1f}s]"]
+        for name, counters in summary["types"].items():
+            parts.append(
+                f"{name}: {counters['rate']:.0f} c/s, {counters['candidates']} tried, "
+                f"{counters['cracked']} cracked"
+            )
+        parts.append(f"position: {self.position}")
+        parts.append(f"queue: {self.queue_depth}")
+        return " | ".join(parts)
+
+    def export(self, filename: str) -> None:
+        """Write the summary to a JSON file"""
+        with open(filename, "w", encoding="utf-8") as file_out:
+            json.dump(self.as_dict(), file_out, indent=2)
+
+
+def _init_worker(targets: Dict[str, List[Tuple[str, str]]]) -> None:
+    """Pool initializer, ships the targets to a worker only once"""
+    global _TARGETS
+    _TARGETS = targets
+
+
+def _crack_chunk(hash_type: str, candidates: List[str]) -> tuple:
+    """Pool task: check one chunk of candidates against one hash type"""
+    start = time.perf_counter()
+    found = check_candidates(hash_type, _TARGETS[hash_type], candidates)
+    hashes = len(candidates) if hash_type == "ntlm" else len(candidates) * len(_TARGETS[hash_type])
+    return (
+        hash_type,
+        current_process().name,
+        len(candidates),
+        hashes,
+        time.perf_counter() - start,
+        found,
+    )
+
+
+def _chunks(candidates: Iterable[str], size: int) -> Iterator[Tuple[List[str], int]]:
+    """Split candidates into lists of at most `size` items
+
+    :return: generator of (chunk, offset after the chunk) tuples
+    """
+    candidates = iter(candidates)
+    offset = 0
+    chunk = list(islice(candidates, size))
+    while chunk:
+        offset += len(chunk)
+        yield chunk, offset
+        chunk = list(islice(candidates, size))
+
+
+def _mask_chunks(mask: Mask, size: int, start: int) -> Iterator[Tuple[MaskRange, int]]:
+    """Split the keyspace of a mask into ranges of at most `size` candidates
+
+    Only the range bounds are sent to the workers, they generate candidates themselves
+    """
+    for offset in range(start, mask.keyspace, size):
+        chunk = mask.range(offset, offset + size)
+        yield chunk, chunk.stop
+
+
+def _run(
+    hashes: List[Tuple[str, str, str]],
+    chunks: Iterator[Tuple[Iterable[str], int]],
+    workers: int,
+    stats: CrackStats,
+    status_interval: float,
+) -> Dict[str, str]:
+    """Send every chunk to a worker once per hash type and collect the results"""
+    targets: Dict[str, List[Tuple[str, str]]] = {}
+    for user, hash_type, hashed in hashes:
+        targets.setdefault(hash_type, []).append((user, hashed))
+    if not targets:
+        # Nothing to compare against, walking the candidates would only burn time
+        return {}
+    if workers is None:
+        workers = os.cpu_count() or 1
+    cracked: Dict[str, str] = {}
+    last_status = stats.elapsed()
+
+    def collect(task: tuple) -> None:
+        nonlocal last_status
+        result, position = task
+        hash_type, worker, tried, hashed, seconds, found = result.get()
+        stats.record_chunk(hash_type, worker, tried, hashed, seconds)
+        for user, password in found:
+            if user not in cracked:
+                cracked[user] = password
+                stats.record_crack(hash_type)
+        if position is not None:
+            stats.position = position
+        if status_interval and stats.elapsed() - last_status >= status_interval:
+            last_status = stats.elapsed()
+            print(stats.status_line())
+
+    with Pool(workers, _init_worker, (targets,)) as pool:
+        # Keep a couple of chunks per worker in flight so none of them idles
+        max_pending = 2 * workers * max(len(targets), 1)
+        pending: deque = deque()
+        for chunk, position in chunks:
+            for i, hash_type in enumerate(targets, 1):
+                # Results are collected in order, so once the last task of a chunk
+                # is in, everything up to `position` has been tried
+                pending.append(
+                    (
+                        pool.apply_async(_crack_chunk, (hash_type, chunk)),
+                        position if i == len(targets) else None,
+                    )
+                )
+            stats.record_queue_depth(len(pending))
+            while len(pending) >= max_pending:
+                collect(pending.popleft())
+        while pending:
+            stats.record_queue_depth(len(pending))
+            collect(pending.popleft())
+    stats.record_queue_depth(0)
+    return cracked
+
+
+def crack(
+    hashes: List[Tuple[str, str, str]],
+    candidates: Iterable[str],
+    workers: int = None,
+    chunk_size: int = CHUNK_SIZE,
+    stats: CrackStats = None,
+    status_interval: float = STATUS_INTERVAL,
+) -> Dict[str, str]:
+    """Run a wordlist attack on a pool of worker processes
+
+    :param hashes: (username, hash_type, hash) tuples as returned by `load_hashes`
+    :param candidates: plaintext passwords to try
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param chunk_size: number of candidates sent to a worker at once
+    :param stats: counters to update, a new `CrackStats` is used if omitted
+    :param status_interval: seconds between status lines, 0 to disable them
+    :return: dictionary of cracked passwords keyed by username
+    """
+    if stats is None:
+        stats = CrackStats()
+    return _run(hashes, _chunks(candidates, chunk_size), workers, stats, status_interval)
+
+
+def crack_mask(
+    hashes: List[Tuple[str, str, str]],
+    mask: Mask,
+    start: int = 0,
+    workers: int = None,
+    chunk_size: int = CHUNK_SIZE,
+    stats: CrackStats = None,
+    status_interval: float = STATUS_INTERVAL,
+) -> Dict[str, str]:
+    """Run a mask (brute-force) attack on a pool of worker processes
+
+    :param hashes: (username, hash_type, hash) tuples as returned by `load_hashes`
+    :param mask: keyspace to exhaust
+    :param start: index to resume from, e.g. `stats.position` of an interrupted run
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param chunk_size: number of candidates in a contiguous range sent to a worker
+    :param stats: counters to update, a new `CrackStats` is used if omitted
+    :param status_interval: seconds between status lines, 0 to disable them
+    :return: dictionary of cracked passwords keyed by username
+    """
+    if stats is None:
+        stats = CrackStats()
+    stats.position = start
+    return _run(hashes, _mask_chunks(mask, chunk_size, start), workers, stats, status_interval)
+
+
+def main():
+    """Main function"""
+    stats = CrackStats()
+    hashes = []
+    for filename in ("passwd", "shadow", "sam"):
+        hashes += load_hashes(f"data/projects/passwords/{filename}")
+    cracked = crack(hashes, read_wordlist("data/projects/passwords/english.txt"), stats=stats)
+    for user in sorted(cracked):
+        print(f"{user}:{cracked[user]}")
+    print(stats.status_line())
+    stats.export("data/projects/passwords/crack_stats.json")
+
+
+if __name__ == "__main__":
+    main()
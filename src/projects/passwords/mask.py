@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Mask attack candidate generator with random access into the keyspace"""
+
+import string
+from typing import Dict, Iterator, List, Tuple
+
+CHARSETS = {
+    "l": string.ascii_lowercase,
+    "u": string.ascii_uppercase,
+    "d": string.digits,
+    "s": " " + string.punctuation,
+}
+CHARSETS["a"] = CHARSETS["l"] + CHARSETS["u"] + CHARSETS["d"] + CHARSETS["s"]
+
+
+class Mask:
+    """Keyspace described by a hashcat-style mask such as `?l?l?d?d`
+
+    `?l`, `?u`, `?d`, `?s`, `?a` are the built-in charsets, `?1`-`?9` refer to
+    `custom` charsets, `??` is a literal question mark, anything else is literal.
+    Repeated characters of a custom charset are kept once, in order of first appearance.
+    Candidates are numbered in lexicographic order of the charsets, the last
+    position changing fastest, so any index maps directly to a candidate.
+    """
+
+    def __init__(self, pattern: str, custom: Dict[str, str] = None):
+        self.pattern = pattern
+        # A repeated character would give two indices for the same candidate
+        self.custom = {
+            name: "".join(dict.fromkeys(chars)) for name, chars in (custom or {}).items()
+        }
+        self.positions = self._parse(pattern, self.custom)
+        self.keyspace = 1
+        for charset in self.positions:
+            self.keyspace *= len(charset)
+        # Position lookup tables for `index`
+        self._lookup = [{char: i for i, char in enumerate(charset)} for charset in self.positions]
+
+    @staticmethod
+    def _parse(pattern: str, custom: Dict[str, str]) -> List[str]:
+        """Split the mask into a charset per position"""
+        positions = []
+        for token in tokenize(pattern):
+            if len(token) == 1:
+                positions.append(token)
+            elif token == "??":
+                positions.append("?")
+            elif token[1] in CHARSETS:
+                positions.append(CHARSETS[token[1]])
+            elif token[1] in custom:
+                positions.append(custom[token[1]])
+            else:
+                raise ValueError(f"Unknown charset {token}")
+        return positions
+
+    def __len__(self) -> int:
+        """Size of the keyspace
+
+        `len()` raises OverflowError past `sys.maxsize` candidates, e.g. for
+        `?a` ten times, so code that may handle such masks uses `keyspace`.
+        """
+        return self.keyspace
+
+    def __repr__(self) -> str:
+        return f"Mask({self.pattern!r}, {self.custom!r})"
+
+    def __getitem__(self, index: int) -> str:
+        return self.candidate(index)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_range(0, self.keyspace)
+
+    def candidate(self, index: int) -> str:
+        """Get the candidate at `index`
+
+        :param index: position in the keyspace, negative values count from the end
+        :return: candidate string
+        :raise: IndexError if the index is outside of the keyspace
+        """
+        if index < 0:
+            index += self.keyspace
+        if not 0 <= index < self.keyspace:
+            raise IndexError("Mask index out of range")
+        chars = []
+        for charset in reversed(self.positions):
+            index, digit = divmod(index, len(charset))
+            chars.append(charset[digit])
+        return "".join(reversed(chars))
+
+    def index(self, candidate: str) -> int:
+        """Get the position of `candidate` in the keyspace
+
+        :param candidate: string matching the mask
+        :return: index such that `self.candidate(index) == candidate`
+        :raise: ValueError if the candidate does not match the mask
+        """
+        if len(candidate) != len(self.positions):
+            raise ValueError(f"{candidate!r} does not match {self.pattern}")
+        index = 0
+        for char, charset, lookup in zip(candidate, self.positions, self._lookup):
+            if char not in lookup:
+                raise ValueError(f"{candidate!r} does not match {self.pattern}")
+            index = index * len(charset) + lookup[char]
+        return index
+
+    def iter_range(self, start: int, stop: int) -> Iterator[str]:
+        """Generate candidates with indices in [start, stop)
+
+        Only the first candidate is decoded, the rest are produced by
+        incrementing the mixed-radix digits like an odometer
+        """
+        stop = min(stop, self.keyspace)
+        if start >= stop:
+            return
+        chars = list(self.candidate(start))
+        digits = [self._lookup[i][char] for i, char in enumerate(chars)]
+        last = len(self.positions) - 1
+        for _ in range(stop - start):
+            yield "".join(chars)
+            pos = last
+            while pos >= 0:
+                digits[pos] += 1
+                if digits[pos] < len(self.positions[pos]):
+                    chars[pos] = self.positions[pos][digits[pos]]
+                    break
+                digits[pos] = 0
+                chars[pos] = self.positions[pos][0]
+                pos -= 1
+
+    def range(self, start: int, stop: int) -> "MaskRange":
+        """Get a picklable, re-iterable slice of the keyspace"""
+        return MaskRange(self, start, min(stop, self.keyspace))
+
+    def partition(self, parts: int, start: int = 0) -> List[Tuple[int, int]]:
+        """Split the keyspace into contiguous ranges of (almost) equal size
+
+        :param parts: number of ranges, e.g. one per worker
+        :param start: index to resume from, everything before it is skipped
+        :return: list of (start, stop) tuples covering [start, keyspace)
+        :raise: ValueError if `parts` is less than 1
+        """
+        if parts < 1:
+            raise ValueError("Need at least one part")
+        total = max(self.keyspace - start, 0)
+        size, extra = divmod(total, parts)
+        ranges = []
+        for i in range(parts):
+            stop = start + size + (1 if i < extra else 0)
+            ranges.append((start, stop))
+            start = stop
+        return ranges
+
+
+class MaskRange:
+    """Candidates with indices in [start, stop) of a mask"""
+
+    def __init__(self, mask: Mask, start: int, stop: int):
+        self.mask = mask
+        self.start = start
+        self.stop = stop
+
+    def __len__(self) -> int:
+        return max(self.stop - self.start, 0)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.mask.iter_range(self.start, self.stop)
+
+    def __reduce__(self):
+        # Workers rebuild the lookup tables instead of unpickling them
+        return (_mask_range, (self.mask.pattern, self.mask.custom, self.start, self.stop))
+
+
+def _mask_range(pattern: str, custom: Dict[str, str], start: int, stop: int) -> MaskRange:
+    """Unpickle a `MaskRange`"""
+    return MaskRange(Mask(pattern, custom), start, stop)
+
+
+def tokenize(pattern: str) -> List[str]:
+    """Split a mask into one token (`?x` or a literal) per position"""
+    tokens = []
+    i = 0
+    while i < len(pattern):
+        if pattern[i] != "?":
+            tokens.append(pattern[i])
+            i += 1
+        elif i + 1 == len(pattern):
+            raise ValueError("Dangling ? at the end of the mask")
+        else:
+            tokens.append(pattern[i : i + 2])
+            i += 2
+    return tokens
+
+
+def incremental(pattern: str, custom: Dict[str, str] = None, min_length: int = 1) -> List[Mask]:
+    """Masks for every prefix of `pattern`, to cover all shorter passwords too
+
+    :param pattern: longest mask, e.g. `?1?1?1?1?1?1`
+    :param custom: custom charsets
+    :param min_length: shortest candidate length
+    :return: list of masks from the shortest to the longest
+    """
+    tokens = tokenize(pattern)
+    return [
+        Mask("".join(tokens[:length]), custom)
+        for length in range(max(min_length, 1), len(tokens) + 1)
+    ]
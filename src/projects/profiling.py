@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Opt-in profiling hooks for the cipher and VPN hot paths
+
+Set IAS_PROFILE to a file name to turn the hooks on, e.g.
+
+    IAS_PROFILE=profile.folded python -m src.projects.vpn.server
+
+Every function decorated with `profiled` and every `section` block then
+counts its calls and adds up its cumulative time (including what it calls)
+and self time (excluding other profiled code it calls). On exit the self
+times are written to the file as collapsed stacks, one line per call path,
+in microseconds, ready for flamegraph.pl or speedscope, and a summary table
+is printed to stderr. A `{pid}` in the file name is replaced by the process
+ID, for servers with worker processes.
+
+When IAS_PROFILE is not set, `profiled` returns the function unchanged and
+`section` returns a shared no-op context manager, so the hooks cost one
+function call at most.
+
+The call path is kept in a context variable, so concurrent asyncio tasks
+and threads each get their own stack.
+"""
+
+import atexit
+import functools
+import inspect
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, ContextManager, Dict, List
+
+ENV_VAR = "IAS_PROFILE"
+
+
+class _Frame:
+    """A profiled call in progress"""
+
+    __slots__ = ("name", "path", "start", "children", "outermost")
+
+    def __init__(self, name: str, path: str, start: float, outermost: bool):
+        self.name = name
+        self.path = path
+        self.start = start
+        # Time spent in profiled code called from this frame
+        self.children = 0.0
+        # False for recursive calls, which must not count twice in the cumulative time
+        self.outermost = outermost
+
+
+class Profiler:
+    """Call counts and times of named code, by name and by call path"""
+
+    def __init__(self, clock: Callable[[], float] = perf_counter):
+        self.clock = clock
+        self.calls = Counter()
+        self.cumulative: Dict[str, float] = Counter()
+        self.self_time: Dict[str, float] = Counter()
+        self.stacks: Dict[str, float] = Counter()
+        self._stack = ContextVar(f"profiler_stack_{id(self)}", default=())
+        self._lock = threading.Lock()
+
+    def enter(self, name: str) -> tuple:
+        """Start timing `name` under whatever is running now
+
+        :return: token to pass to `exit`
+        """
+        stack = self._stack.get()
+        if stack:
+            path = f"{stack[-1].path};{name}"
+            outermost = all(frame.name != name for frame in stack)
+        else:
+            path, outermost = name, True
+        frame = _Frame(name, path, self.clock(), outermost)
+        return frame, self._stack.set(stack + (frame,))
+
+    def exit(self, token: tuple) -> None:
+        """Stop timing the frame started by `enter`"""
+        frame, stack_token = token
+        elapsed = self.clock() - frame.start
+        self._stack.reset(stack_token)
+        stack = self._stack.get()
+        if stack:
+            stack[-1].children += elapsed
+        own = elapsed - frame.children
+        with self._lock:
+            self.calls[frame.name] += 1
+            if frame.outermost:
+                self.cumulative[frame.name] += elapsed
+            self.self_time[frame.name] += own
+            self.stacks[frame.path] += own
+
+    @contextmanager
+    def section(self, name: str):
+        """Time the body of a `with` block as `name`"""
+        token = self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit(token)
+
+    def wrap(self, func: Callable, name: str = None) -> Callable:
+        """Time every call of `func`, a coroutine function included, as `name`"""
+        name = name or default_name(func)
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = self.enter(name)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.exit(token)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = self.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.exit(token)
+
+        return wrapper
+
+    def stats(self) -> Dict[str, dict]:
+        """Calls, cumulative and self seconds by name"""
+        with self._lock:
+            return {
+                name: {
+                    "calls": calls,
+                    "cumulative": self.cumulative[name],
+                    "self": self.self_time[name],
+                }
+                for name, calls in self.calls.items()
+            }
+
+    def collapsed(self) -> List[str]:
+        """Self time of every call path in collapsed stack format, in microseconds"""
+        with self._lock:
+            stacks = sorted(self.stacks.items())
+        return [f"{path} {round(seconds * 1e6)}" for path, seconds in stacks]
+
+    def report(self) -> str:
+        """Table of the stats, most cumulative time first"""
+        stats = sorted(self.stats().items(), key=lambda item: -item[1]["cumulative"])
+        width = max([len(name) for name, _ in stats] + [4])
+        lines = [
+            f"{'name':<{width}} {'calls':>10} {'cumulative s':>13} {'self s':>10} "
+            f"{'per call ms':>12}"
+        ]
+        for name, stat in stats:
+            lines.append(
+                f"{name:<{width}} {stat['calls']:>10} {stat['cumulative']:>13.6f} "
+                f"{stat['self']:>10.6f} {stat['cumulative'] / stat['calls'] * 1000:>12.4f}"
+            )
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        """Write the collapsed stacks to a file"""
+        with open(path, "w", encoding="utf-8") as file_out:
+            for line in self.collapsed():
+                file_out.write(line + "\n")
+
+
+def default_name(func: Callable) -> str:
+    """Short module name and qualified name, e.g. `a51_cipher.encrypt`"""
+    return f"{func.__module__.rpartition('.')[2]}.{func.__qualname__}"
+
+
+# The process-wide profiler, None unless turned on by the environment
+profiler = Profiler() if os.environ.get(ENV_VAR) else None
+_DISABLED = nullcontext()
+
+
+def profiled(func: Callable = None, *, name: str = None) -> Callable:
+    """Decorator timing a function with the process-wide profiler
+
+    Used bare as `@profiled` or with a name as `@profiled(name="...")`.
+    """
+    if func is None:
+        return functools.partial(profiled, name=name)
+    if profiler is None:
+        return func
+    return profiler.wrap(func, name)
+
+
+def section(name: str) -> ContextManager:
+    """Context manager timing a block with the process-wide profiler"""
+    if profiler is None:
+        return _DISABLED
+    return profiler.section(name)
+
+
+def _dump_at_exit() -> None:
+    """Write the collapsed stacks and print the summary"""
+    path = os.environ[ENV_VAR].replace("{pid}", str(os.getpid()))
+    profiler.dump(path)
+    print(profiler.report(), file=sys.stderr)
+    print(f"Collapsed stacks written to {path}", file=sys.stderr)
+
+
+if profiler is not None:
+    atexit.register(_dump_at_exit)
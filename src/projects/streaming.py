@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Bounded-memory file processing: source -> stages -> sink
+
+A stage is a function that takes an iterable of chunks (bytes-like objects,
+usually memoryviews) and yields transformed chunks; stages are chained by
+feeding one's output to the next, so a file flows through in chunks and
+memory use does not depend on its size. The ciphers provide their own
+stages next to their `encrypt_file` functions; this module has the sources,
+sinks, and the generic stages:
+
+    from src.projects import streaming
+    from src.projects.a51 import a51_cipher
+
+    streaming.process_file(
+        "roster", "roster.a51",
+        streaming.compress(), a51_cipher.stream("martin"), streaming.hex_encode,
+    )
+
+Chunks from `read_file` are views of one reused buffer, valid until the
+next chunk is read, so a stage that keeps data across chunks must copy it.
+`map_file` memory-maps the file instead and slices it into bytes, one copy
+less for stages such as `bytes.translate` that need bytes anyway.
+"""
+
+import mmap
+import os
+import zlib
+from typing import Callable, Iterable, Iterator
+
+CHUNK_SIZE = 64 * 1024
+MAP_CHUNK_SIZE = 1024 * 1024
+WHITESPACE = b" \t\r\n"
+
+Stage = Callable[[Iterable[bytes]], Iterator[bytes]]
+
+
+def read_file(file_name: str, chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+    """Source of a file's content in chunks of at most `chunk_size` bytes"""
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_name, "rb") as file_in:
+        while True:
+            size = file_in.readinto(buffer)
+            if not size:
+                return
+            yield view[:size]
+
+
+def map_file(file_name: str, chunk_size: int = MAP_CHUNK_SIZE) -> Iterator[bytes]:
+    """Source of a memory-mapped file's content in chunks of at most `chunk_size` bytes"""
+    with open(file_name, "rb") as file_in:
+        size = os.fstat(file_in.fileno()).st_size
+        # An empty file cannot be mapped
+        if not size:
+            return
+        with mmap.mmap(file_in.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, size, chunk_size):
+                yield mapped[start : start + chunk_size]
+
+
+def write_file(file_name: str, chunks: Iterable[bytes]) -> int:
+    """Sink writing every chunk to a file
+
+    :return: number of bytes written
+    """
+    written = 0
+    with open(file_name, "wb") as file_out:
+        for chunk in chunks:
+            written += file_out.write(chunk)
+    return written
+
+
+def pipeline(source: Iterable[bytes], *stages: Stage) -> Iterator[bytes]:
+    """Chain the stages onto the source, nothing runs until the result is consumed"""
+    chunks = source
+    for stage in stages:
+        chunks = stage(chunks)
+    return chunks
+
+
+def process_file(
+    file_in_name: str,
+    file_out_name: str,
+    *stages: Stage,
+    chunk_size: int = CHUNK_SIZE,
+    mapped: bool = False,
+) -> int:
+    """Run a file through the stages into another file
+
+    :param mapped: read with `map_file` rather than `read_file`
+    :return: number of bytes written
+    """
+    source = map_file if mapped else read_file
+    return write_file(file_out_name, pipeline(source(file_in_name, chunk_size), *stages))
+
+
+def map_chunks(func: Callable[[bytes], bytes]) -> Stage:
+    """Stage applying a function to every chunk on its own, for byte-wise transforms"""
+
+    def stage(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            yield func(chunk)
+
+    return stage
+
+
+def lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Stage regrouping chunks into lines, each with its line break if it had one"""
+    pending = bytearray()
+    for chunk in chunks:
+        # Only the new data can hold the next line break
+        searched = len(pending)
+        pending += chunk
+        start = 0
+        end = pending.find(b"\n", searched) + 1
+        while end:
+            yield bytes(pending[start:end])
+            start = end
+            end = pending.find(b"\n", start) + 1
+        del pending[:start]
+    if pending:
+        yield bytes(pending)
+
+
+def compress(level: int = 6) -> Stage:
+    """Stage compressing the stream with zlib"""
+
+    def stage(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        compressor = zlib.compressobj(level)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    return stage
+
+
+def decompress(chunk_size: int = CHUNK_SIZE) -> Stage:
+    """Stage undoing `compress`, never yielding more than `chunk_size` bytes at once
+
+    :raise: zlib.error if the stream is corrupt
+    """
+
+    def stage(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        decompressor = zlib.decompressobj()
+        for chunk in chunks:
+            data = chunk
+            # Bounded output per call, so a small chunk cannot expand into a huge one
+            while data:
+                output = decompressor.decompress(data, chunk_size)
+                if output:
+                    yield output
+                data = decompressor.unconsumed_tail
+        output = decompressor.flush()
+        if output:
+            yield output
+
+    return stage
+
+
+def hex_encode(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Stage encoding the stream as lowercase hex digits"""
+    for chunk in chunks:
+        yield chunk.hex().encode("ascii")
+
+
+def hex_decode(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Stage decoding hex digits, ignoring whitespace
+
+    :raise: ValueError if the stream has anything else or an odd number of digits
+    """
+    carry = b""
+    for chunk in chunks:
+        digits = carry + bytes(chunk).translate(None, WHITESPACE)
+        # A byte split across chunks waits for its second digit
+        even = len(digits) & ~1
+        carry = digits[even:]
+        yield bytes.fromhex(digits[:even].decode("ascii"))
+    if carry:
+        raise ValueError("Odd number of hex digits")
@@ -1,16 +1,36 @@
 #!/usr/bin/env python3
 # encoding: UTF-8
 
+import argparse
+import os
+import sys
+from collections import deque
+from importlib import import_module
 from socket import socket, gethostname, AF_INET, SOCK_STREAM
-from typing import Tuple, Dict
-from diffiehellman.diffiehellman import DiffieHellman
+from typing import Tuple, Dict, Optional
+from src.projects.vpn.framing import PROPOSAL, CHOSEN_CIPHER, DHMKE, DATA
+from src.projects.vpn.framing import TICKET, RESUME, RESUMED, RESUME_REJECTED
+from src.projects.vpn.framing import FrameReader, expect, send_frame
+from src.projects.vpn.pipeline import Pipeline
+from src.projects.vpn.transfer import send_file
+from src.projects.vpn.record import new_record_layer, padded_length
+from src.projects.vpn.tickets import NONCE_SIZE, derive_session_key
+from src.projects.profiling import profiled, section
 
 HOST = gethostname()
 PORT = 4600
 
 
 
-SUPPORTED_CIPHERS = {"AES": [128, 192, 256], "Blowfish": [112, 224, 448], "DES": [56]}
+# AES-GCM comes first so that the server picks it over AES-CBC with the same key size
+SUPPORTED_CIPHERS = {
+    "AES-GCM": [128, 192, 256],
+    "AES": [128, 192, 256],
+    "Blowfish": [112, 224, 448],
+    "DES": [56],
+}
+# Crypto.Cipher modules, imported by `get_key_and_iv` once a cipher is chosen
+CIPHERS = {"AES-GCM": "AES", "AES": "AES", "Blowfish": "Blowfish", "DES": "DES"}
 
 def generate_cipher_proposal(supported: dict) -> str:
     """Generate a cipher proposal message
@@ -18,13 +38,10 @@ def generate_cipher_proposal(supported: dict) -> str:
     :param supported: cryptosystems supported by the client
     :return: proposal as a string
     """
-    proposed_ciphers = "ProposedCiphers:"
-    for key in supported:
-        proposed_ciphers += key + ":" + str(supported[key]) + ","
-    
-    proposed_ciphers = proposed_ciphers[:-1]
-
-    return proposed_ciphers
+    return "ProposedCiphers:" + ",".join(
+        f"{cipher_name}:[{','.join(str(size) for size in key_sizes)}]"
+        for cipher_name, key_sizes in supported.items()
+    )
 
 
 def parse_cipher_selection(msg: str) -> Tuple[str, int]:
@@ -33,8 +50,8 @@ def parse_cipher_selection(msg: str) -> Tuple[str, int]:
     :param msg: server's message with the selected cryptosystem
     :return: (cipher_name, key_size) tuple extracted from the message
     """
-    lst = msg.split(":")
-    return (lst[1], lst[2])
+    lst = msg.replace(",", ":").split(":")
+    return (lst[1], int(lst[2]))
 
 
 def generate_dhm_request(public_key: int) -> str:
@@ -65,7 +82,7 @@ def get_key_and_iv(
     :param cipher_name: negotiated cipher's name
     :param key_size: negotiated key size
     :return: (cipher, key, IV) tuple
-    cipher_name must be mapped to a Crypto.Cipher object
+    cipher_name must be mapped to a Crypto.Cipher module, imported on first use
     `key` is the *first* `key_size` bytes of the `shared_key`
     DES key must be padded to 64 bits with 0
     Length `ivlen` of IV depends on a cipher
@@ -73,36 +90,28 @@ def get_key_and_iv(
     Both key and IV must be returned as bytes
     """
     byte_shared_key = bytes(shared_key, 'utf-8')
-    
+    cipher = import_module(f"Crypto.Cipher.{CIPHERS[cipher_name]}")
+
     # key
-    key = byte_shared_key[:key_size]
-
-    # IV 
-    if cipher_name == "AES":
-        ivlen = AES.block_size
-    elif cipher_name == "DES":
-        ivlen = DES.block_size
-    else:
-        ivlen = Blowfish.block_size
-    IV = byte_shared_key[-ivlen:]
-
-    if cipher_name == "AES":
-        obj = AES.new(key, AES.MODE_CBC, IV)
-    elif cipher_name == "DES":
-        obj = AES.new(key, DES.MODE_CBC, IV)
-    else:
-        obj = AES.new(key, Blowfish.MODE_CBC, IV)
-    
-    return (obj, key, IV)
+    key = byte_shared_key[: key_size // 8]
+    if cipher_name == "DES":
+        key = key.ljust(8, b"\x00")
+
+    # IV
+    IV = byte_shared_key[-cipher.block_size :]
+
+    return (cipher, key, IV)
 
 
 def add_padding(message: str) -> str:
     """Add padding (0x0) to the message to make its length a multiple of 16
-    
+
+    Legacy format only, `record.RecordLayer` records use PKCS#7 padding.
+
     :param message: message to pad
     :return: padded message
     """
-    raise NotImplementedError
+    return message + "\x00" * (padded_length(len(message)) - len(message))
 
 
 def encrypt_message(message: str, crypto: object, hashing: object) -> Tuple[bytes, str]:
@@ -117,56 +126,187 @@ def encrypt_message(message: str, crypto: object, hashing: object) -> Tuple[byte
     1. Pad the message, if necessary
     2. Encrypt using cipher `crypto`
     3. Compute HMAC using `hashing`
+
+    Legacy format only: zero padding and an HMAC without a record number,
+    read by `server.read_message`. Never mix it with `record.RecordLayer`,
+    whose records the client uses on the wire.
     """
-    raise NotImplementedError
+    plaintext = message.encode("utf-8")
+    plaintext += bytes(padded_length(len(plaintext)) - len(plaintext))
+    ciphertext = crypto.encrypt(plaintext)
+    # Work on a copy so `hashing` stays keyed but unused for the next message
+    hmac = hashing.copy()
+    hmac.update(ciphertext)
+    return (ciphertext, hmac.hexdigest())
 
 
-def main():
-    """Main event loop
+def negotiate(client_sckt: socket, frames: FrameReader) -> Tuple[str, int, str]:
+    """Run the full handshake: cipher negotiation and DHM key exchange
 
-    See vpn.md for details
+    :param client_sckt: connected socket
+    :param frames: frame reader of the socket
+    :return: (cipher_name, key_size, shared_key) tuple
     """
-    client_sckt = socket(AF_INET, SOCK_STREAM)
-    client_sckt.connect((HOST, PORT))
-    print(f"Connected to {HOST}:{PORT}")
-
     print("Negotiating the cipher")
-    msg_out = generate_cipher_proposal(SUPPORTED_CIPHERS)
-    client_sckt.send(msg_out.encode())
-    msg_in = client_sckt.recv(4096).decode("utf-8")
-    msg_in = parse_cipher_selection(msg_in)
-    cipher_name = msg_in[0]
-    key_size = msg_in[1]
+    with section("vpn.client.negotiation"):
+        msg_out = generate_cipher_proposal(SUPPORTED_CIPHERS)
+        send_frame(client_sckt, PROPOSAL, msg_out.encode())
+        msg_in = bytes(expect(frames.read_frame(), CHOSEN_CIPHER)).decode("utf-8")
+        cipher_name, key_size = parse_cipher_selection(msg_in)
     # Follow the description
     print(f"We are going to use {cipher_name}{key_size}")
 
     print("Negotiating the key")
-    # Follow the description
-    client_diffiehellman = DiffieHellman(key_length=key_size)
-    client_diffiehellman.generate_public_key()
-
-    dhm_out = client_diffiehellman.public_key
-    client_sckt.send(generate_dhm_request(dhm_out).encode())
+    # Only a full handshake needs it, resumption does not
+    from diffiehellman.diffiehellman import DiffieHellman
 
-    dhm_in = client_sckt.recv(4096)
-    client_diffiehellman.generate_shared_secret(parse_dhm_reponse(dhm_in))
+    with section("vpn.client.dhmke"):
+        # Follow the description
+        client_diffiehellman = DiffieHellman(key_length=key_size)
+        client_diffiehellman.generate_public_key()
 
+        dhm_out = client_diffiehellman.public_key
+        send_frame(client_sckt, DHMKE, generate_dhm_request(dhm_out).encode())
 
+        dhm_in = bytes(expect(frames.read_frame(), DHMKE)).decode("utf-8")
+        client_diffiehellman.generate_shared_secret(parse_dhm_response(dhm_in))
 
     print("The key has been established")
+    return (cipher_name, key_size, client_diffiehellman.shared_key)
+
+
+@profiled(name="vpn.client.resumption")
+def resume(
+    client_sckt: socket, frames: FrameReader, session: Tuple[bytes, str, int, str]
+) -> Optional[Tuple[str, int, str]]:
+    """Try to resume a previous session in one round trip
+
+    :param client_sckt: connected socket
+    :param frames: frame reader of the socket
+    :param session: (ticket, cipher_name, key_size, shared_key) of the previous session
+    :return: (cipher_name, key_size, shared_key) tuple, or None if the server refused
+    """
+    ticket, cipher_name, key_size, shared_key = session
+    client_nonce = os.urandom(NONCE_SIZE)
+    send_frame(client_sckt, RESUME, client_nonce + ticket)
+    frame = frames.read_frame()
+    if frame is not None and frame[0] == RESUME_REJECTED:
+        return None
+    payload = bytes(expect(frame, RESUMED))
+    server_nonce = payload[:NONCE_SIZE]
+    if parse_cipher_selection(payload[NONCE_SIZE:].decode("utf-8")) != (cipher_name, key_size):
+        raise ValueError("Server resumed a different session")
+    print(f"Resumed session with {cipher_name}{key_size}")
+    return (cipher_name, key_size, derive_session_key(shared_key, client_nonce, server_nonce))
+
+
+def connect(session: Tuple[bytes, str, int, str] = None) -> tuple:
+    """Connect to the server and establish a session
+
+    :param session: (ticket, cipher_name, key_size, shared_key) of a previous session to resume
+    :return: (socket, frame reader, record layer, session) tuple, the session can be
+    resumed later if the server issued a ticket, otherwise it is None
+    """
+    client_sckt = socket(AF_INET, SOCK_STREAM)
+    client_sckt.connect((HOST, PORT))
+    frames = FrameReader(client_sckt)
+    print(f"Connected to {HOST}:{PORT}")
+
+    established = resume(client_sckt, frames, session) if session else None
+    if established is None:
+        established = negotiate(client_sckt, frames)
+    ticket = bytes(expect(frames.read_frame(), TICKET))
+    session = (ticket,) + established if ticket else None
 
     print("Initializing cryptosystem")
-    # Follow the description
+    cipher_name, key_size, shared_key = established
+    with section("vpn.client.cryptosystem_init"):
+        record = new_record_layer(
+            cipher_name, *get_key_and_iv(shared_key, cipher_name, key_size), initiator=True
+        )
     print("All systems ready")
+    return client_sckt, frames, record, session
+
+
+def pipelined(lines) -> None:
+    """Send every line without waiting for the replies, print the replies in order
+
+    :param lines: messages to send, e.g. a file piped to stdin
+    """
+    client_sckt, frames, record, _ = connect()
+    with Pipeline(client_sckt, frames, record) as pipeline:
+        replies = deque()
+        for line in lines:
+            line = line.rstrip("\n")
+            if line == "\\quit":
+                break
+            replies.append(pipeline.submit(line.encode()))
+            # Print replies as they come in, keeping at most the in-flight ones around
+            while replies and replies[0].done():
+                print(replies.popleft().result().decode("utf-8"))
+        for reply in replies:
+            print(reply.result().decode("utf-8"))
+    print(f"{pipeline.messages} messages in {pipeline.writes} writes")
+
+
+def upload(path: str, retries: int = 3) -> None:
+    """Send a file, resuming the session and the transfer if the connection drops
+
+    :param path: file to send
+    :param retries: reconnections to attempt before giving up
+    """
+    client_sckt, frames, record, session = connect()
+    for attempt in range(retries + 1):
+        try:
+            sent = send_file(client_sckt, frames, record, path)
+            break
+        except ConnectionError:
+            client_sckt.close()
+            if attempt == retries:
+                raise
+            client_sckt, frames, record, session = connect(session)
+    client_sckt.close()
+    print(f"Sent {sent} bytes of {path}")
+
+
+def main(argv: list = None):
+    """Main event loop
+
+    See vpn.md for details
+    :param argv: command line arguments, sys.argv[1:] if None
+    """
+    parser = argparse.ArgumentParser(description="Custom VPN client")
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="send lines from stdin without waiting for each reply",
+    )
+    parser.add_argument("--send", metavar="FILE", help="upload a file and exit")
+    args = parser.parse_args(argv)
+    if args.send:
+        upload(args.send)
+        return
+    if args.pipeline:
+        pipelined(sys.stdin)
+        return
+
+    client_sckt, frames, record, session = connect()
 
     while True:
         msg_out = input("Enter message: ")
         if msg_out == "\\quit":
             client_sckt.close()
             break
-        client_sckt.send(msg_out.encode())
-        msg_in = client_sckt.recv(4096)
-        print(msg_in.decode("utf-8"))
+        try:
+            send_frame(client_sckt, DATA, record.seal(msg_out.encode()))
+            msg_in = expect(frames.read_frame(), DATA)
+        except ConnectionError:
+            # Flaky link: reconnect, resuming the session if possible, and retry once
+            client_sckt.close()
+            client_sckt, frames, record, session = connect(session)
+            send_frame(client_sckt, DATA, record.seal(msg_out.encode()))
+            msg_in = expect(frames.read_frame(), DATA)
+        print(bytes(msg_in).decode("utf-8"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Pool of pre-generated Diffie-Hellman-Merkle key pairs for the VPN server"""
+
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Set
+
+if TYPE_CHECKING:
+    from diffiehellman.diffiehellman import DiffieHellman
+
+LOW_WATERMARK = 16
+HIGH_WATERMARK = 64
+
+
+def generate_dh_keypair(key_size: int) -> "DiffieHellman":
+    """Generate an ephemeral DHM key pair
+
+    :param key_size: negotiated key size
+    :return: DHM object with the public key ready
+    Top-level so that it can run in a process executor
+    """
+    from diffiehellman.diffiehellman import DiffieHellman
+
+    server_diffiehellman = DiffieHellman(key_length=key_size)
+    server_diffiehellman.generate_public_key()
+    return server_diffiehellman
+
+
+class DHKeyPool:
+    """Ephemeral DHM key pairs generated ahead of time, one queue per key size
+
+    Whenever a queue drops below `low` key pairs, the executor is asked to
+    generate enough new ones to get it back to `high`. Each key pair is handed
+    out only once.
+    """
+
+    def __init__(
+        self,
+        key_sizes: Iterable[int],
+        low: int = LOW_WATERMARK,
+        high: int = HIGH_WATERMARK,
+        executor: Executor = None,
+    ):
+        """
+        :param key_sizes: key sizes to keep key pairs for
+        :param low: refill when fewer key pairs than this are ready
+        :param high: number of key pairs to refill to
+        :param executor: where to generate key pairs, a single background thread if None
+        """
+        if not 0 <= low <= high:
+            raise ValueError("Watermarks must satisfy 0 <= low <= high")
+        self.low = low
+        self.high = high
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(1, thread_name_prefix="dhpool")
+        self._lock = threading.Lock()
+        self._ready: Dict[int, deque] = {size: deque() for size in key_sizes}
+        self._pending: Dict[int, int] = {size: 0 for size in self._ready}
+        self._futures: Set[Future] = set()
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        for size in self._ready:
+            self._refill(size)
+
+    def _refill(self, key_size: int) -> None:
+        """Schedule key pair generation if the queue is below the low watermark"""
+        with self._lock:
+            if self._closed:
+                return
+            available = len(self._ready[key_size]) + self._pending[key_size]
+            if available >= self.low and available:
+                return
+            missing = self.high - available
+            self._pending[key_size] += missing
+        for _ in range(missing):
+            future = self._executor.submit(generate_dh_keypair, key_size)
+            with self._lock:
+                self._futures.add(future)
+                closed = self._closed
+            if closed:
+                future.cancel()
+            future.add_done_callback(lambda done, size=key_size: self._store(size, done))
+
+    def _store(self, key_size: int, future: Future) -> None:
+        """Add a finished key pair to its queue"""
+        with self._lock:
+            self._pending[key_size] -= 1
+            self._futures.discard(future)
+            if not future.cancelled() and future.exception() is None:
+                self._ready[key_size].append(future.result())
+
+    def take(self, key_size: int) -> Optional["DiffieHellman"]:
+        """Get a ready key pair without blocking
+
+        :param key_size: negotiated key size
+        :return: DHM object with the public key ready, or None if none is ready
+        :raise: KeyError if the pool does not keep keys of that size
+        """
+        with self._lock:
+            queue = self._ready[key_size]
+            if queue:
+                self.hits += 1
+                keypair = queue.popleft()
+            else:
+                self.misses += 1
+                keypair = None
+        self._refill(key_size)
+        return keypair
+
+    def get(self, key_size: int) -> "DiffieHellman":
+        """Get a key pair, generating one in the calling thread if none is ready"""
+        keypair = self.take(key_size) if key_size in self._ready else None
+        return keypair or generate_dh_keypair(key_size)
+
+    def available(self, key_size: int) -> int:
+        """Number of key pairs ready to be handed out"""
+        with self._lock:
+            return len(self._ready[key_size])
+
+    def close(self) -> None:
+        """Stop refilling, cancel queued key pairs, and release the executor if the pool made it"""
+        with self._lock:
+            self._closed = True
+            pending = list(self._futures)
+        # Done callbacks take the lock, so cancel without holding it
+        # (`shutdown(cancel_futures=True)` needs Python 3.9)
+        for future in pending:
+            future.cancel()
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Length-prefixed framing for the VPN protocol
+
+Every message is sent as a 5-byte header (message type, payload length)
+followed by the payload, so TCP fragmentation or coalescing cannot split or
+merge messages. The payloads themselves are the messages described in vpn.md.
+"""
+
+import asyncio
+import struct
+from socket import socket
+from typing import List, Optional, Tuple
+
+# Message type (1 byte) and payload length (4 bytes), network byte order
+HEADER = struct.Struct("!BI")
+# Sequence number of a pipelined message
+SEQUENCE = struct.Struct("!Q")
+MAX_PAYLOAD = 64 * 1024 * 1024
+# Handshake messages come before the peer is authenticated and are all small
+MAX_HANDSHAKE_PAYLOAD = 64 * 1024
+BUFFER_SIZE = 64 * 1024
+# Buffers per `sendmsg` call, IOV_MAX on Linux
+MAX_BUFFERS = 1024
+
+# Message types
+PROPOSAL = 1
+CHOSEN_CIPHER = 2
+DHMKE = 3
+DATA = 4
+ERROR = 5
+TICKET = 6
+RESUME = 7
+RESUMED = 8
+RESUME_REJECTED = 9
+PIPELINED = 10
+FILE_OFFER = 11
+FILE_ACCEPT = 12
+FILE_CHUNK = 13
+FILE_DONE = 14
+
+
+def pack_header(msg_type: int, length: int) -> bytes:
+    """Build a frame header
+
+    :param msg_type: one of the message type constants
+    :param length: payload length in bytes
+    :return: header bytes
+    :raise: ValueError if the payload is too large
+    """
+    if length > MAX_PAYLOAD:
+        raise ValueError("Frame too large")
+    return HEADER.pack(msg_type, length)
+
+
+def expect(frame: Optional[Tuple[int, memoryview]], msg_type: int) -> memoryview:
+    """Check the type of a received frame
+
+    :param frame: (type, payload) tuple as returned by the readers, None on EOF
+    :param msg_type: expected message type
+    :return: payload of the frame
+    :raise: ConnectionError on EOF, ValueError if the peer sent an error or another type
+    """
+    if frame is None:
+        raise ConnectionError("Connection closed")
+    if frame[0] == ERROR and msg_type != ERROR:
+        raise ValueError(bytes(frame[1]).decode("utf-8"))
+    if frame[0] != msg_type:
+        raise ValueError(f"Unexpected message type {frame[0]}")
+    return frame[1]
+
+
+def send_frame(sckt: socket, msg_type: int, payload: bytes = b"") -> None:
+    """Send a whole frame, looping over partial writes
+
+    The header and payload are handed to the kernel as separate buffers,
+    so large payloads are never copied into a new bytes object
+    """
+    send_buffers(sckt, [pack_header(msg_type, len(payload)), payload])
+
+
+def send_buffers(sckt: socket, buffers: List[bytes]) -> None:
+    """Send several buffers, e.g. a batch of frames, with as few system calls as possible
+
+    :param sckt: blocking socket
+    :param buffers: headers and payloads in order, empty ones are skipped
+    """
+    buffers = [memoryview(buffer).cast("B") for buffer in buffers if len(buffer)]
+    while buffers:
+        sent = sckt.sendmsg(buffers[:MAX_BUFFERS])
+        while sent:
+            if sent >= len(buffers[0]):
+                sent -= len(buffers.pop(0))
+            else:
+                buffers[0] = buffers[0][sent:]
+                sent = 0
+
+
+class FrameReader:
+    """Read frames from a blocking socket into one reusable buffer
+
+    Data is received with `recv_into` straight into the buffer and payloads
+    are returned as memoryviews of it, so no bytes are copied. A payload is
+    only valid until the next call to `read_frame`; copy it to keep it.
+    One `recv_into` may pick up several frames, which are then served
+    without further system calls.
+    """
+
+    def __init__(self, sckt: socket, size: int = BUFFER_SIZE):
+        self._sckt = sckt
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    def _fill(self, needed: int) -> bool:
+        """Make sure `needed` bytes are buffered after `_start`
+
+        :return: False on EOF before any byte of the frame arrived
+        :raise: ConnectionError on EOF in the middle of a frame
+        """
+        if self._end - self._start >= needed:
+            return True
+        if self._start + needed > len(self._buffer):
+            # Move the partial frame to the front, growing the buffer if it does not fit
+            pending = self._end - self._start
+            if needed > len(self._buffer):
+                buffer = bytearray(max(needed, 2 * len(self._buffer)))
+                buffer[:pending] = self._view[self._start : self._end]
+                self._buffer = buffer
+                self._view = memoryview(self._buffer)
+            else:
+                self._view[:pending] = self._view[self._start : self._end]
+            self._start, self._end = 0, pending
+        while self._end - self._start < needed:
+            received = self._sckt.recv_into(self._view[self._end :])
+            if not received:
+                if self._end == self._start:
+                    return False
+                raise ConnectionError("Connection closed in the middle of a frame")
+            self._end += received
+        return True
+
+    def read_frame(self) -> Optional[Tuple[int, memoryview]]:
+        """Read the next frame
+
+        :return: (type, payload) tuple, or None if the peer closed the connection
+        """
+        if self._start == self._end:
+            self._start = self._end = 0
+        if not self._fill(HEADER.size):
+            return None
+        msg_type, length = HEADER.unpack_from(self._buffer, self._start)
+        if length > MAX_PAYLOAD:
+            raise ValueError("Frame too large")
+        self._fill(HEADER.size + length)
+        begin = self._start + HEADER.size
+        self._start = begin + length
+        return msg_type, self._view[begin : self._start]
+
+
+async def read_frame_async(
+    reader: asyncio.StreamReader, max_payload: int = MAX_PAYLOAD
+) -> Optional[Tuple[int, bytes]]:
+    """Read the next frame from an asyncio stream
+
+    :param max_payload: largest payload accepted, checked before reading it
+    :return: (type, payload) tuple, or None if the peer closed the connection
+    :raise: ConnectionError on EOF in the middle of a frame, ValueError if the frame is too large
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as err:
+        if not err.partial:
+            return None
+        raise ConnectionError("Connection closed in the middle of a frame") from err
+    msg_type, length = HEADER.unpack(header)
+    if length > max_payload:
+        raise ValueError("Frame too large")
+    try:
+        return msg_type, await reader.readexactly(length)
+    except asyncio.IncompleteReadError as err:
+        raise ConnectionError("Connection closed in the middle of a frame") from err
+
+
+def write_frame(writer: asyncio.StreamWriter, msg_type: int, payload: bytes = b"") -> None:
+    """Queue a frame on an asyncio stream, await `writer.drain()` afterwards"""
+    writer.writelines((pack_header(msg_type, len(payload)), payload))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Counters and histograms of the VPN server in Prometheus text format
+
+Hooks are plain attribute and dict updates plus a `bisect` for histograms,
+well under a microsecond each, so they stay on in production. The text
+format is served over HTTP on a local port by a background thread that
+only ever reads snapshots.
+"""
+
+import threading
+from bisect import bisect_left
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Tuple
+
+PREFIX = "vpn_"
+TIME_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+SIZE_BUCKETS = tuple(64 * 4 ** power for power in range(11))
+COUNT_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+
+def buckets_for(name: str) -> Tuple[float, ...]:
+    """Default bucket bounds by unit suffix: `_seconds`, `_bytes`, or a plain count"""
+    if name.endswith("_seconds"):
+        return TIME_BUCKETS
+    if name.endswith("_bytes"):
+        return SIZE_BUCKETS
+    return COUNT_BUCKETS
+
+
+class Histogram:
+    """Observations counted into buckets with fixed upper bounds"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Iterable[float]):
+        self.bounds = tuple(bounds)
+        # One count per bound plus the +Inf bucket, not cumulative
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record one observation"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        """Copy of the state, picklable and safe to read from another thread"""
+        return {
+            "bounds": self.bounds,
+            "counts": list(self.counts),
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        """Add the observations of another histogram with the same bounds"""
+        for i, count in enumerate(snapshot["counts"]):
+            self.counts[i] += count
+        self.sum += snapshot["sum"]
+        self.count += snapshot["count"]
+
+
+class Metrics:
+    """Named counters and histograms of one server process"""
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms: Dict[str, Histogram] = {}
+
+    def observe(self, name: str, value: float) -> None:
+        """Record an observation, creating the histogram on first use"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(buckets_for(name))
+        histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        """Copy of all metrics, e.g. to send to the pre-fork supervisor"""
+        return {
+            "counters": dict(self.counters),
+            "histograms": {
+                name: histogram.snapshot() for name, histogram in list(self.histograms.items())
+            },
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        """Add the metrics of another process"""
+        self.counters.update(snapshot["counters"])
+        for name, state in snapshot["histograms"].items():
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(state["bounds"])
+            self.histograms[name].merge(state)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {PREFIX}{name}_total counter")
+            lines.append(f"{PREFIX}{name}_total {value}")
+        for name, state in sorted(snapshot["histograms"].items()):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            cumulative = 0
+            for bound, count in zip(state["bounds"] + ("+Inf",), state["counts"]):
+                cumulative += count
+                lines.append(f'{PREFIX}{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{PREFIX}{name}_sum {state['sum']}")
+            lines.append(f"{PREFIX}{name}_count {state['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(
+    render: Callable[[], str], port: int, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """Serve `render()` on http://host:port/metrics from a daemon thread
+
+    :param render: returns the current metrics in text format
+    :param port: TCP port, 0 for any free one (see `server_address`)
+    :param host: address to bind, local only by default
+    :return: the HTTP server, call `shutdown()` to stop it
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="vpn-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Pipelined message sending for the VPN client
+
+Instead of waiting for the reply to each message, the client keeps up to
+`max_in_flight` messages on the wire. Every message carries a sequence
+number inside its encrypted record and the server echoes it in the reply,
+so replies are matched to their messages. Small messages queued within
+`window` seconds of each other are sent together in a single write.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from socket import socket, SHUT_WR
+from typing import Dict, List, Tuple
+
+from src.projects.vpn.framing import PIPELINED, SEQUENCE
+from src.projects.vpn.framing import FrameReader, expect, pack_header, send_buffers
+from src.projects.vpn.record import RecordLayer
+
+MAX_IN_FLIGHT = 256
+COALESCE_WINDOW = 0.002
+BATCH_BYTES = 64 * 1024
+
+
+class Pipeline:
+    """Send messages without waiting for the replies
+
+    A sender thread batches and encrypts queued messages, a receiver thread
+    resolves the future of each message when its reply arrives. `submit`
+    blocks while `max_in_flight` messages are waiting for a reply.
+    """
+
+    def __init__(
+        self,
+        sckt: socket,
+        frames: FrameReader,
+        record: RecordLayer,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        window: float = COALESCE_WINDOW,
+        batch_bytes: int = BATCH_BYTES,
+    ):
+        """
+        :param sckt: connected socket with an established session
+        :param frames: frame reader of the socket
+        :param record: record layer of the session
+        :param max_in_flight: messages sent but not answered yet
+        :param window: how long to wait for more messages to coalesce, in seconds
+        :param batch_bytes: send a batch right away once it holds this many bytes
+        """
+        self.window = window
+        self.batch_bytes = batch_bytes
+        self.writes = 0
+        self.messages = 0
+        self._sckt = sckt
+        self._frames = frames
+        self._record = record
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._pending: Dict[int, Future] = {}
+        self._next_sequence = 0
+        self._error = None
+        self._queue: "queue.Queue[Tuple[int, bytes]]" = queue.Queue()
+        self._sender = threading.Thread(target=self._send_loop, name="vpn-sender")
+        self._receiver = threading.Thread(target=self._receive_loop, name="vpn-receiver")
+        self._sender.start()
+        self._receiver.start()
+
+    def submit(self, message: bytes) -> Future:
+        """Queue a message
+
+        :param message: plaintext
+        :return: future resolved with the server's reply
+        :raise: ConnectionError if the connection has failed
+        """
+        self._in_flight.acquire()
+        future = Future()
+        with self._lock:
+            if self._error is not None:
+                self._in_flight.release()
+                raise ConnectionError(str(self._error))
+            sequence = self._next_sequence
+            self._next_sequence += 1
+            self._pending[sequence] = future
+        self._queue.put((sequence, message))
+        return future
+
+    def send(self, message: bytes) -> bytes:
+        """Send a message and wait for its reply"""
+        return self.submit(message).result()
+
+    def _next_batch(self) -> Tuple[List[Tuple[int, bytes]], bool]:
+        """Wait for a message, then collect whatever else arrives within the window
+
+        :return: (batch, closing) tuple, closing once `close` has been called
+        """
+        item = self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        size = len(item[1])
+        deadline = time.monotonic() + self.window
+        while size < self.batch_bytes:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            size += len(item[1])
+        return batch, False
+
+    def _send_loop(self) -> None:
+        """Encrypt and send batches of messages until closed"""
+        closing = False
+        try:
+            while not closing:
+                batch, closing = self._next_batch()
+                buffers = []
+                for sequence, message in batch:
+                    # The sequence number is encrypted and authenticated with the message
+                    sealed = bytes(self._record.seal(SEQUENCE.pack(sequence) + message))
+                    buffers += [pack_header(PIPELINED, len(sealed)), sealed]
+                if buffers:
+                    send_buffers(self._sckt, buffers)
+                    self.writes += 1
+                    self.messages += len(batch)
+        except OSError as err:
+            self._fail(err)
+
+    def _receive_loop(self) -> None:
+        """Match replies to their messages until the server closes the connection"""
+        try:
+            while True:
+                payload = expect(self._frames.read_frame(), PIPELINED)
+                (sequence,) = SEQUENCE.unpack_from(payload)
+                with self._lock:
+                    future = self._pending.pop(sequence, None)
+                if future is None:
+                    raise ValueError(f"Unexpected reply {sequence}")
+                future.set_result(bytes(payload[SEQUENCE.size :]))
+                self._in_flight.release()
+        except (OSError, ValueError) as err:
+            self._fail(err)
+
+    def _fail(self, err: Exception) -> None:
+        """Fail every message still waiting for a reply"""
+        with self._lock:
+            if self._error is None:
+                self._error = err
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ConnectionError(str(err)))
+            self._in_flight.release()
+
+    def close(self) -> None:
+        """Send the queued messages, wait for their replies, and close the socket"""
+        self._queue.put(None)
+        self._sender.join()
+        try:
+            self._sckt.shutdown(SHUT_WR)
+        except OSError:
+            pass
+        self._receiver.join()
+        self._sckt.close()
+
+    def __enter__(self) -> "Pipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Pre-fork mode of the VPN server
+
+The supervisor starts N worker processes that each bind the same port with
+SO_REUSEPORT and run their own event loop, so the kernel spreads incoming
+connections over all cores. Workers report their metrics every
+`stats_interval` seconds; the supervisor restarts workers that die and
+aggregates the metrics of live and retired workers, which it can serve in
+Prometheus text format.
+
+The supervisor itself never starts a thread, so forking a replacement worker
+cannot copy a lock that some other thread holds. The metrics endpoint runs in
+its own process and serves the text the supervisor sends it over a pipe.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import Counter
+from functools import partial
+from multiprocessing.connection import Connection
+from typing import Dict, Optional
+
+from src.projects.vpn.dhpool import DHKeyPool
+from src.projects.vpn.metrics import Metrics, start_metrics_server
+from src.projects.vpn.server import SUPPORTED_CIPHERS, CipherNegotiator, handle_client
+from src.projects.vpn.tickets import SessionTickets
+
+STATS_INTERVAL = 5.0
+RESTART_DELAY = 1.0
+# Each worker only knows the tickets it redeemed itself, so a captured ticket can be
+# replayed once per worker; a short lifetime keeps that window small
+TICKET_LIFETIME = 300
+
+
+async def _serve_worker(
+    index: int,
+    host: str,
+    port: int,
+    supported: dict,
+    secret: bytes,
+    upload_dir: Optional[str],
+    stats_queue: multiprocessing.Queue,
+    stats_interval: float,
+) -> None:
+    """Accept clients on the shared port until SIGTERM, reporting stats periodically"""
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    loop.add_signal_handler(signal.SIGTERM, stop.set_result, None)
+    metrics = Metrics()
+    key_sizes = {size for sizes in supported.values() for size in sizes}
+    # DHM runs in this worker's threads; the other workers keep the other cores busy
+    dh_pool = DHKeyPool(key_sizes)
+    server = await asyncio.start_server(
+        partial(
+            handle_client,
+            supported=supported,
+            verbose=False,
+            dh_pool=dh_pool,
+            tickets=SessionTickets(lifetime=TICKET_LIFETIME, secret=secret),
+            upload_dir=upload_dir,
+            metrics=metrics,
+            negotiator=CipherNegotiator(supported),
+        ),
+        host,
+        port,
+        reuse_address=True,
+        reuse_port=True,
+        backlog=1024,
+    )
+    async with server:
+        while not stop.done():
+            await asyncio.wait([stop], timeout=stats_interval)
+            stats_queue.put((index, os.getpid(), metrics.snapshot()))
+    dh_pool.close()
+
+
+def _worker(index: int, *args) -> None:
+    """Worker process entry point, see `_serve_worker` for the arguments"""
+    # Ctrl-C goes to the whole process group; only the supervisor handles it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve_worker(index, *args))
+
+
+def _metrics_endpoint(updates: Connection, port: int) -> None:
+    """Metrics process entry point: serve the latest text received on `updates` until EOF"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    latest = [Metrics().render()]
+    http = start_metrics_server(lambda: latest[0], port)
+    try:
+        while True:
+            latest[0] = updates.recv()
+    except EOFError:
+        pass
+    finally:
+        http.shutdown()
+
+
+class Supervisor:
+    """Start, watch, and restart the worker processes"""
+
+    def __init__(
+        self,
+        workers: int,
+        host: str,
+        port: int,
+        supported: dict = SUPPORTED_CIPHERS,
+        upload_dir: str = None,
+        stats_interval: float = STATS_INTERVAL,
+        verbose: bool = True,
+        metrics_port: int = 0,
+    ):
+        """
+        :param workers: number of worker processes, e.g. one per core
+        :param host: address to bind
+        :param port: TCP port all workers share, must not be 0
+        :param supported: ciphers supported by the server
+        :param upload_dir: where workers store uploaded files, uploads are refused if None
+        :param stats_interval: how often workers report and the supervisor prints, in seconds
+        :param verbose: print a status line every `stats_interval` seconds
+        :param metrics_port: serve the aggregated metrics on this local port, 0 to disable
+        """
+        if not port:
+            raise ValueError("Workers need a fixed port to share")
+        self.workers = workers
+        self.stats_interval = stats_interval
+        self.verbose = verbose
+        self.restarts = 0
+        # Ticket key shared by all workers, so resumption works whichever worker accepts
+        self._args = (host, port, supported, os.urandom(32), upload_dir)
+        self._stats_queue = multiprocessing.Queue()
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        # Last report of each live worker, and the totals of the ones that died
+        self._latest: Dict[int, dict] = {}
+        self._retired = Metrics()
+        self._lock = threading.Lock()
+        self._stopping = False
+        self.metrics_port = metrics_port
+        self._metrics_process: Optional[multiprocessing.Process] = None
+        self._metrics_updates: Optional[Connection] = None
+
+    def _spawn(self, index: int) -> None:
+        """Start the worker in slot `index`"""
+        process = multiprocessing.Process(
+            target=_worker,
+            args=(index, *self._args, self._stats_queue, self.stats_interval),
+            name=f"vpn-worker-{index}",
+        )
+        process.start()
+        self._processes[index] = process
+
+    def _spawn_metrics(self) -> None:
+        """Start the process serving the metrics endpoint"""
+        receiver, self._metrics_updates = multiprocessing.Pipe(duplex=False)
+        self._metrics_process = multiprocessing.Process(
+            target=_metrics_endpoint,
+            args=(receiver, self.metrics_port),
+            name="vpn-metrics",
+            daemon=True,
+        )
+        self._metrics_process.start()
+        receiver.close()
+
+    def _publish(self) -> None:
+        """Send the aggregated metrics to the endpoint, restarting it if it died"""
+        if self._metrics_process is None:
+            return
+        if not self._metrics_process.is_alive():
+            self._metrics_process.join()
+            self._metrics_updates.close()
+            self._spawn_metrics()
+        try:
+            self._metrics_updates.send(self.metrics().render())
+        except (BrokenPipeError, ConnectionResetError):
+            # Died since the check above, the next call restarts it
+            pass
+
+    def start(self) -> None:
+        """Start all workers and the metrics endpoint"""
+        for index in range(self.workers):
+            self._spawn(index)
+        if self.metrics_port:
+            self._spawn_metrics()
+            self._publish()
+
+    def pids(self) -> Dict[int, int]:
+        """Process ID of the worker in each slot"""
+        return {index: process.pid for index, process in self._processes.items()}
+
+    def _collect(self) -> None:
+        """Take in the reports that arrived so far, with the lock held"""
+        while True:
+            try:
+                index, pid, snapshot = self._stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            # Reports from a worker that has been replaced in the meantime are stale
+            if self._processes[index].pid == pid:
+                self._latest[index] = snapshot
+
+    def check(self) -> None:
+        """Collect reports, restart workers that died, and update the metrics endpoint"""
+        with self._lock:
+            self._collect()
+        for index, process in list(self._processes.items()):
+            if process.is_alive() or self._stopping:
+                continue
+            process.join()
+            with self._lock:
+                self._retired.merge(self._latest.pop(index, Metrics().snapshot()))
+            self.restarts += 1
+            if self.verbose:
+                print(f"Worker {index} (pid {process.pid}) exited with {process.exitcode}")
+            self._spawn(index)
+        if not self._stopping:
+            self._publish()
+
+    def metrics(self) -> Metrics:
+        """Metrics summed over all workers, including the ones that were restarted"""
+        with self._lock:
+            self._collect()
+            total = Metrics()
+            total.merge(self._retired.snapshot())
+            for snapshot in self._latest.values():
+                total.merge(snapshot)
+        return total
+
+    def stats(self) -> Counter:
+        """Counters summed over all workers, including the ones that were restarted"""
+        return self.metrics().counters
+
+    def status_line(self) -> str:
+        """One-line summary of the aggregated counters"""
+        alive = sum(process.is_alive() for process in self._processes.values())
+        stats = self.stats()
+        return (
+            f"{alive}/{self.workers} workers, {self.restarts} restarts, "
+            f"{stats['connections']} connections, {stats['handshakes']} handshakes, "
+            f"{stats['resumptions']} resumptions, {stats['messages']} messages, "
+            f"{stats['bytes']} bytes"
+        )
+
+    def run(self) -> None:
+        """Start the workers and supervise them until interrupted"""
+        self.start()
+        next_status = time.monotonic() + self.stats_interval
+        try:
+            while True:
+                time.sleep(min(RESTART_DELAY, self.stats_interval))
+                self.check()
+                if self.verbose and time.monotonic() >= next_status:
+                    print(self.status_line())
+                    next_status += self.stats_interval
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Ask every worker to finish and wait for them"""
+        self._stopping = True
+        if self._metrics_process is not None:
+            self._metrics_updates.close()
+            self._metrics_process.terminate()
+            self._metrics_process.join()
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join()
+        with self._lock:
+            self._collect()
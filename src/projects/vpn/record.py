@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Encrypted record layer of the VPN
+
+A CBC record is a random IV, the CBC ciphertext of the PKCS#7-padded
+message, and the hex HMAC-SHA256 of the record number, IV, and ciphertext.
+Each direction has its own cipher and HMAC keys, derived from the session
+key, and records are numbered per direction without sending the number,
+as they arrive in order over TCP. A record that is replayed, reordered, or
+reflected back to its sender therefore fails authentication. The HMAC is
+checked before anything is decrypted, so bad padding is never reported for
+a forged record. The keyed HMAC contexts are created once per session and
+copied for each record instead of being keyed again.
+
+AEAD ciphers such as AES-GCM use `GCMRecordLayer` instead: a record is the
+ciphertext followed by the 16-byte tag, encrypted and authenticated in one
+pass by `cryptography` without padding.
+
+The crypto libraries are imported when the first record layer is created,
+so that importing the VPN modules stays cheap.
+"""
+
+import hmac
+import os
+import struct
+from hashlib import sha256, sha512
+from time import perf_counter
+from typing import Tuple
+
+BLOCK_SIZE = 16
+# Hex digest of SHA-256
+HMAC_SIZE = 64
+BUFFER_SIZE = 64 * 1024
+AEAD_CIPHERS = frozenset({"AES-GCM"})
+TAG_SIZE = 16
+SALT_SIZE = 4
+# Explicit part of the 12-byte GCM nonce: direction bit and record counter
+NONCE_COUNTER = struct.Struct("!Q")
+DIRECTION_BIT = 1 << 63
+# Number of a CBC record, authenticated but not sent
+RECORD_NUMBER = struct.Struct("!Q")
+
+
+def padded_length(length: int) -> int:
+    """Length of a message after zero padding to a multiple of `BLOCK_SIZE`
+
+    Only the legacy helpers (`client.add_padding`, `client.encrypt_message`)
+    zero-pad; `RecordLayer` records use PKCS#7 padding instead.
+    """
+    return -(-length // BLOCK_SIZE) * BLOCK_SIZE
+
+
+def derive_key(key: bytes, label: bytes, size: int) -> bytes:
+    """Key of `size` bytes (up to 64) for one purpose, derived from the session key"""
+    return hmac.new(key, label, sha512).digest()[:size]
+
+
+class RecordLayer:
+    """Per-session, per-direction CBC keys and HMAC contexts with reusable buffers
+
+    `seal` and `open` return memoryviews of internal buffers that are only
+    valid until the next call of the same method; copy them to keep them.
+    """
+
+    def __init__(
+        self,
+        cipher: object,
+        key: bytes,
+        iv: bytes,
+        size: int = BUFFER_SIZE,
+        metrics=None,
+        initiator: bool = True,
+    ):
+        """
+        :param cipher: Crypto.Cipher module as returned by `get_key_and_iv`
+        :param key: session key
+        :param iv: initialization vector of the session, unused as every record has its own
+        :param size: initial size of the buffers, they grow for larger messages
+        :param metrics: `metrics.Metrics` to record encrypt/decrypt times and
+        failed records in, no overhead at all if None
+        :param initiator: True for the client, False for the server
+        """
+        self._cipher = cipher
+        self._block_size = cipher.block_size
+        sending, receiving = (b"client", b"server") if initiator else (b"server", b"client")
+        self._send_key = derive_key(key, b"cipher " + sending, len(key))
+        self._receive_key = derive_key(key, b"cipher " + receiving, len(key))
+        self._send_hmac = hmac.new(derive_key(key, b"hmac " + sending, 32), digestmod=sha256)
+        self._receive_hmac = hmac.new(derive_key(key, b"hmac " + receiving, 32), digestmod=sha256)
+        self._sent = 0
+        self._received = 0
+        self._allocate(size)
+        self._instrument(metrics)
+
+    def _instrument(self, metrics) -> None:
+        """Time `seal` and `open` if metrics are wanted"""
+        self._metrics = metrics
+        if metrics is not None:
+            self.seal = self._timed(self.seal, metrics, "encrypt_seconds")
+            self.open = self._timed(self.open, metrics, "decrypt_seconds")
+
+    @staticmethod
+    def _timed(method, metrics, name: str):
+        """Wrap `seal` or `open` to time it"""
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                metrics.observe(name, perf_counter() - start)
+
+        return timed
+
+    def _count_failure(self) -> None:
+        """Count a record whose HMAC or tag does not match, other errors are not counted"""
+        if self._metrics is not None:
+            self._metrics.counters["hmac_failures"] += 1
+
+    def _allocate(self, size: int) -> None:
+        """(Re)allocate the plaintext and record buffers"""
+        self._plain = bytearray(size)
+        self._record = bytearray(size + self._block_size + HMAC_SIZE)
+
+    @staticmethod
+    def mac(hashing: object, number: int, ciphertext: bytes) -> bytes:
+        """Hex HMAC of a record number and the IV and ciphertext, on a copy of a keyed context"""
+        hashing = hashing.copy()
+        hashing.update(RECORD_NUMBER.pack(number))
+        hashing.update(ciphertext)
+        return hashing.hexdigest().encode("ascii")
+
+    def seal(self, message: bytes) -> memoryview:
+        """Pad, encrypt, and authenticate a message
+
+        :param message: plaintext
+        :return: record (IV, ciphertext, and hex HMAC)
+        """
+        length = len(message)
+        # PKCS#7: always 1 to `block_size` bytes, each holding the padding length
+        pad = self._block_size - length % self._block_size
+        padded = length + pad
+        if padded > len(self._plain):
+            self._allocate(2 * padded)
+        plain = memoryview(self._plain)[:padded]
+        plain[:length] = message
+        plain[length:] = bytes([pad]) * pad
+        record = memoryview(self._record)
+        iv_size = self._block_size
+        end = iv_size + padded
+        record[:iv_size] = os.urandom(iv_size)
+        encryptor = self._cipher.new(self._send_key, self._cipher.MODE_CBC, record[:iv_size])
+        encryptor.encrypt(plain, output=record[iv_size:end])
+        record[end : end + HMAC_SIZE] = self.mac(self._send_hmac, self._sent, record[:end])
+        self._sent += 1
+        return record[: end + HMAC_SIZE]
+
+    def open(self, record: bytes) -> memoryview:
+        """Authenticate and decrypt the next record
+
+        :param record: IV, ciphertext, and hex HMAC
+        :return: plaintext
+        :raise: ValueError if the HMAC or the padding is invalid or the record is malformed
+        """
+        record = memoryview(record)
+        iv_size = self._block_size
+        end = len(record) - HMAC_SIZE
+        padded = end - iv_size
+        if padded <= 0 or padded % self._block_size:
+            raise ValueError("Bad record length")
+        if not hmac.compare_digest(
+            self.mac(self._receive_hmac, self._received, record[:end]), record[end:]
+        ):
+            self._count_failure()
+            raise ValueError("Bad HMAC")
+        # Only authentic records advance the counter
+        self._received += 1
+        if padded > len(self._plain):
+            self._allocate(2 * padded)
+        plain = memoryview(self._plain)[:padded]
+        decryptor = self._cipher.new(self._receive_key, self._cipher.MODE_CBC, record[:iv_size])
+        decryptor.decrypt(record[iv_size:end], output=plain)
+        pad = plain[-1]
+        if not 0 < pad <= self._block_size or plain[-pad:] != bytes([pad]) * pad:
+            raise ValueError("Bad padding")
+        return plain[: padded - pad]
+
+
+class GCMRecordLayer(RecordLayer):
+    """Per-session AES-GCM records with implicit nonces
+
+    The AES-GCM context is keyed once per session. The nonce of each record
+    is the first `SALT_SIZE` bytes of the session IV followed by a 64-bit
+    counter whose top bit is the direction, so the two sides never use the
+    same nonce and a record cannot be reflected back to its sender. Records
+    arrive in order over TCP, so the counter is not sent.
+    """
+
+    def __init__(self, key: bytes, iv: bytes, initiator: bool = True, metrics=None):
+        """
+        :param key: session key
+        :param iv: initialization vector, its first bytes salt the nonces
+        :param initiator: True for the client, False for the server
+        :param metrics: see `RecordLayer`
+        """
+        from cryptography.exceptions import InvalidTag
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        self._aead = AESGCM(key)
+        self._invalid_tag = InvalidTag
+        self._salt = bytes(iv[:SALT_SIZE])
+        self._send_direction = 0 if initiator else DIRECTION_BIT
+        self._receive_direction = DIRECTION_BIT if initiator else 0
+        self._sent = 0
+        self._received = 0
+        self._instrument(metrics)
+
+    def _nonce(self, direction: int, counter: int) -> bytes:
+        """Nonce of the next record in one direction"""
+        if counter >= DIRECTION_BIT:
+            raise ValueError("Nonces exhausted, start a new session")
+        return self._salt + NONCE_COUNTER.pack(direction | counter)
+
+    def seal(self, message: bytes) -> bytes:
+        """Encrypt and authenticate a message
+
+        :param message: plaintext
+        :return: record (ciphertext followed by the tag)
+        """
+        nonce = self._nonce(self._send_direction, self._sent)
+        self._sent += 1
+        return self._aead.encrypt(nonce, bytes(message), None)
+
+    def open(self, record: bytes) -> bytes:
+        """Decrypt and authenticate a record
+
+        :param record: ciphertext followed by the tag
+        :return: plaintext
+        :raise: ValueError if the tag is invalid or the record is malformed
+        """
+        if len(record) < TAG_SIZE:
+            raise ValueError("Bad record length")
+        nonce = self._nonce(self._receive_direction, self._received)
+        try:
+            plaintext = self._aead.decrypt(nonce, bytes(record), None)
+        except self._invalid_tag:
+            self._count_failure()
+            raise ValueError("Bad tag") from None
+        # Only authentic records advance the counter
+        self._received += 1
+        return plaintext
+
+
+def new_record_layer(
+    cipher_name: str, cipher: object, key: bytes, iv: bytes, initiator: bool, metrics=None
+) -> RecordLayer:
+    """Record layer for the negotiated cipher
+
+    :param cipher_name: negotiated cipher's name
+    :param cipher: Crypto.Cipher module as returned by `get_key_and_iv`, unused for AEAD
+    :param key: session key
+    :param iv: initialization vector
+    :param initiator: True for the client, False for the server
+    :param metrics: see `RecordLayer`
+    :return: `GCMRecordLayer` for AEAD ciphers, `RecordLayer` otherwise
+    """
+    if cipher_name in AEAD_CIPHERS:
+        return GCMRecordLayer(key, iv, initiator=initiator, metrics=metrics)
+    return RecordLayer(cipher, key, iv, metrics=metrics, initiator=initiator)
+
+
+def split_record(record: bytes) -> Tuple[bytes, bytes]:
+    """Split a legacy record into (ciphertext, hex HMAC), see `server.read_message`"""
+    return record[:-HMAC_SIZE], record[-HMAC_SIZE:]
@@ -1,69 +1,66 @@
 #!/usr/bin/env python3
 # encoding: UTF-8
 
-from socket import socket, gethostname
-from socket import AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
-from typing import Tuple, Dict
-from diffiehellman.diffiehellman import DiffieHellman
-from Crypto.Cipher import AES, DES, Blowfish 
-from Crypto.Hash import SHA256
+import argparse
+import asyncio
+import hmac
+import os
+from collections import OrderedDict
+from importlib import import_module
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from socket import gethostname
+from time import perf_counter
+from typing import TYPE_CHECKING, Tuple, Dict, Optional
+from src.projects.vpn.framing import PROPOSAL, CHOSEN_CIPHER, DHMKE, DATA, ERROR
+from src.projects.vpn.framing import TICKET, RESUME, RESUMED, RESUME_REJECTED
+from src.projects.vpn.framing import PIPELINED, SEQUENCE, FILE_OFFER
+from src.projects.vpn.framing import MAX_HANDSHAKE_PAYLOAD, expect, read_frame_async, write_frame
+from src.projects.vpn.dhpool import DHKeyPool, generate_dh_keypair
+from src.projects.vpn.metrics import Metrics, start_metrics_server
+from src.projects.profiling import section
+from src.projects.vpn.record import new_record_layer, split_record
+from src.projects.vpn.transfer import receive_file
+from src.projects.vpn.tickets import NONCE_SIZE, SessionTickets, derive_session_key
+
+if TYPE_CHECKING:
+    from diffiehellman.diffiehellman import DiffieHellman
 
 HOST = gethostname()
 PORT = 4600
+UPLOAD_DIR = "data/projects/vpn/uploads"
+METRICS_PORT = 9460
 
-SUPPORTED_CIPHERS = {"AES": [256]}
+SUPPORTED_CIPHERS = {"AES-GCM": [256], "AES": [256]}
+# Crypto.Cipher modules, imported by `get_key_and_iv` once a cipher is chosen
+CIPHERS = {"AES-GCM": "AES", "AES": "AES", "Blowfish": "Blowfish", "DES": "DES"}
+PROPOSAL_PREFIX = "ProposedCiphers:"
+NEGOTIATION_CACHE_SIZE = 1024
+# Longer proposals are negotiated but not remembered
+NEGOTIATION_CACHE_MAX_PROPOSAL = 1024
 
 def parse_proposal(msg: str) -> Dict[str, list]:
     """Parse client's proposal
     
     :param msg: message from the client with a proposal (ciphers and key sizes)
     :return: the ciphers and keys as a dictionary
+    :raise: ValueError if the proposal is malformed
     """
-    current_cipher = ""
-    ciphers = msg[16:]
-    next = False
-    count = 0
-
-    for i in range(len(ciphers)):
-        if next == True:
-            next = False
-            if count == 1:
-                current_cipher = ciphers[:i] + ";" + ciphers[i+1:]
-            else:
-                current_cipher = current_cipher[:i] + ";" + current_cipher[i+1:] 
-        else:
-            if ciphers[i] == "]":
-                next = True
-                count += 1
- 
-    result = current_cipher.split(";")
-
-    for i in range(len(result)):
-        result[i] = result[i].split(":")
-        result[i][1] = result[i][1].strip("][").split(",")
-
-    
-    for m in range(len(result)):
-        for n in range(len(result[m][1])):
-            result[m][1][n] = int(result[m][1][n].strip())
-    print("RESULT", result)
-
-    dictionary = {}
-    for i in range(len(result)):
-        dictionary[result[i][0]] = result[i][1] 
-    print(dictionary)
-    return dictionary
-    # final = ""
-    # longest = 0
-    # for i in range(len(result)):
-    #     longest_key = int(result[i][1][len(result[i][1])-1])
-    #     if result[i][0] in SUPPORTED_CIPHERS and longest_key > longest:
-    #         longest = longest_key
-    #         final = "ChosenCipher:" + result[i][0] + ":" + str(longest)
-    # if final == "":
-    #     return "ChosenCipher:None:None"
-
-    # return final
+    if not msg.startswith(PROPOSAL_PREFIX):
+        raise ValueError("Bad proposal")
+    proposal = {}
+    # One pass over the message: jump from each `:[` to the matching `]`
+    start = len(PROPOSAL_PREFIX)
+    while start < len(msg):
+        sizes_start = msg.find(":[", start)
+        sizes_end = msg.find("]", sizes_start)
+        if sizes_start < 0 or sizes_end < 0:
+            raise ValueError("Bad proposal")
+        proposal[msg[start:sizes_start]] = [
+            int(size) for size in msg[sizes_start + 2 : sizes_end].split(",")
+        ]
+        start = sizes_end + 2
+    return proposal
 
 
 def select_cipher(supported: dict, proposed: dict) -> Tuple[str, int]:
@@ -73,22 +70,71 @@ def select_cipher(supported: dict, proposed: dict) -> Tuple[str, int]:
     :param proposed: dictionary of ciphers proposed by the client
     :return: tuple (cipher, key_size) of the common cipher where key_size is the longest supported by both
     :raise: ValueError if there is no (cipher, key_size) combination that both client and server support
+    Key sizes of `supported` may be sets for constant-time lookups, on a tie
+    the cipher proposed first wins
     """
-    longest_key_size = 0
-    result = ("None",0)
-    for key in proposed:
-        if key in supported:
-            keysize_server = supported[key]
-            keysize_client = proposed[key]
-            for keysize in keysize_server:
-                if keysize in keysize_client and keysize > longest_key_size:
-                    result = (key, keysize)
-
-    if result == ("None", 0):
-        raise ValueError('there is no (cipher, key_size) combination that both client and server support')
-    return result
-                
-            
+    selection = None
+    for cipher_name, key_sizes in proposed.items():
+        server_key_sizes = supported.get(cipher_name)
+        if server_key_sizes is None:
+            continue
+        for key_size in key_sizes:
+            if key_size in server_key_sizes and (selection is None or key_size > selection[1]):
+                selection = (cipher_name, key_size)
+    if selection is None:
+        raise ValueError("Could not agree on a cipher")
+    return selection
+
+
+class CipherNegotiator:
+    """Cipher selection with precompiled key sizes and a cache of recent proposals
+
+    Clients of the same build send identical proposals, so the outcome of
+    selection, including the lack of a common cipher, is remembered per raw
+    proposal. Malformed proposals and ones longer than
+    `NEGOTIATION_CACHE_MAX_PROPOSAL` are not remembered, so unauthenticated
+    clients cannot fill the cache with large entries. The least recently seen
+    proposal is evicted once `cache_size` is reached.
+    """
+
+    def __init__(self, supported: dict, cache_size: int = NEGOTIATION_CACHE_SIZE):
+        """
+        :param supported: ciphers supported by the server, read once
+        :param cache_size: number of distinct proposals to remember
+        """
+        self.supported = {
+            cipher_name: frozenset(key_sizes) for cipher_name, key_sizes in supported.items()
+        }
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def select(self, msg: str) -> Tuple[str, int]:
+        """Parse a proposal and select a cipher, see `select_cipher`
+
+        :param msg: message from the client with a proposal
+        :return: (cipher, key_size) tuple
+        :raise: ValueError if the proposal is malformed or there is no common cipher
+        """
+        selection = self._cache.get(msg)
+        if selection is None:
+            self.misses += 1
+            proposal = parse_proposal(msg)
+            try:
+                selection = select_cipher(self.supported, proposal)
+            except ValueError as err:
+                selection = err
+            if len(msg) <= NEGOTIATION_CACHE_MAX_PROPOSAL:
+                self._cache[msg] = selection
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        else:
+            self.hits += 1
+            self._cache.move_to_end(msg)
+        if isinstance(selection, ValueError):
+            raise ValueError(str(selection))
+        return selection
 
 
 def generate_cipher_response(cipher: str, key_size: int) -> str:
@@ -98,7 +144,7 @@ def generate_cipher_response(cipher: str, key_size: int) -> str:
     :param key_size: chosen key size
     :return: (cipher, key_size) selection as a string
     """
-    return "ChosenCipher:" + cipher + ":" + str(key_size)
+    return f"ChosenCipher:{cipher},{key_size}"
 
 
 def parse_dhm_request(msg: str) -> int:
@@ -121,7 +167,7 @@ def get_key_and_iv(
     :param cipher_name: negotiated cipher's name
     :param key_size: negotiated key size
     :return: (cipher, key, IV) tuple
-    cipher_name must be mapped to a Crypto.Cipher object
+    cipher_name must be mapped to a Crypto.Cipher module, imported on first use
     `key` is the *first* `key_size` bytes of the `shared_key`
     DES key must be padded to 64 bits with 0
     Length `ivlen` of IV depends on a cipher
@@ -129,27 +175,17 @@ def get_key_and_iv(
     Both key and IV must be returned as bytes
     """
     byte_shared_key = bytes(shared_key, 'utf-8')
-    
+    cipher = import_module(f"Crypto.Cipher.{CIPHERS[cipher_name]}")
+
     # key
-    key = byte_shared_key[:key_size]
-
-    # IV 
-    if cipher_name == "AES":
-        ivlen = AES.block_size
-    elif cipher_name == "DES":
-        ivlen = DES.block_size
-    else:
-        ivlen = Blowfish.block_size
-    IV = byte_shared_key[-ivlen:]
-
-    if cipher_name == "AES":
-        obj = AES.new(key, AES.MODE_CBC, IV)
-    elif cipher_name == "DES":
-        obj = AES.new(key, DES.MODE_CBC, IV)
-    else:
-        obj = AES.new(key, Blowfish.MODE_CBC, IV)
-    
-    return (obj, key, IV)
+    key = byte_shared_key[: key_size // 8]
+    if cipher_name == "DES":
+        key = key.ljust(8, b"\x00")
+
+    # IV
+    IV = byte_shared_key[-cipher.block_size :]
+
+    return (cipher, key, IV)
 
 
 def generate_dhm_response(public_key: int) -> str:
@@ -163,82 +199,330 @@ def generate_dhm_response(public_key: int) -> str:
 
 def read_message(msg_cipher: bytes, crypto: object) -> Tuple[str, str]:
     """Read the incoming encrypted message
-    
+
+    Legacy format only: zero-padded ciphertext and an HMAC without a record
+    number, as written by `client.encrypt_message`. Never mix it with
+    `record.RecordLayer`, whose records the server uses on the wire.
+
     :param msg_cipher: encrypted message from the socket
     :crypto: chosen cipher, must be initialized in the `main`
     :return: (plaintext, hmac) tuple
     """
-    raise NotImplementedError
+    ciphertext, hmac_in = split_record(msg_cipher)
+    plaintext = crypto.decrypt(ciphertext).rstrip(b"\x00")
+    return (plaintext.decode("utf-8"), hmac_in.decode("ascii"))
 
 
 def validate_hmac(msg_cipher: bytes, hmac_in: str, hashing: object) -> bool:
-    """Validate HMAC
-    
+    """Validate the HMAC of a legacy message, see `read_message`
+
     :param msg_cipher: encrypted message from the socket
     :param hmac_in: HMAC received from the client
     :param hashing: hashing object, must be initialized in the `main`
     :raise: ValueError is HMAC is invalid
     """
-    raise NotImplementedError
+    ciphertext, _ = split_record(msg_cipher)
+    # Work on a copy so `hashing` stays keyed but unused for the next message
+    hmac_check = hashing.copy()
+    hmac_check.update(ciphertext)
+    if not hmac.compare_digest(hmac_check.hexdigest(), hmac_in):
+        raise ValueError("Bad HMAC")
+    return True
+
+
+def generate_dh_secret(
+    server_diffiehellman: "DiffieHellman", client_public_key: int
+) -> "DiffieHellman":
+    """Compute the shared secret
+
+    :param server_diffiehellman: server's DHM object
+    :param client_public_key: public portion of the client's DHMKE
+    :return: the same DHM object with `shared_key` set, so it survives a process executor
+    """
+    server_diffiehellman.generate_shared_secret(client_public_key)
+    return server_diffiehellman
+
 
+async def resume_session(
+    writer: asyncio.StreamWriter, payload: bytes, tickets: SessionTickets
+) -> Optional[Tuple[str, int, str]]:
+    """Try to resume a session from the client's RESUME message
 
-def main():
+    :param writer: stream to the client
+    :param payload: client's nonce followed by its session ticket
+    :param tickets: ticket issuer of the server, None if resumption is disabled
+    :return: (cipher_name, key_size, shared_key) of the resumed session,
+    or None if the client must run the full handshake
+    """
+    session = tickets.redeem(payload[NONCE_SIZE:]) if tickets is not None else None
+    if session is None:
+        write_frame(writer, RESUME_REJECTED)
+        await writer.drain()
+        return None
+    cipher_name, key_size, shared_key = session
+    server_nonce = os.urandom(NONCE_SIZE)
+    shared_key = derive_session_key(shared_key, bytes(payload[:NONCE_SIZE]), server_nonce)
+    write_frame(
+        writer, RESUMED, server_nonce + generate_cipher_response(cipher_name, key_size).encode()
+    )
+    return cipher_name, key_size, shared_key
+
+
+async def handle_client(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    supported: dict = SUPPORTED_CIPHERS,
+    executor: Executor = None,
+    verbose: bool = True,
+    dh_pool: DHKeyPool = None,
+    tickets: SessionTickets = None,
+    upload_dir: str = None,
+    metrics: Metrics = None,
+    negotiator: CipherNegotiator = None,
+) -> None:
+    """Serve a single client: negotiate, exchange keys, and run the message loop
+
+    :param reader: stream from the client
+    :param writer: stream to the client
+    :param supported: ciphers supported by the server
+    :param executor: executor for the DHM computations, the loop's default if None
+    :param verbose: print progress as described in vpn.md
+    :param dh_pool: pre-generated key pairs, used when one of the right size is ready
+    :param tickets: ticket issuer, enables session resumption
+    :param upload_dir: where to store files sent by the client, uploads are refused if None
+    :param metrics: counters and histograms to update, see vpn.md for the names
+    :param negotiator: shared negotiation cache, a private one for `supported` if None
+    """
+    loop = asyncio.get_running_loop()
+    metrics = Metrics() if metrics is None else metrics
+    counters = metrics.counters
+    negotiator = negotiator or CipherNegotiator(supported)
+    counters["connections"] += 1
+    # This connection's traffic, observed when it closes
+    connection_bytes = connection_messages = 0
+    client = writer.get_extra_info("peername")
+    if verbose:
+        print(f"New client: {client[0]}:{client[1]}")
+    try:
+        # Nothing is authenticated before the key exchange, so handshake frames stay small
+        frame = await read_frame_async(reader, MAX_HANDSHAKE_PAYLOAD)
+        session = None
+        if frame is not None and frame[0] == RESUME:
+            start = perf_counter()
+            with section("vpn.server.resumption"):
+                session = await resume_session(writer, frame[1], tickets)
+            if session is None:
+                counters["resumptions_rejected"] += 1
+                frame = await read_frame_async(reader, MAX_HANDSHAKE_PAYLOAD)
+            else:
+                counters["resumptions"] += 1
+                metrics.observe("resumption_seconds", perf_counter() - start)
+                if verbose:
+                    print(f"Resumed session with {session[0]}{session[1]}")
+
+        if session is None:
+            if verbose:
+                print("Negotiating the cipher")
+            start = perf_counter()
+            with section("vpn.server.negotiation"):
+                msg_in = expect(frame, PROPOSAL).decode("utf-8")
+                try:
+                    cipher_name, key_size = negotiator.select(msg_in)
+                except ValueError as err:
+                    write_frame(writer, ERROR, str(err).encode())
+                    await writer.drain()
+                    return
+                write_frame(
+                    writer, CHOSEN_CIPHER, generate_cipher_response(cipher_name, key_size).encode()
+                )
+                await writer.drain()
+            metrics.observe("negotiation_seconds", perf_counter() - start)
+            if verbose:
+                print(f"We are going to use {cipher_name}{key_size}")
+
+            if verbose:
+                print("Negotiating the key")
+            # Includes waiting for the client's DHMKE message, as seen by the client
+            start = perf_counter()
+            with section("vpn.server.dhmke"):
+                server_diffiehellman = dh_pool.take(key_size) if dh_pool else None
+                if server_diffiehellman is None:
+                    server_diffiehellman = await loop.run_in_executor(
+                        executor, generate_dh_keypair, key_size
+                    )
+                dhm_in = expect(
+                    await read_frame_async(reader, MAX_HANDSHAKE_PAYLOAD), DHMKE
+                ).decode("utf-8")
+                server_diffiehellman = await loop.run_in_executor(
+                    executor, generate_dh_secret, server_diffiehellman, parse_dhm_request(dhm_in)
+                )
+                write_frame(
+                    writer, DHMKE, generate_dhm_response(server_diffiehellman.public_key).encode()
+                )
+            session = (cipher_name, key_size, server_diffiehellman.shared_key)
+            counters["handshakes"] += 1
+            metrics.observe("dhmke_seconds", perf_counter() - start)
+            if verbose:
+                print("The key has been established")
+
+        cipher_name, key_size, shared_key = session
+        # An empty ticket tells the client that resumption is disabled
+        ticket = tickets.issue(cipher_name, key_size, shared_key) if tickets is not None else b""
+        write_frame(writer, TICKET, ticket)
+        await writer.drain()
+
+        if verbose:
+            print("Initializing cryptosystem")
+        start = perf_counter()
+        with section("vpn.server.cryptosystem_init"):
+            record = new_record_layer(
+                cipher_name,
+                *get_key_and_iv(shared_key, cipher_name, key_size),
+                initiator=False,
+                metrics=metrics,
+            )
+        metrics.observe("cryptosystem_init_seconds", perf_counter() - start)
+        if verbose:
+            print("All systems ready")
+
+        while True:
+            frame = await read_frame_async(reader)
+            if frame is None:
+                break
+            connection_bytes += len(frame[1])
+            if frame[0] == FILE_OFFER:
+                offer = bytes(record.open(frame[1])).decode("utf-8")
+                path = await receive_file(reader, writer, record, offer, upload_dir)
+                counters["files"] += 1
+                if verbose:
+                    print(f"Received {path}")
+                continue
+            if frame[0] == PIPELINED:
+                plaintext = bytes(record.open(frame[1]))
+                sequence = plaintext[: SEQUENCE.size]
+                msg_in = plaintext[SEQUENCE.size :].decode("utf-8")
+            else:
+                msg_in = bytes(record.open(expect(frame, DATA))).decode("utf-8")
+            if verbose:
+                print(f"Received: {msg_in}")
+            msg_out = f"Server says: {msg_in[::-1]}".encode()
+            connection_messages += 1
+            connection_bytes += len(msg_out)
+            if frame[0] == PIPELINED:
+                write_frame(writer, PIPELINED, sequence + msg_out)
+            else:
+                write_frame(writer, DATA, msg_out)
+            await writer.drain()
+    except (ConnectionError, ValueError) as err:
+        counters["dropped"] += 1
+        if verbose:
+            print(f"Dropping {client[0]}:{client[1]}: {err}")
+    finally:
+        writer.close()
+        counters["messages"] += connection_messages
+        counters["bytes"] += connection_bytes
+        metrics.observe("connection_messages", connection_messages)
+        metrics.observe("connection_bytes", connection_bytes)
+
+
+async def serve(
+    host: str = HOST,
+    port: int = PORT,
+    supported: dict = SUPPORTED_CIPHERS,
+    executor: Executor = None,
+    verbose: bool = True,
+    dh_pool: DHKeyPool = None,
+    tickets: SessionTickets = None,
+    upload_dir: str = None,
+    metrics: Metrics = None,
+    negotiator: CipherNegotiator = None,
+) -> None:
+    """Accept clients until cancelled, each one served by its own coroutine
+
+    :param host: address to bind
+    :param port: TCP port to listen on
+    :param supported: ciphers supported by the server
+    :param executor: executor for the DHM computations, the loop's default if None
+    :param verbose: print progress as described in vpn.md
+    :param dh_pool: pre-generated key pairs for the supported key sizes
+    :param tickets: ticket issuer, enables session resumption
+    :param upload_dir: where to store files sent by clients, uploads are refused if None
+    :param metrics: counters and histograms shared by all clients
+    :param negotiator: negotiation cache shared by all clients, built from `supported` if None
+    """
+    server = await asyncio.start_server(
+        partial(
+            handle_client,
+            supported=supported,
+            executor=executor,
+            verbose=verbose,
+            dh_pool=dh_pool,
+            tickets=tickets,
+            upload_dir=upload_dir,
+            metrics=metrics,
+            negotiator=negotiator or CipherNegotiator(supported),
+        ),
+        host,
+        port,
+        reuse_address=True,
+        backlog=1024,
+    )
+    if verbose:
+        print(f"Listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: list = None):
     """Main loop
 
     See vpn.md for details
+    :param argv: command line arguments, sys.argv[1:] if None
     """
-    server_sckt = socket(AF_INET, SOCK_STREAM)
-    server_sckt.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
-    server_sckt.bind((HOST, PORT))
-    server_sckt.listen()
-    print(f"Listening on {HOST}:{PORT}")
-    conn, client = server_sckt.accept()
-    print(f"New client: {client[0]}:{client[1]}")
-
-    print("Negotiating the cipher")
-    msg_in = conn.recv(4096).decode("utf-8")
-    cipher_dict = parse_proposal(msg_in)
-
-    selected_cipher = select_cipher(SUPPORTED_CIPHERS, cipher_dict)
-
-    #print("SELECTED CIPHER", selected_cipher)
-    cipher_name = selected_cipher[0]
-    key_size = selected_cipher[1]
-
-    cipher_out = generate_cipher_response(cipher_name, key_size)
-    conn.send(cipher_out.encode())
-    # Follow the description
-    print(f"We are going to use {cipher_name}{key_size}")
-
-
-    print("Negotiating the key")
-    # Follow the description
-    server_diffiehellman = DiffieHellman(key_length=key_size)
-    server_diffiehellman.generate_public_key()
-    
-    dhm_in = conn.recv(4096).decode("utf-8")
-
-    server_diffiehellman.generate_shared_secret(parse_dhm_request(dhm_in))
-
-    conn.send(generate_dhm_response(server_diffiehellman.public_key))
-
-    print("The key has been established")
-
-    print("Initializing cryptosystem")
-    # Follow the description
-    key_and_iv = get_key_and_iv(str(server_diffiehellman.shared_secret), cipher_name, key_size)
-
-
-    print("All systems ready")
-
-    while True:
-        msg_in = conn.recv(4096).decode("utf-8")
-        if len(msg_in) < 1:
-            conn.close()
-            break
-        print(f"Received: {msg_in}")
-        msg_out = f"Server says: {msg_in[::-1]}"
-        conn.send(msg_out.encode())
+    parser = argparse.ArgumentParser(description="Custom VPN server")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="worker processes sharing the port with SO_REUSEPORT, e.g. one per core",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=METRICS_PORT,
+        help="serve Prometheus metrics on this local port, 0 to disable",
+    )
+    args = parser.parse_args(argv)
+    if args.workers > 1:
+        # Imported here because the pre-fork supervisor itself imports this module
+        from src.projects.vpn.prefork import Supervisor
+
+        Supervisor(
+            args.workers, HOST, PORT, upload_dir=UPLOAD_DIR, metrics_port=args.metrics_port
+        ).run()
+        return
+
+    metrics = Metrics()
+    key_sizes = {size for sizes in SUPPORTED_CIPHERS.values() for size in sizes}
+    with ProcessPoolExecutor() as executor:
+        # Priming the pool forks every executor process, before any thread holds a lock
+        dh_pool = DHKeyPool(key_sizes, executor=executor)
+        if args.metrics_port:
+            start_metrics_server(metrics.render, args.metrics_port)
+        try:
+            asyncio.run(
+                serve(
+                    executor=executor,
+                    dh_pool=dh_pool,
+                    tickets=SessionTickets(),
+                    upload_dir=UPLOAD_DIR,
+                    metrics=metrics,
+                )
+            )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dh_pool.close()
 
 
 if __name__ == "__main__":
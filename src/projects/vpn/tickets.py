@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Session tickets that let returning VPN clients skip the full handshake
+
+After a full handshake the server seals the negotiated cipher, key size, and
+shared key into a ticket only the server can open. A returning client sends
+the ticket with a fresh nonce; the server answers with its own nonce and both
+sides derive a new shared key from the old one and the two nonces, so the
+session resumes in one round trip without another DHM exchange.
+
+Tickets are sealed with the AES-GCM of `cryptography`, as AEAD records are,
+imported on first use so that importing the VPN modules stays cheap.
+"""
+
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Optional, Tuple
+
+NONCE_SIZE = 16
+TICKET_LIFETIME = 3600
+ROTATION_INTERVAL = 600
+CACHE_SIZE = 10000
+
+_KEY_ID_SIZE = 4
+_GCM_NONCE_SIZE = 12
+_TAG_SIZE = 16
+
+
+def derive_session_key(shared_key: str, client_nonce: bytes, server_nonce: bytes) -> str:
+    """Derive the shared key of a resumed session
+
+    :param shared_key: shared key of the previous session
+    :param client_nonce: random bytes sent by the client with the ticket
+    :param server_nonce: random bytes sent by the server in response
+    :return: new shared key, formatted like `DiffieHellman.shared_key`
+    """
+    return sha256(shared_key.encode("utf-8") + client_nonce + server_nonce).hexdigest()
+
+
+class SessionTickets:
+    """Issue and redeem session tickets
+
+    Tickets are sealed with AES-GCM under a ticket key that rotates every
+    `rotation_interval` seconds; older keys are kept just long enough to open
+    tickets that have not expired yet. The server also remembers the IDs of
+    the last `cache_size` sessions it issued tickets for, evicting the least
+    recently issued. A ticket is accepted only once and only while its session
+    is in that cache, which bounds both replay and the number of live sessions.
+
+    Server processes that share a `secret` derive the same ticket key for each
+    rotation period, so a ticket issued by one opens in all of them. As a
+    process cannot know the sessions issued by the others, the cache then
+    holds the last `cache_size` redeemed sessions instead, per process: a
+    ticket can be redeemed once in each process until it expires, so such
+    servers should use a short `lifetime` (see `prefork.TICKET_LIFETIME`).
+    """
+
+    def __init__(
+        self,
+        lifetime: float = TICKET_LIFETIME,
+        rotation_interval: float = ROTATION_INTERVAL,
+        cache_size: int = CACHE_SIZE,
+        secret: bytes = None,
+    ):
+        self.lifetime = lifetime
+        self.rotation_interval = rotation_interval
+        self.cache_size = cache_size
+        self._secret = secret
+        self._lock = threading.Lock()
+        # key ID -> (key, creation time), newest last
+        self._keys: "OrderedDict[bytes, Tuple[bytes, float]]" = OrderedDict()
+        # session ID -> expiry time, least recently issued first
+        self._sessions: "OrderedDict[bytes, float]" = OrderedDict()
+        self.rotate()
+
+    def rotate(self) -> None:
+        """Start sealing tickets with a new key and drop keys that are no longer needed"""
+        now = time.time()
+        with self._lock:
+            if self._secret is None:
+                self._keys[os.urandom(_KEY_ID_SIZE)] = (os.urandom(32), now)
+            else:
+                key_id = self._period(now).to_bytes(_KEY_ID_SIZE, "big")
+                # Re-inserted so that it ends up last even if the period did not change
+                self._keys.pop(key_id, None)
+                self._keys[key_id] = (self._derive(key_id), now)
+            for key_id, (_, created) in list(self._keys.items())[:-1]:
+                if created + self.rotation_interval + self.lifetime < now:
+                    del self._keys[key_id]
+
+    def _period(self, now: float) -> int:
+        """Number of the rotation period `now` falls in"""
+        return int(now // self.rotation_interval) % (1 << (8 * _KEY_ID_SIZE))
+
+    def _derive(self, key_id: bytes) -> bytes:
+        """Ticket key of a rotation period, derived from the shared secret"""
+        return hmac.new(self._secret, key_id, sha256).digest()
+
+    def _lookup_key(self, key_id: bytes) -> Optional[bytes]:
+        """Get the key a ticket was sealed with, None if it is unknown or retired"""
+        with self._lock:
+            if key_id in self._keys:
+                return self._keys[key_id][0]
+        if self._secret is None:
+            return None
+        # Issued by another process sharing the secret: derive the key if it is recent enough
+        age = self._period(time.time()) - int.from_bytes(key_id, "big")
+        if 0 <= age <= self.lifetime // self.rotation_interval + 1:
+            return self._derive(key_id)
+        return None
+
+    def _current_key(self) -> Tuple[bytes, bytes]:
+        """Get the (key ID, key) to seal with, rotating if it is due"""
+        key_id, (key, created) = next(reversed(self._keys.items()))
+        if created + self.rotation_interval < time.time():
+            self.rotate()
+            key_id, (key, _) = next(reversed(self._keys.items()))
+        return key_id, key
+
+    def _remember(self, session_id: bytes, expires: float) -> None:
+        """Add a session to the cache, evicting the oldest, with the lock held"""
+        self._sessions[session_id] = expires
+        while len(self._sessions) > self.cache_size:
+            self._sessions.popitem(last=False)
+
+    def issue(self, cipher_name: str, key_size: int, shared_key: str) -> bytes:
+        """Seal the session state into a ticket
+
+        :param cipher_name: negotiated cipher's name
+        :param key_size: negotiated key size
+        :param shared_key: shared key of the session
+        :return: opaque ticket for the client
+        """
+        session_id = os.urandom(16)
+        expires = time.time() + self.lifetime
+        state = json.dumps(
+            {
+                "session": session_id.hex(),
+                "cipher": cipher_name,
+                "key_size": key_size,
+                "shared_key": shared_key,
+                "expires": expires,
+            }
+        ).encode("utf-8")
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        key_id, key = self._current_key()
+        nonce = os.urandom(_GCM_NONCE_SIZE)
+        # The key ID is authenticated, the ciphertext is followed by the tag
+        sealed = AESGCM(key).encrypt(nonce, state, key_id)
+        with self._lock:
+            if self._secret is None:
+                self._remember(session_id, expires)
+        return key_id + nonce + sealed
+
+    def redeem(self, ticket: bytes) -> Optional[Tuple[str, int, str]]:
+        """Open a ticket presented by a returning client
+
+        :param ticket: ticket as returned by `issue`
+        :return: (cipher_name, key_size, shared_key) tuple, or None if the ticket
+        is forged, expired, already used, or its session was evicted
+        """
+        from cryptography.exceptions import InvalidTag
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        ticket = bytes(ticket)
+        if len(ticket) < _KEY_ID_SIZE + _GCM_NONCE_SIZE + _TAG_SIZE:
+            return None
+        key_id = ticket[:_KEY_ID_SIZE]
+        nonce = ticket[_KEY_ID_SIZE : _KEY_ID_SIZE + _GCM_NONCE_SIZE]
+        key = self._lookup_key(key_id)
+        if key is None:
+            return None
+        try:
+            state = json.loads(
+                AESGCM(key).decrypt(nonce, ticket[_KEY_ID_SIZE + _GCM_NONCE_SIZE :], key_id)
+            )
+        except (InvalidTag, ValueError):
+            return None
+        with self._lock:
+            session_id = bytes.fromhex(state["session"])
+            if self._secret is None:
+                if self._sessions.pop(session_id, None) is None:
+                    return None
+            elif session_id in self._sessions:
+                return None
+            else:
+                self._remember(session_id, state["expires"])
+        if state["expires"] < time.time():
+            return None
+        return state["cipher"], state["key_size"], state["shared_key"]
+
+    def __len__(self) -> int:
+        """Number of sessions that can still be resumed, or that were redeemed with a secret"""
+        return len(self._sessions)
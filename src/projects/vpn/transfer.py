@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Resumable file transfer over the VPN tunnel
+
+The client offers a file by name and size, and the server answers with the
+offset it already has from an interrupted upload. The client then streams
+the rest of the file in fixed-size encrypted chunks. A reader thread reads
+and encrypts chunks into a bounded queue while the main thread sends them,
+so disk, cipher, and network overlap and memory use stays at `depth` chunks
+no matter how large the file is. The server appends to `<name>.part` and
+renames it once the last byte has arrived, with the file operations on
+worker threads so that its event loop keeps serving the other clients.
+Only one upload of a name runs at a time: the `.part` file is locked, with
+`flock` so that pre-fork workers sharing the directory see it too, and a
+second offer of the same name is refused until the first upload ends.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+from socket import socket
+from typing import BinaryIO, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows, where uploads are only exclusive within one process
+    fcntl = None
+
+from src.projects.vpn.framing import FILE_OFFER, FILE_ACCEPT, FILE_CHUNK, FILE_DONE, ERROR
+from src.projects.vpn.framing import FrameReader, expect, read_frame_async, send_frame, write_frame
+from src.projects.vpn.record import RecordLayer
+
+CHUNK_SIZE = 64 * 1024
+QUEUE_DEPTH = 16
+
+# `.part` files being written by this process, when `flock` is not available
+_receiving: Set[str] = set()
+_receiving_lock = threading.Lock()
+
+
+def generate_file_offer(name: str, size: int) -> str:
+    """Offer a file to the server
+
+    :param name: file name, without directories
+    :param size: file size in bytes
+    :return: message according to vpn.md
+    """
+    return f"FileOffer:{name}:{size}"
+
+
+def parse_file_offer(msg: str) -> Tuple[str, int]:
+    """Parse a file offer
+
+    :param msg: client's FileOffer message
+    :return: (name, size) tuple, directories are stripped from the name
+    :raise: ValueError if the message is malformed or the name is not usable
+    """
+    header, _, rest = msg.partition(":")
+    name, _, size = rest.rpartition(":")
+    name = os.path.basename(name)
+    if header != "FileOffer" or name in ("", ".", ".."):
+        raise ValueError("Bad file offer")
+    return name, int(size)
+
+
+def generate_file_accept(offset: int) -> str:
+    """Accept a file offer, asking for the bytes after `offset`"""
+    return f"FileAccept:{offset}"
+
+
+def parse_file_accept(msg: str) -> int:
+    """Parse the server's answer to a file offer
+
+    :param msg: server's FileAccept message
+    :return: offset to resume the transfer from
+    """
+    return int(msg.split(":")[1])
+
+
+def _put(chunks: queue.Queue, item: object, stop: threading.Event) -> bool:
+    """Put an item on the queue, giving up once the sender has stopped"""
+    while not stop.is_set():
+        try:
+            chunks.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _read_chunks(
+    path: str,
+    offset: int,
+    size: int,
+    record: RecordLayer,
+    chunk_size: int,
+    chunks: queue.Queue,
+    stop: threading.Event,
+) -> None:
+    """Read and encrypt the file from `offset` to `size`, one chunk at a time
+
+    The file is read into one reusable buffer; a memoryview slice of it is
+    encrypted so that only the sealed record is copied onto the queue.
+    None marks the end, an exception is passed on to the sender.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    try:
+        with open(path, "rb", buffering=0) as source:
+            source.seek(offset)
+            while offset < size:
+                read = source.readinto(view[: min(chunk_size, size - offset)])
+                if not read:
+                    raise ValueError(f"{path} shrank during the transfer")
+                offset += read
+                if not _put(chunks, bytes(record.seal(view[:read])), stop):
+                    return
+    except (OSError, ValueError) as err:
+        _put(chunks, err, stop)
+        return
+    _put(chunks, None, stop)
+
+
+def send_file(
+    sckt: socket,
+    frames: FrameReader,
+    record: RecordLayer,
+    path: str,
+    chunk_size: int = CHUNK_SIZE,
+    depth: int = QUEUE_DEPTH,
+) -> int:
+    """Upload a file, resuming where an earlier upload stopped
+
+    :param sckt: connected socket with an established session
+    :param frames: frame reader of the socket
+    :param record: record layer of the session
+    :param path: file to send
+    :param chunk_size: plaintext bytes per chunk
+    :param depth: encrypted chunks allowed to wait for the network
+    :return: number of bytes sent, less than the file size when resumed
+    :raise: ConnectionError if the connection drops, call again on a new one to resume
+    """
+    size = os.path.getsize(path)
+    offer = generate_file_offer(os.path.basename(path), size).encode()
+    send_frame(sckt, FILE_OFFER, record.seal(offer))
+    offset = parse_file_accept(bytes(expect(frames.read_frame(), FILE_ACCEPT)).decode("utf-8"))
+
+    chunks: queue.Queue = queue.Queue(depth)
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=_read_chunks,
+        args=(path, offset, size, record, chunk_size, chunks, stop),
+        name="vpn-file-reader",
+    )
+    reader.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            send_frame(sckt, FILE_CHUNK, chunk)
+    finally:
+        stop.set()
+        reader.join()
+    expect(frames.read_frame(), FILE_DONE)
+    return size - offset
+
+
+def _lock_partial(target: BinaryIO) -> bool:
+    """Take the upload lock of an open `.part` file without waiting
+
+    :return: False if another upload holds it, or renamed the file in the meantime
+    """
+    if fcntl is None:
+        with _receiving_lock:
+            if target.name in _receiving:
+                return False
+            _receiving.add(target.name)
+            return True
+    try:
+        fcntl.flock(target.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    try:
+        # The upload that held the lock may have finished and renamed this very file
+        return os.stat(target.name).st_ino == os.fstat(target.fileno()).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def _close_partial(target: BinaryIO) -> None:
+    """Close a `.part` file, releasing its upload lock"""
+    if fcntl is None:
+        with _receiving_lock:
+            _receiving.discard(target.name)
+    target.close()
+
+
+def _open_partial(upload_dir: str, name: str, size: int) -> Tuple[BinaryIO, int]:
+    """Open and lock `<name>.part` to append to it, keeping what an interrupted upload left
+
+    :return: (file, offset) tuple, the file is positioned at the offset
+    :raise: BlockingIOError if another upload of the same name is in progress
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    partial = os.path.join(upload_dir, name) + ".part"
+    # Created if missing but never truncated before the lock is held
+    target = open(partial, "r+b", opener=lambda path, flags: os.open(path, flags | os.O_CREAT))
+    if not _lock_partial(target):
+        target.close()
+        raise BlockingIOError(f"{name} is being uploaded")
+    offset = os.fstat(target.fileno()).st_size
+    if offset > size:
+        offset = 0
+    target.truncate(offset)
+    target.seek(offset)
+    return target, offset
+
+
+def _finish_partial(target: BinaryIO, path: str) -> None:
+    """Give the complete `.part` file its name and close it"""
+    if fcntl is None:
+        # Open files cannot be renamed there
+        _close_partial(target)
+    # Otherwise renamed while still locked, so no other upload can append to it in between
+    os.replace(target.name, path)
+    _close_partial(target)
+
+
+async def receive_file(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    record: RecordLayer,
+    offer: str,
+    upload_dir: str,
+) -> str:
+    """Store a file uploaded by `send_file`
+
+    Every file operation runs on the loop's default executor, so a slow disk
+    does not hold up the other clients. While a chunk is being written the
+    next one is read and decrypted, at most one write is pending at a time.
+    :param reader: stream from the client
+    :param writer: stream to the client
+    :param record: record layer of the session
+    :param offer: client's FileOffer message, already decrypted
+    :param upload_dir: directory to store uploads in, None if uploads are disabled
+    :return: path of the stored file
+    :raise: ConnectionError if the client disconnects, the partial file is kept;
+    ValueError if another upload of the same name is in progress
+    """
+    if upload_dir is None:
+        write_frame(writer, ERROR, b"File transfer is disabled")
+        await writer.drain()
+        raise ValueError("File transfer is disabled")
+    name, size = parse_file_offer(offer)
+    path = os.path.join(upload_dir, name)
+    loop = asyncio.get_running_loop()
+    try:
+        target, offset = await loop.run_in_executor(None, _open_partial, upload_dir, name, size)
+    except BlockingIOError as err:
+        write_frame(writer, ERROR, b"File is being uploaded, try again later")
+        await writer.drain()
+        raise ValueError(str(err)) from None
+    write = None
+    try:
+        write_frame(writer, FILE_ACCEPT, generate_file_accept(offset).encode())
+        await writer.drain()
+        while offset < size:
+            chunk = expect(await read_frame_async(reader), FILE_CHUNK)
+            # Copied, the record layer reuses its buffer for the next chunk
+            plaintext = bytes(record.open(chunk))
+            if len(plaintext) > size - offset:
+                raise ValueError("File is larger than offered")
+            if write is not None:
+                await write
+            write = loop.run_in_executor(None, target.write, plaintext)
+            offset += len(plaintext)
+        if write is not None:
+            await write
+            write = None
+        await loop.run_in_executor(None, _finish_partial, target, path)
+    finally:
+        if write is not None:
+            # Let the pending write land before the file is closed under it
+            await asyncio.gather(write, return_exceptions=True)
+        if not target.closed:
+            await loop.run_in_executor(None, _close_partial, target)
+    write_frame(writer, FILE_DONE, f"FileDone:{size}".encode())
+    await writer.drain()
+    return path
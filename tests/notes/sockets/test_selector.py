@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+"""
+Testing the selectors-based echo server and its load client
+"""
+
+import threading
+from socket import socket, create_connection, AF_INET, SOCK_STREAM
+import pytest
+from src.notes.sockets import selector_client, selector_server
+
+
+@pytest.fixture
+def echo_server():
+    """An echo server on an ephemeral port, serving from a thread"""
+    server_socket = socket(AF_INET, SOCK_STREAM)
+    server_socket.bind(("127.0.0.1", 0))
+    server_socket.listen(16)
+    stop = threading.Event()
+    thread = threading.Thread(target=selector_server.serve, args=(server_socket, stop))
+    thread.start()
+    yield server_socket.getsockname()
+    stop.set()
+    thread.join(timeout=5)
+    server_socket.close()
+    assert not thread.is_alive()
+
+
+def test_echo(echo_server):
+    """Testing that the server sends back what a client sends"""
+    with create_connection(echo_server, timeout=5) as sckt:
+        message = b"hello, selectors\n" * 1000
+        sckt.sendall(message)
+        received = b""
+        while len(received) < len(message):
+            data = sckt.recv(selector_server.RECV_SIZE)
+            assert data
+            received += data
+        assert received == message
+
+
+def test_client_closes(echo_server):
+    """Testing that a client leaving is noticed and the server keeps serving"""
+    with create_connection(echo_server, timeout=5) as sckt:
+        sckt.sendall(b"bye")
+        assert sckt.recv(16) == b"bye"
+    with create_connection(echo_server, timeout=5) as sckt:
+        sckt.sendall(b"again")
+        assert sckt.recv(16) == b"again"
+
+
+def test_stop_closes_clients():
+    """Testing that stopping the server closes clients still connected"""
+    server_socket = socket(AF_INET, SOCK_STREAM)
+    server_socket.bind(("127.0.0.1", 0))
+    server_socket.listen(16)
+    stop = threading.Event()
+    thread = threading.Thread(target=selector_server.serve, args=(server_socket, stop))
+    thread.start()
+    with create_connection(server_socket.getsockname(), timeout=5) as sckt:
+        sckt.sendall(b"ping")
+        assert sckt.recv(16) == b"ping"
+        stop.set()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert sckt.recv(16) == b""
+    server_socket.close()
+
+
+def test_load_client(echo_server):
+    """Testing the load client against the server"""
+    host, port = echo_server
+    result = selector_client.run(host, port, connections=10, messages=5, size=4096)
+    assert len(result["latencies"]) == 50
+    assert result["bytes"] == 2 * 4096 * 50
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""Local stand-in for Google's OpenID Connect provider
+
+Serves the discovery document, its signing keys, and the authorization,
+token, and userinfo endpoints over plain HTTP on a local port, approving
+every login right away. ID tokens are signed with RS256 like Google's.
+Tests and benchmarks point the app's GOOGLE_DISCOVERY_URL at it (with
+OAUTHLIB_INSECURE_TRANSPORT=1 in the environment) to run the whole login
+flow without the network.
+"""
+
+import base64
+import itertools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict
+from urllib.parse import urlencode
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from flask import Flask, abort, jsonify, redirect, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+CLIENT_ID = "stub-client-id"
+CLIENT_SECRET = "stub-client-secret"
+DISCOVERY_PATH = "/.well-known/openid-configuration"
+TOKEN_LIFETIME = 3600
+
+
+def b64url_encode(data: bytes) -> str:
+    """Unpadded base64url as used by JWS and JWK"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def b64url_uint(number: int) -> str:
+    """Unsigned big-endian integer in base64url, as JWK encodes RSA parameters"""
+    return b64url_encode(number.to_bytes((number.bit_length() + 7) // 8, "big"))
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log every request"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class StubIdentityProvider:
+    """Identity provider running in a background thread
+
+    Each authorization request logs in the user named by its `login_hint`,
+    or a new user if there is none. `requests` counts the calls per endpoint.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        client_id: str = CLIENT_ID,
+        client_secret: str = CLIENT_SECRET,
+        cache_control: str = "public, max-age=3600",
+    ):
+        """
+        :param host: address to bind
+        :param port: TCP port, 0 for any free one
+        :param client_id: the only client accepted by the token endpoint
+        :param client_secret: its secret
+        :param cache_control: Cache-Control header of the discovery document and keys
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.cache_control = cache_control
+        self.requests = Counter()
+        self._users = itertools.count(1)
+        self._codes: Dict[str, dict] = {}
+        self._tokens: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._keys: Dict[str, rsa.RSAPrivateKey] = {}
+        self.kid = None
+        self.rotate_key()
+        self._server = make_server(
+            host, port, self._create_app(), threaded=True, request_handler=QuietRequestHandler
+        )
+        self.url = f"http://{host}:{self._server.server_port}"
+        self.discovery_url = self.url + DISCOVERY_PATH
+        self._thread = None
+
+    @staticmethod
+    def claims_for(login: str) -> dict:
+        """Claims of the user with the given login name"""
+        return {
+            "sub": f"stub-{login}",
+            "email": f"{login}@example.com",
+            "email_verified": True,
+            "name": login.capitalize(),
+            "given_name": login.capitalize(),
+            "picture": f"https://example.com/{login}.png",
+        }
+
+    def rotate_key(self) -> None:
+        """Sign new tokens with a new key, still publishing the old ones"""
+        self.kid = os.urandom(8).hex()
+        self._keys[self.kid] = rsa.generate_private_key(65537, 2048, default_backend())
+
+    def jwks(self) -> dict:
+        """Public keys as a JSON Web Key Set"""
+        keys = []
+        for kid, private_key in list(self._keys.items()):
+            numbers = private_key.public_key().public_numbers()
+            keys.append(
+                {
+                    "kty": "RSA",
+                    "use": "sig",
+                    "alg": "RS256",
+                    "kid": kid,
+                    "n": b64url_uint(numbers.n),
+                    "e": b64url_uint(numbers.e),
+                }
+            )
+        return {"keys": keys}
+
+    def sign(self, claims: dict, kid: str = None) -> str:
+        """Compact RS256 JWS of the claims, signed with the current key by default"""
+        kid = kid or self.kid
+        header = b64url_encode(json.dumps({"alg": "RS256", "typ": "JWT", "kid": kid}).encode())
+        payload = b64url_encode(json.dumps(claims).encode())
+        signature = self._keys[kid].sign(
+            f"{header}.{payload}".encode("ascii"), padding.PKCS1v15(), hashes.SHA256()
+        )
+        return f"{header}.{payload}.{b64url_encode(signature)}"
+
+    def id_token(self, claims: dict) -> str:
+        """Signed ID token of a user for our client"""
+        now = int(time.time())
+        return self.sign(
+            dict(claims, iss=self.url, aud=self.client_id, iat=now, exp=now + TOKEN_LIFETIME)
+        )
+
+    def _issue(self, table: dict, value: dict) -> str:
+        """Store `value` under a new random key"""
+        key = os.urandom(16).hex()
+        with self._lock:
+            table[key] = value
+        return key
+
+    def _create_app(self) -> Flask:
+        """Flask app of the provider's endpoints"""
+        app = Flask(__name__)
+
+        @app.before_request
+        def count():
+            self.requests[request.path] += 1
+
+        @app.route(DISCOVERY_PATH)
+        def discovery():
+            response = jsonify(
+                issuer=self.url,
+                authorization_endpoint=self.url + "/authorize",
+                token_endpoint=self.url + "/token",
+                userinfo_endpoint=self.url + "/userinfo",
+                jwks_uri=self.url + "/jwks",
+                response_types_supported=["code"],
+                subject_types_supported=["public"],
+                id_token_signing_alg_values_supported=["RS256"],
+            )
+            if self.cache_control:
+                response.headers["Cache-Control"] = self.cache_control
+            return response
+
+        @app.route("/jwks")
+        def jwks():
+            response = jsonify(self.jwks())
+            if self.cache_control:
+                response.headers["Cache-Control"] = self.cache_control
+            return response
+
+        @app.route("/authorize")
+        def authorize():
+            if request.args.get("client_id") != self.client_id:
+                abort(400)
+            login = request.args.get("login_hint") or f"user{next(self._users)}"
+            code = self._issue(self._codes, self.claims_for(login))
+            query = {"code": code}
+            if "state" in request.args:
+                query["state"] = request.args["state"]
+            return redirect(request.args["redirect_uri"] + "?" + urlencode(query))
+
+        @app.route("/token", methods=["POST"])
+        def token():
+            auth = request.authorization
+            if auth is None or (auth.username, auth.password) != (
+                self.client_id,
+                self.client_secret,
+            ):
+                abort(401)
+            with self._lock:
+                claims = self._codes.pop(request.form.get("code", ""), None)
+            if claims is None:
+                return jsonify(error="invalid_grant"), 400
+            return jsonify(
+                access_token=self._issue(self._tokens, claims),
+                id_token=self.id_token(claims),
+                token_type="Bearer",
+                expires_in=TOKEN_LIFETIME,
+            )
+
+        @app.route("/userinfo")
+        def userinfo():
+            _, _, access_token = request.headers.get("Authorization", "").partition(" ")
+            with self._lock:
+                claims = self._tokens.get(access_token)
+            if claims is None:
+                abort(401)
+            return jsonify(claims)
+
+        return app
+
+    def start(self) -> "StubIdentityProvider":
+        """Serve requests from a daemon thread"""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="stub-idp", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StubIdentityProvider":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    with StubIdentityProvider(port=5001) as provider:
+        print(f"Discovery document at {provider.discovery_url}")
+        threading.Event().wait()
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+"""
+Testing the login flow of the authorization app against a stub provider
+"""
+
+from urllib.parse import urlsplit
+import pytest
+import requests
+from src.projects.authorization import db
+from src.projects.authorization.app import app, provider_configs, provider_keys
+from src.projects.authorization.oidc import MIN_REFRESH
+from tests.projects.authorization.stub_idp import StubIdentityProvider
+
+
+@pytest.fixture(name="provider")
+def fixture_provider():
+    """Running stub identity provider"""
+    with StubIdentityProvider() as provider:
+        yield provider
+
+
+@pytest.fixture(name="test_client")
+def fixture_test_client(provider, tmp_path, monkeypatch):
+    """App pointed at the stub provider with an empty database"""
+    monkeypatch.setenv("OAUTHLIB_INSECURE_TRANSPORT", "1")
+    monkeypatch.setitem(app.config, "DATABASE", str(tmp_path / "sqlite_db"))
+    monkeypatch.setitem(app.config, "GOOGLE_DISCOVERY_URL", provider.discovery_url)
+    monkeypatch.setitem(app.config, "GOOGLE_CLIENT_ID", provider.client_id)
+    monkeypatch.setitem(app.config, "GOOGLE_CLIENT_SECRET", provider.client_secret)
+    with app.app_context():
+        db.init_db()
+    provider_configs.clear()
+    provider_keys.clear()
+    with app.test_client() as test_client:
+        yield test_client
+
+
+def log_in(test_client, login: str):
+    """Run the whole login flow, following the redirects through the provider"""
+    response = test_client.get("/login")
+    assert response.status_code == 302
+    # The browser's part: the provider approves and redirects back to the app
+    response = requests.get(
+        response.headers["Location"] + "&login_hint=" + login, allow_redirects=False
+    )
+    assert response.status_code == 302
+    callback = urlsplit(response.headers["Location"])
+    return test_client.get(callback.path + "?" + callback.query)
+
+
+def test_login(test_client, provider):
+    """Testing a login and the page of the logged in user"""
+    assert b"Google Login" in test_client.get("/").data
+    response = log_in(test_client, "ada")
+    assert response.status_code == 302
+    page = test_client.get("/").data
+    assert b"Hello, Ada!" in page
+    assert b"ada@example.com" in page
+    test_client.get("/logout")
+    assert b"Google Login" in test_client.get("/").data
+    # The profile comes from the verified ID token, not from the userinfo endpoint
+    assert provider.requests["/token"] == 1
+    assert provider.requests["/userinfo"] == 0
+
+
+def test_discovery_cached(test_client, provider):
+    """Testing that the discovery document is fetched once for many logins"""
+    fetches = provider_configs.fetches
+    for login in ["ada", "grace", "ada"]:
+        assert log_in(test_client, login).status_code == 302
+        test_client.get("/logout")
+    assert provider.requests["/.well-known/openid-configuration"] == 1
+    assert provider.requests["/jwks"] == 1
+    assert provider_configs.fetches == fetches + 1
+
+
+def test_key_rotation(test_client, provider):
+    """Testing that a token signed with a new key triggers a refresh of the keys"""
+    assert log_in(test_client, "ada").status_code == 302
+    test_client.get("/logout")
+    provider.rotate_key()
+    provider_keys.min_refresh = 0
+    try:
+        assert log_in(test_client, "ada").status_code == 302
+    finally:
+        provider_keys.min_refresh = MIN_REFRESH
+    assert provider.requests["/jwks"] == 2
+    assert b"Hello, Ada!" in test_client.get("/").data
+
+
+def test_optional_claims(test_client, provider, monkeypatch):
+    """Testing a login whose ID token has no picture or given name"""
+
+    def claims_for(login):
+        claims = provider.__class__.claims_for(login)
+        del claims["picture"], claims["given_name"]
+        return claims
+
+    monkeypatch.setattr(provider, "claims_for", claims_for)
+    assert log_in(test_client, "grace").status_code == 302
+    page = test_client.get("/").data
+    assert b"Hello, Grace!" in page
+    assert b'<img src=""' in page
+
+
+def test_keys_unreachable(test_client, provider, monkeypatch):
+    """Testing that a failed refresh of the provider's keys is a gateway error"""
+    assert log_in(test_client, "ada").status_code == 302
+    test_client.get("/logout")
+    provider.rotate_key()
+
+    def unreachable(url, refresh=False):
+        raise requests.ConnectionError(url)
+
+    monkeypatch.setattr(provider_keys, "get", unreachable)
+    assert log_in(test_client, "ada").status_code == 502
+    assert b"Google Login" in test_client.get("/").data
+
+
+def test_bad_code(test_client):
+    """Testing a callback with a code the provider did not issue"""
+    test_client.get("/login")
+    assert test_client.get("/login/callback?code=forged").status_code == 400
+    assert b"Google Login" in test_client.get("/").data
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_app.py"])
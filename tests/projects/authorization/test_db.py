@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+"""
+Testing the pooled SQLite connections
+"""
+
+import sqlite3
+import threading
+import pytest
+from src.projects.authorization import db
+from src.projects.authorization.app import app
+from src.projects.authorization.user import User
+
+
+@pytest.fixture(name="database")
+def fixture_database(tmp_path, monkeypatch):
+    """Path of an empty database the app is configured with"""
+    path = str(tmp_path / "sqlite_db")
+    monkeypatch.setitem(app.config, "DATABASE", path)
+    with app.app_context():
+        db.init_db()
+    yield path
+    db.get_pool(path).close()
+
+
+def test_tables_on_first_request(tmp_path, monkeypatch):
+    """Testing that the tables are created by the first request, not at import"""
+    path = str(tmp_path / "sqlite_db")
+    monkeypatch.setitem(app.config, "DATABASE", path)
+    with app.test_client() as test_client:
+        assert test_client.get("/").status_code == 200
+        with app.app_context():
+            assert User.get("1") is None
+    assert path in db._initialized
+    db.get_pool(path).close()
+
+
+def test_pragmas(database):
+    """Testing WAL journaling and the busy timeout"""
+    with app.app_context():
+        connection = db.get_db()
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert connection.execute("PRAGMA busy_timeout").fetchone()[0] == db.BUSY_TIMEOUT_MS
+
+
+def test_pool_reuse(database):
+    """Testing that requests reuse idle connections instead of opening new ones"""
+    pool = db.get_pool(database)
+    connections = set()
+    for _ in range(5):
+        with app.app_context():
+            connections.add(id(db.get_db()))
+    assert len(connections) == 1
+    with app.app_context():
+        outer = db.get_db()
+        with app.app_context():
+            # A nested context is another request, it must not share the connection
+            assert db.get_db() is not outer
+    assert pool.opened == 2
+
+
+def test_pool_bounded():
+    """Testing that idle connections beyond the pool size are closed"""
+    pool = db.ConnectionPool(":memory:", size=1)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    with pytest.raises(sqlite3.ProgrammingError):
+        second.execute("SELECT 1")
+    assert pool.acquire() is first
+
+
+def test_transaction_rollback(database):
+    """Testing that a failed write leaves nothing behind"""
+    with app.app_context():
+        with pytest.raises(sqlite3.IntegrityError):
+            with db.transaction() as connection:
+                connection.execute("INSERT INTO user VALUES ('1', 'Ada', 'ada@example.com', 'a')")
+                connection.execute("INSERT INTO user VALUES ('2', 'Bob', 'ada@example.com', 'b')")
+        assert not db.get_db().in_transaction
+        assert db.get_db().execute("SELECT COUNT(*) FROM user").fetchone()[0] == 0
+
+
+def test_upsert(database):
+    """Testing that creating an existing user updates it"""
+    with app.app_context():
+        User.create("1", "Ada", "ada@example.com", "ada.png")
+        User.create("1", "Ada L.", "ada@example.com", "ada2.png")
+        rows = db.get_db().execute("SELECT name, profile_pic FROM user").fetchall()
+        assert [tuple(row) for row in rows] == [("Ada L.", "ada2.png")]
+
+
+def test_concurrent_logins(database):
+    """Testing concurrent upserts from many threads without lock errors"""
+    errors = []
+
+    def login(index):
+        try:
+            for repeat in range(20):
+                with app.app_context():
+                    User.create(str(index), f"User {repeat}", f"{index}@example.com", "p")
+                    User.get(str(index))
+        except sqlite3.Error as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=login, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    with app.app_context():
+        assert db.get_db().execute("SELECT COUNT(*) FROM user").fetchone()[0] == 8
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_db.py"])
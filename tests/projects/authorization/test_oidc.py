@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+"""
+Testing the provider configuration cache
+"""
+
+import json
+import time
+import pytest
+from src.projects.authorization.oidc import DiscoveryCache, JWKSCache, cache_lifetime, new_session
+from src.projects.authorization.oidc import b64url_decode, verify_id_token
+from tests.projects.authorization.stub_idp import StubIdentityProvider, b64url_encode
+
+
+@pytest.fixture(name="provider", scope="module")
+def fixture_provider():
+    """Running stub identity provider"""
+    with StubIdentityProvider() as provider:
+        yield provider
+
+
+@pytest.fixture(name="provider_cfg")
+def fixture_provider_cfg(provider):
+    """Discovery document of the stub provider"""
+    return DiscoveryCache(new_session()).get(provider.discovery_url)
+
+
+@pytest.mark.parametrize(
+    "headers, lifetime",
+    [
+        ({}, 300),
+        ({"Cache-Control": "public, max-age=3600"}, 3600),
+        ({"Cache-Control": "max-age=3600", "Age": "600"}, 3000),
+        ({"Cache-Control": "max-age=60", "Age": "600"}, 0),
+        ({"Cache-Control": "max-age=60, s-maxage=120"}, 120),
+        ({"Cache-Control": "no-cache"}, 0),
+        ({"Cache-Control": "private, no-store"}, 0),
+        ({"Cache-Control": "max-age=soon"}, 300),
+    ],
+)
+def test_cache_lifetime(headers, lifetime):
+    """Testing Cache-Control parsing"""
+    assert cache_lifetime(headers, 300) == lifetime
+
+
+@pytest.mark.parametrize("cache_control, fetches", [("max-age=60", 2), ("no-store", 4), ("", 2)])
+def test_discovery_cache(cache_control, fetches):
+    """Testing that documents are fetched again only once they expire"""
+    now = [0.0]
+    with StubIdentityProvider(cache_control=cache_control) as provider:
+        cache = DiscoveryCache(new_session(), default_ttl=30, clock=lambda: now[0])
+        for time in [0, 10, 59, 61]:
+            now[0] = time
+            config = cache.get(provider.discovery_url)
+            assert config["token_endpoint"] == provider.url + "/token"
+        assert cache.fetches == provider.requests["/.well-known/openid-configuration"] == fetches
+
+
+def test_verify_id_token(provider, provider_cfg):
+    """Testing a valid ID token, with either form of the issuer"""
+    keys = JWKSCache(new_session())
+    token = provider.id_token(provider.claims_for("ada"))
+    claims = verify_id_token(token, keys, provider_cfg, provider.client_id)
+    assert (claims["sub"], claims["email_verified"]) == ("stub-ada", True)
+    claims["iss"] = claims["iss"].split("://")[1]
+    claims["aud"] = ["another-client", provider.client_id]
+    assert verify_id_token(provider.sign(claims), keys, provider_cfg, provider.client_id)
+    assert keys.fetches == 1
+
+
+def tamper_payload(token: str) -> str:
+    """Change the subject without signing again"""
+    header, payload, signature = token.split(".")
+    claims = json.loads(b64url_decode(payload))
+    claims["sub"] = "stub-mallory"
+    return ".".join([header, b64url_encode(json.dumps(claims).encode()), signature])
+
+
+def unsigned(token: str) -> str:
+    """Same claims with alg none"""
+    _, payload, _ = token.split(".")
+    return b64url_encode(json.dumps({"alg": "none"}).encode()) + "." + payload + "."
+
+
+@pytest.mark.parametrize(
+    "forge",
+    [
+        tamper_payload,
+        unsigned,
+        lambda token: token[:-4] + "AAAA",
+        lambda token: "not a token",
+        lambda token: token.replace(".", "", 1),
+    ],
+)
+def test_verify_id_token_forged(provider, provider_cfg, forge):
+    """Testing forged and malformed ID tokens"""
+    token = provider.id_token(provider.claims_for("ada"))
+    with pytest.raises(ValueError):
+        verify_id_token(forge(token), JWKSCache(new_session()), provider_cfg, provider.client_id)
+
+
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"aud": "another-client"},
+        {"aud": ["another-client"]},
+        {"iss": "https://accounts.example.com"},
+        {"exp": time.time() - 3600},
+        {"exp": None},
+    ],
+)
+def test_verify_id_token_claims(provider, provider_cfg, claims):
+    """Testing ID tokens that are for another client, from another issuer, or expired"""
+    token = provider.id_token(provider.claims_for("ada"))
+    valid = verify_id_token(token, JWKSCache(new_session()), provider_cfg, provider.client_id)
+    token = provider.sign(dict(valid, **claims))
+    with pytest.raises(ValueError):
+        verify_id_token(token, JWKSCache(new_session()), provider_cfg, provider.client_id)
+
+
+def test_jwks_refresh():
+    """Testing that unknown key IDs refresh the keys, but not more than once per interval"""
+    now = [0.0]
+    with StubIdentityProvider() as provider:
+        jwks_uri = provider.url + "/jwks"
+        keys = JWKSCache(new_session(), clock=lambda: now[0], min_refresh=5)
+        old = keys.key(jwks_uri, provider.kid)
+        provider.rotate_key()
+        # Fetched just now, so the new key is not looked for yet
+        with pytest.raises(ValueError):
+            keys.key(jwks_uri, provider.kid)
+        now[0] = 5
+        assert keys.key(jwks_uri, provider.kid) is not old
+        with pytest.raises(ValueError):
+            keys.key(jwks_uri, "unknown")
+        assert keys.fetches == provider.requests["/jwks"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_oidc.py"])
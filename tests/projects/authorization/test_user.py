@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+"""
+Testing the user store and its cache
+"""
+
+import pytest
+from src.projects.authorization import db, user
+from src.projects.authorization.app import app
+from src.projects.authorization.user import User, UserCache
+
+
+@pytest.fixture(name="app_context")
+def fixture_app_context(tmp_path, monkeypatch):
+    """App context with an empty database and an empty user cache"""
+    monkeypatch.setitem(app.config, "DATABASE", str(tmp_path / "sqlite_db"))
+    monkeypatch.setattr(user, "cache", UserCache())
+    with app.app_context():
+        db.init_db()
+        yield
+
+
+def test_user_interface():
+    """Testing the attributes Flask-Login relies on"""
+    ada = User("1", "Ada", "ada@example.com", "ada.png")
+    assert ada.is_authenticated and ada.is_active and not ada.is_anonymous
+    assert ada.get_id() == "1"
+    assert ada == User("1", "Ada L.", "ada@example.com", "ada.png")
+    assert not hasattr(ada, "__dict__")
+
+
+def test_cache_lru_ttl():
+    """Testing eviction of least recently used and expired entries"""
+    now = [0.0]
+    cache = UserCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    now[0] = 10
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_get_cached(app_context):
+    """Testing that repeated lookups skip the database"""
+    assert User.get("1") is None
+    User.create("1", "Ada", "ada@example.com", "ada.png")
+    first = User.get("1")
+    assert first.name == "Ada"
+    db.get_db().execute("UPDATE user SET name = 'Changed' WHERE id = '1'")
+    assert User.get("1") is first
+    assert user.cache.hits == 1
+
+
+def test_cached_equals_fresh(app_context):
+    """Testing that a cached user and one read from the database are equal and hash alike"""
+    User.create("1", "Ada", "ada@example.com", "ada.png")
+    cached = User.get("1")
+    user.cache.clear()
+    fresh = User.get("1")
+    assert fresh is not cached
+    assert fresh == cached and hash(fresh) == hash(cached)
+    assert len({cached, fresh}) == 1
+
+
+def test_create_invalidates(app_context):
+    """Testing that a created user is not shadowed by a stale entry"""
+    User.create("1", "Ada", "ada@example.com", "ada.png")
+    assert User.get("1").name == "Ada"
+    db.get_db().execute("DELETE FROM user")
+    User.create("1", "Grace", "grace@example.com", "grace.png")
+    assert User.get("1").name == "Grace"
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_user.py"])
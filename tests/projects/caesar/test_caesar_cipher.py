@@ -33,5 +33,27 @@ def test_decrypt():
     assert cc.decrypt("KHOOR ZRUOG!", 3) == "hello world!"
 
 
+def test_chunks():
+    """Testing that the byte tables agree with the string functions"""
+    text = "Hello, World! (Ready?)\r\n"
+    for shift in (0, 3, 25, 29, -1):
+        cipher = cc.encrypt_chunk(text.encode("ascii"), shift)
+        assert cipher.decode("ascii") == cc.encrypt(text, shift)
+        assert cc.decrypt_chunk(cipher, shift).decode("ascii") == cc.decrypt(cipher.decode(), shift)
+    assert cc.encrypt_chunk("ça va".encode("utf-8"), 3, True) == "çDYD".encode("utf-8")
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_decrypt_shifts(use_numpy):
+    """Testing that every shift is decoded, with and without NumPy"""
+    if use_numpy:
+        pytest.importorskip("numpy")
+    sample = cc.encrypt_chunk(b"Attack at dawn!", 7)
+    candidates = cc.decrypt_shifts(sample, use_numpy)
+    assert len(candidates) == 26
+    assert candidates[7] == b"attack at dawn!"
+    assert candidates == [cc.decrypt_chunk(sample, shift) for shift in range(26)]
+
+
 if __name__ == "__main__":
     pytest.main(["-v", "test_caesar_cipher.py"])
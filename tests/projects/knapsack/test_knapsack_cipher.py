@@ -132,5 +132,42 @@ def test_decrypt_word():
     assert knapsack.decrypt([10937952106318749431957], sik, n, m) == "octoduck"
 
 
+@pytest.mark.parametrize(
+    "plaintext", ["octoducks and infosec", "a\x00b" * 5, "\x00" * 9 + "end", "x" * 16]
+)
+def test_round_trip_blocks(plaintext):
+    """Testing messages of several blocks, including NULs that are not at the end"""
+    sik = knapsack.generate_sik(32)
+    n = knapsack.calculate_n(sik)
+    m = knapsack.calculate_m(sik, n)
+    ciphertext = knapsack.encrypt(plaintext, knapsack.generate_gk(sik, n, m))
+    assert len(ciphertext) == -(-len(plaintext) // 4)
+    assert knapsack.decrypt(ciphertext, sik, n, m) == plaintext
+
+
+@pytest.mark.parametrize("plaintext", ["abcd\x00", "abcd\x00\x00\x00\x00", "ab\x00"])
+def test_trailing_nul(plaintext):
+    """Testing the documented limitation: trailing NULs are taken for padding"""
+    sik = knapsack.generate_sik(32)
+    n = knapsack.calculate_n(sik)
+    m = knapsack.calculate_m(sik, n)
+    ciphertext = knapsack.encrypt(plaintext, knapsack.generate_gk(sik, n, m))
+    assert knapsack.decrypt(ciphertext, sik, n, m) == plaintext.rstrip("\x00")
+
+
+def test_round_trip_file(tmp_path):
+    """Testing files whose blocks are split across chunks"""
+    sik = knapsack.generate_sik(64)
+    n = knapsack.calculate_n(sik)
+    m = knapsack.calculate_m(sik, n)
+    data = bytes(range(256)) * 3 + b"tail"
+    (tmp_path / "plain").write_bytes(data)
+    knapsack.encrypt_file(
+        tmp_path / "plain", tmp_path / "cipher", knapsack.generate_gk(sik, n, m), chunk_size=13
+    )
+    knapsack.decrypt_file(tmp_path / "cipher", tmp_path / "out", sik, n, m, chunk_size=7)
+    assert (tmp_path / "out").read_bytes() == data
+
+
 if __name__ == "__main__":
     pytest.main(["-v", "test_knapsack_cipher.py"])
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""
+Testing the password cracker
+"""
+
+import json
+import pytest
+from src.projects.passwords import cracker
+
+
+SHADOW = "data/projects/passwords/shadow"
+SAM = "data/projects/passwords/sam"
+needs_crypt = pytest.mark.skipif(cracker.crypt is None, reason="crypt was removed in Python 3.13")
+
+
+@pytest.mark.parametrize(
+    "filename, hash_type, count",
+    [
+        pytest.param("data/projects/passwords/passwd", "md5crypt", 15, marks=needs_crypt),
+        pytest.param(SHADOW, "sha512crypt", 20, marks=needs_crypt),
+        (SAM, "ntlm", 15),
+    ],
+)
+def test_load_hashes(filename, hash_type, count):
+    """Testing hash file parsing"""
+    hashes = cracker.load_hashes(filename)
+    assert len(hashes) == count
+    assert all(entry[1] == hash_type for entry in hashes)
+
+
+@pytest.mark.parametrize(
+    "password, nt_hash",
+    [
+        ("password", "8846f7eaee8fb117ad06bdd830b7586c"),
+        ("", "31d6cfe0d16ae931b73c59d7e0c089c0"),
+    ],
+)
+def test_hash_ntlm(password, nt_hash):
+    """Testing NT hash computation"""
+    assert cracker.hash_ntlm(password) == nt_hash
+
+
+def test_check_candidates_ntlm():
+    """Testing unsalted candidates against several users"""
+    targets = [("alice", cracker.hash_ntlm("duck")), ("bob", cracker.hash_ntlm("duck"))]
+    found = cracker.check_candidates("ntlm", targets, ["goose", "duck"])
+    assert sorted(found) == [("alice", "duck"), ("bob", "duck")]
+
+
+@needs_crypt
+def test_crack_shadow():
+    """Testing a wordlist attack with statistics"""
+    hashes = [entry for entry in cracker.load_hashes(SHADOW) if entry[0] == "hopeva63"]
+    stats = cracker.CrackStats()
+    cracked = cracker.crack(
+        hashes, ["octoduck", "infosec", "whirligigs"], workers=1, chunk_size=2, stats=stats
+    )
+    assert cracked == {"hopeva63": "whirligigs"}
+    summary = stats.as_dict()
+    assert summary["types"]["sha512crypt"]["candidates"] == 3
+    assert summary["types"]["sha512crypt"]["cracked"] == 1
+    assert summary["first_crack"] is not None
+    assert summary["queue"]["max"] >= 1
+    assert summary["queue"]["current"] == 0
+    assert sum(worker["candidates"] for worker in summary["workers"].values()) == 3
+
+
+def test_no_targets():
+    """Testing that a run without supported hashes does not walk the candidates"""
+
+    def endless():
+        while True:
+            yield "password"
+
+    assert cracker.crack([], endless(), workers=1) == {}
+    assert cracker.crack_mask([], cracker.Mask("?a" * 20), workers=1) == {}
+
+
+def test_stats_export(tmp_path):
+    """Testing JSON export and the status line"""
+    stats = cracker.CrackStats()
+    stats.record_chunk("ntlm", "worker-1", 100, 100, 0.5)
+    stats.record_crack("ntlm")
+    filename = tmp_path / "stats.json"
+    stats.export(str(filename))
+    summary = json.loads(filename.read_text())
+    assert summary["workers"]["worker-1"]["rate"] == 200
+    assert summary["types"]["ntlm"]["cracked"] == 1
+    assert "ntlm" in stats.status_line()
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_cracker.py"])
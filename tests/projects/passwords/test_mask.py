@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# encoding: UTF-8
+"""
+Testing the mask attack generator
+"""
+
+import pickle
+import sys
+import pytest
+from src.projects.passwords import cracker
+from src.projects.passwords.mask import Mask, incremental
+
+
+@pytest.mark.parametrize(
+    "pattern, keyspace",
+    [("?l", 26), ("?l?l?d?d", 26 * 26 * 10 * 10), ("ab?d", 10), ("???d", 10), ("?a", 95)],
+)
+def test_keyspace(pattern, keyspace):
+    """Testing keyspace size"""
+    assert len(Mask(pattern)) == keyspace
+
+
+@pytest.mark.parametrize("pattern", ["?x", "?l?", "?1"])
+def test_bad_mask(pattern):
+    """Testing invalid masks"""
+    with pytest.raises(ValueError):
+        Mask(pattern)
+
+
+def test_candidate_and_index():
+    """Testing random access in both directions"""
+    mask = Mask("?l?l?d?d")
+    assert mask.candidate(0) == "aa00"
+    assert mask.candidate(1) == "aa01"
+    assert mask.candidate(100) == "ab00"
+    assert mask.candidate(-1) == "zz99"
+    for index in (0, 1, 99, 100, 4321, len(mask) - 1):
+        assert mask.index(mask.candidate(index)) == index
+    with pytest.raises(IndexError):
+        mask.candidate(len(mask))
+    with pytest.raises(ValueError):
+        mask.index("a000")
+
+
+def test_iter_range():
+    """Testing incremental generation against random access"""
+    mask = Mask("?1?d", {"1": "xyz"})
+    assert list(mask) == [mask.candidate(i) for i in range(len(mask))]
+    assert list(mask.iter_range(8, 12)) == ["x8", "x9", "y0", "y1"]
+    assert list(mask.iter_range(28, 100)) == ["z8", "z9"]
+
+
+def test_duplicate_custom_chars():
+    """Testing that repeated characters of a custom charset are kept once"""
+    mask = Mask("?1?1", {"1": "abca"})
+    assert mask.custom == {"1": "abc"}
+    assert len(mask) == 9
+    assert all(mask.index(mask.candidate(i)) == i for i in range(len(mask)))
+    assert list(mask) == [mask.candidate(i) for i in range(len(mask))]
+
+
+@pytest.mark.parametrize("parts", [0, -1])
+def test_partition_no_parts(parts):
+    """Testing that the keyspace cannot be split into no parts"""
+    with pytest.raises(ValueError):
+        Mask("?d").partition(parts)
+
+
+@pytest.mark.parametrize("parts, start", [(1, 0), (3, 0), (4, 10), (7, 5)])
+def test_partition(parts, start):
+    """Testing keyspace partitioning"""
+    mask = Mask("?d?d")
+    ranges = mask.partition(parts, start)
+    assert len(ranges) == parts
+    assert ranges[0][0] == start
+    assert ranges[-1][1] == len(mask)
+    for (_, stop), (next_start, _) in zip(ranges, ranges[1:]):
+        assert stop == next_start
+    sizes = [stop - begin for begin, stop in ranges]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_mask_range_pickle():
+    """Testing that ranges can be shipped to workers"""
+    chunk = Mask("?l?d").range(15, 25)
+    clone = pickle.loads(pickle.dumps(chunk))
+    assert len(clone) == 10
+    assert list(clone) == list(chunk)
+
+
+def test_incremental():
+    """Testing masks for shorter candidates"""
+    masks = incremental("?1?1?1", {"1": "ab"})
+    assert [len(mask) for mask in masks] == [2, 4, 8]
+    assert [mask.pattern for mask in incremental("a??b?d", min_length=2)] == [
+        "a??",
+        "a??b",
+        "a??b?d",
+    ]
+
+
+def test_crack_mask():
+    """Testing a mask attack with resumption"""
+    hashes = [("alice", "ntlm", cracker.hash_ntlm("ab12")), ("bob", "ntlm", cracker.hash_ntlm("aa07"))]
+    mask = Mask("?l?l?d?d")
+    stats = cracker.CrackStats()
+    cracked = cracker.crack_mask(hashes, mask, workers=2, chunk_size=500, stats=stats)
+    assert cracked == {"alice": "ab12", "bob": "aa07"}
+    assert stats.position == len(mask)
+    start = mask.index("ab00")
+    cracked = cracker.crack_mask(hashes, mask, start=start, workers=1, chunk_size=500)
+    assert cracked == {"alice": "ab12"}
+
+
+def test_huge_keyspace():
+    """Testing a keyspace larger than sys.maxsize"""
+    mask = Mask("?a" * 10)
+    assert mask.keyspace > sys.maxsize
+    assert mask.candidate(mask.keyspace - 1) == "~" * 10
+    assert mask.partition(2)[-1][1] == mask.keyspace
+    chunk, offset = next(cracker._mask_chunks(mask, 3, mask.keyspace - 2))
+    assert list(chunk) == ["~" * 9 + "}", "~" * 10]
+    assert offset == mask.keyspace
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_mask.py"])
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+"""
+Testing the command line interface
+"""
+
+import subprocess
+import sys
+import pytest
+from src.projects import cli
+from src.projects.passwords.cracker import hash_ntlm
+
+
+def test_caesar(tmp_path):
+    """Testing encryption, decryption, and analysis of a file"""
+    plain = tmp_path / "plain.txt"
+    plain.write_text("we the people of the united states, in order to form a more perfect union")
+    cipher = str(tmp_path / "cipher.txt")
+    cli.main(["caesar", "encrypt", str(plain), cipher, "--shift", "7"])
+    cli.main(["caesar", "decrypt", cipher, str(tmp_path / "out.txt"), "--shift", "7"])
+    assert (tmp_path / "out.txt").read_text() == plain.read_text()
+    cli.main(["caesar", "analyze", cipher, str(tmp_path / "found.txt")])
+    assert (tmp_path / "found.txt").read_text() == plain.read_text()
+
+
+def test_knapsack(tmp_path):
+    """Testing key generation and a round trip through files"""
+    public, private = str(tmp_path / "key.public"), str(tmp_path / "key.private")
+    cli.main(["knapsack", "keygen", public, private, "--size", "32"])
+    plain = tmp_path / "plain.txt"
+    plain.write_text("Merkle and Hellman, 1978\n")
+    cli.main(["knapsack", "encrypt", str(plain), str(tmp_path / "cipher"), "--key", public])
+    assert len((tmp_path / "cipher").read_text().splitlines()) == 7
+    cli.main(
+        ["knapsack", "decrypt", str(tmp_path / "cipher"), str(tmp_path / "out"), "--key", private]
+    )
+    assert (tmp_path / "out").read_text() == plain.read_text()
+
+
+def test_a51(tmp_path):
+    """Testing that the output goes next to the input by default"""
+    plain = tmp_path / "roster"
+    plain.write_text("alligator\nbobcat\n")
+    cli.main(["a51", "encrypt", str(plain), "--secret", "martin"])
+    lines = (tmp_path / "roster.secret").read_text().splitlines()
+    assert len(lines) == 2 and all(line.startswith("0x") for line in lines)
+
+
+def test_crack_mask(tmp_path, capsys):
+    """Testing a mask attack with a custom charset"""
+    sam = tmp_path / "sam"
+    sam.write_text(f"alice:1001:aad3b435b51404eeaad3b435b51404ee:{hash_ntlm('xy7')}:::\n")
+    cli.main(["crack", str(sam), "--mask", "?1?1?d", "--custom", "1=xyz", "--workers", "1"])
+    assert "alice:xy7" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "mask, custom, error",
+    [
+        ("?1", "xyz", "expected N=CHARS"),
+        ("?1", "=xyz", "expected N=CHARS"),
+        ("?1", "1=", "expected N=CHARS"),
+        ("?l?x", "1=xyz", "Unknown charset ?x"),
+        ("?d?", "1=xyz", "Dangling ?"),
+        ("?1?2", "1=xyz", "Unknown charset ?2"),
+    ],
+)
+def test_bad_custom_charset(mask, custom, error, capsys):
+    """Testing that a malformed mask or custom charset is a usage error"""
+    with pytest.raises(SystemExit) as exc_info:
+        cli.main(["crack", "sam", "--mask", mask, "--custom", custom])
+    assert exc_info.value.code == 2
+    assert error in capsys.readouterr().err
+
+
+def test_unknown_arguments():
+    """Testing that only the VPN endpoints accept arguments the parser does not know"""
+    with pytest.raises(SystemExit):
+        cli.main(["caesar", "decrypt", "in", "out", "--shift", "1", "--verbose"])
+
+
+@pytest.mark.parametrize(
+    "module",
+    ["src.projects.cli", "src.projects.vpn.client", "src.projects.vpn.server"],
+)
+def test_lazy_imports(module):
+    """Testing that the crypto libraries are not imported until they are needed"""
+    heavy = ["Crypto", "diffiehellman", "cryptography"]
+    code = f"import sys, {module}; print([name for name in {heavy} if name in sys.modules])"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_cli.py"])
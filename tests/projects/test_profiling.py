@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+"""
+Testing the profiling hooks
+"""
+
+import asyncio
+import pytest
+from src.projects import profiling
+from src.projects.profiling import Profiler
+
+
+class FakeClock:
+    """Clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def test_nested_calls():
+    """Testing call counts, cumulative and self time, and collapsed stacks"""
+    clock = FakeClock()
+    profiler = Profiler(clock)
+
+    def inner():
+        clock.advance(2)
+
+    inner = profiler.wrap(inner, "inner")
+
+    @profiler.wrap
+    def outer():
+        clock.advance(1)
+        inner()
+        with profiler.section("block"):
+            clock.advance(3)
+            inner()
+
+    outer()
+    outer()
+    name = profiling.default_name(outer)
+    assert name.endswith("test_profiling.test_nested_calls.<locals>.outer")
+    stats = profiler.stats()
+    assert stats[name] == {"calls": 2, "cumulative": 16.0, "self": 2.0}
+    assert stats["inner"] == {"calls": 4, "cumulative": 8.0, "self": 8.0}
+    assert stats["block"] == {"calls": 2, "cumulative": 10.0, "self": 6.0}
+    assert profiler.collapsed() == [
+        f"{name} 2000000",
+        f"{name};block 6000000",
+        f"{name};block;inner 4000000",
+        f"{name};inner 4000000",
+    ]
+
+
+def test_recursion():
+    """Testing that recursive calls are counted but not timed twice"""
+    clock = FakeClock()
+    profiler = Profiler(clock)
+
+    @profiler.wrap
+    def countdown(n):
+        clock.advance(1)
+        if n:
+            countdown(n - 1)
+
+    countdown(2)
+    stats = profiler.stats()[profiling.default_name(countdown)]
+    assert stats == {"calls": 3, "cumulative": 3.0, "self": 3.0}
+
+
+def test_exception():
+    """Testing that a call that raises is still timed and the stack unwound"""
+    clock = FakeClock()
+    profiler = Profiler(clock)
+    with pytest.raises(ValueError):
+        with profiler.section("failing"):
+            clock.advance(1)
+            raise ValueError
+    with profiler.section("next"):
+        clock.advance(1)
+    assert profiler.collapsed() == ["failing 1000000", "next 1000000"]
+
+
+def test_concurrent_tasks():
+    """Testing that interleaved asyncio tasks keep their own stacks"""
+    profiler = Profiler()
+
+    @profiler.wrap
+    async def phase(name):
+        with profiler.section(name):
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(phase("first"), phase("second"))
+
+    asyncio.run(main())
+    name = profiling.default_name(phase)
+    paths = [line.rsplit(" ", 1)[0] for line in profiler.collapsed()]
+    assert paths == [name, f"{name};first", f"{name};second"]
+    assert profiler.stats()[name]["calls"] == 2
+
+
+def test_disabled(monkeypatch):
+    """Testing that the hooks do nothing without the environment variable"""
+    monkeypatch.setattr(profiling, "profiler", None)
+
+    def func():
+        return 1
+
+    assert profiling.profiled(func) is func
+    assert profiling.profiled(name="named")(func) is func
+    with profiling.section("anything"):
+        pass
+
+
+def test_enabled(monkeypatch, tmp_path):
+    """Testing the process-wide profiler and the collapsed stack file"""
+    profiler = Profiler()
+    monkeypatch.setattr(profiling, "profiler", profiler)
+
+    @profiling.profiled(name="work")
+    def work():
+        with profiling.section("part"):
+            return 1
+
+    assert work() == 1
+    path = tmp_path / "profile.folded"
+    profiler.dump(str(path))
+    lines = path.read_text().splitlines()
+    assert [line.rsplit(" ", 1)[0] for line in lines] == ["work", "work;part"]
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert "work" in profiler.report()
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_profiling.py"])
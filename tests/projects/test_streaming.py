@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+"""
+Testing the streaming pipeline and the cipher stages
+"""
+
+import os
+from hashlib import sha256
+import pytest
+from src.projects import streaming
+from src.projects.a51 import a51_cipher
+from src.projects.caesar import caesar_cipher
+from src.projects.knapsack import knapsack_cipher
+
+DATA = b"The quick brown fox\njumps over\r\nthe lazy dog\n" * 50 + os.urandom(300)
+
+
+def chunked(data: bytes, size: int) -> list:
+    """Split data into chunks of `size` bytes"""
+    return [data[start : start + size] for start in range(0, len(data), size)]
+
+
+def run(data: bytes, size: int, *stages) -> bytes:
+    """Output of the stages for data fed `size` bytes at a time"""
+    return b"".join(streaming.pipeline(chunked(data, size), *stages))
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 4096])
+def test_chunk_size_independence(size):
+    """Testing that every stage gives the same output whatever the chunk size"""
+    stages = (streaming.compress(), a51_cipher.stream("martin"), streaming.hex_encode)
+    assert run(DATA, size, *stages) == run(DATA, len(DATA), *stages)
+
+
+@pytest.mark.parametrize("size", [1, 5, 4096])
+def test_round_trip(size):
+    """Testing compression, encryption, and hex encoding undone in reverse"""
+    stages = (streaming.compress(), a51_cipher.stream("martin"), streaming.hex_encode)
+    encoded = run(DATA, size, *stages)
+    decoded = run(
+        encoded,
+        size,
+        streaming.hex_decode,
+        a51_cipher.stream("martin"),
+        streaming.decompress(chunk_size=16),
+    )
+    assert decoded == DATA
+
+
+def test_a51_file(tmp_path):
+    """Testing that the streamed A5/1 file is byte for byte the committed roster.secret"""
+    secret = tmp_path / "roster.secret"
+    a51_cipher.encrypt_file("data/projects/a51/roster", "martin", str(secret))
+    assert (
+        sha256(secret.read_bytes()).hexdigest()
+        == "c6cffc32f7c20ecbbfd633796696359e05abcf09f1c8e96508162dd6f738752d"
+    )
+
+
+def test_decompress_bounded():
+    """Testing that a highly compressible stream comes out in bounded chunks"""
+    compressed = run(bytes(100000), 100000, streaming.compress())
+    chunks = list(streaming.pipeline([compressed], streaming.decompress(chunk_size=1000)))
+    assert max(map(len, chunks)) <= 1000
+    assert b"".join(chunks) == bytes(100000)
+
+
+def test_hex_decode():
+    """Testing whitespace, a byte split across chunks, and odd digits"""
+    assert run(b"0a 1b\n2c", 1, streaming.hex_decode) == b"\x0a\x1b\x2c"
+    with pytest.raises(ValueError):
+        run(b"0a1", 2, streaming.hex_decode)
+
+
+def test_lines():
+    """Testing that lines are regrouped whatever the chunks"""
+    lines = list(streaming.pipeline(chunked(b"ab\ncd\n\nef", 2), streaming.lines))
+    assert lines == [b"ab\n", b"cd\n", b"\n", b"ef"]
+
+
+def test_read_file(tmp_path):
+    """Testing that reading and writing a file in small chunks keeps it intact"""
+    path = tmp_path / "data"
+    path.write_bytes(DATA)
+    copied = streaming.process_file(str(path), str(tmp_path / "copy"), chunk_size=10)
+    assert copied == len(DATA)
+    assert (tmp_path / "copy").read_bytes() == DATA
+
+
+def test_map_file(tmp_path):
+    """Testing the memory-mapped source, an empty file included"""
+    path = tmp_path / "data"
+    path.write_bytes(DATA)
+    assert b"".join(streaming.map_file(str(path), 7)) == DATA
+    path.write_bytes(b"")
+    assert list(streaming.map_file(str(path))) == []
+
+
+def test_caesar_file(tmp_path):
+    """Testing a Caesar round trip keeping line breaks and non-ASCII text"""
+    plain = tmp_path / "plain"
+    plain.write_bytes("we the people\r\nof the united états\n".encode("utf-8"))
+    caesar_cipher.encrypt_file(str(plain), str(tmp_path / "cipher"), 3, chunk_size=4)
+    assert (tmp_path / "cipher").read_bytes().startswith(b"ZH WKH")
+    caesar_cipher.decrypt_file(str(tmp_path / "cipher"), str(tmp_path / "out"), 3, chunk_size=4)
+    assert (tmp_path / "out").read_bytes() == plain.read_bytes()
+
+
+@pytest.mark.parametrize("data", [b"Merkle and Hellman", b"padded\x00\x00 inside\x00", DATA[:200]])
+def test_knapsack_file(tmp_path, data):
+    """Testing a knapsack round trip with chunks splitting blocks and numbers"""
+    sik = knapsack_cipher.generate_sik(32)
+    n = knapsack_cipher.calculate_n(sik)
+    m = knapsack_cipher.calculate_m(sik, n)
+    gk = knapsack_cipher.generate_gk(sik, n, m)
+    plain = tmp_path / "plain"
+    plain.write_bytes(data)
+    knapsack_cipher.encrypt_file(str(plain), str(tmp_path / "cipher"), gk, chunk_size=3)
+    ciphertext = [int(line) for line in (tmp_path / "cipher").read_text().splitlines()]
+    assert ciphertext == knapsack_cipher.encrypt(data.decode("latin-1"), gk)
+    knapsack_cipher.decrypt_file(str(tmp_path / "cipher"), str(tmp_path / "out"), sik, n, m, 5)
+    assert (tmp_path / "out").read_bytes() == data.rstrip(b"\x00")
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_streaming.py"])
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+"""
+Testing the pool of pre-generated DHM key pairs
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.projects.vpn import dhpool
+from src.projects.vpn.dhpool import DHKeyPool
+
+
+def wait_for(pool, key_size, count, timeout=30):
+    """Wait until the pool has `count` key pairs ready"""
+    deadline = time.monotonic() + timeout
+    while pool.available(key_size) < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_watermarks():
+    """Testing that the pool refills to the high watermark"""
+    pool = DHKeyPool([256], low=2, high=4)
+    wait_for(pool, 256, 4)
+    keypairs = [pool.take(256) for _ in range(3)]
+    assert all(keypair.public_key for keypair in keypairs)
+    assert len({keypair.public_key for keypair in keypairs}) == 3
+    # Dropping to 1 ready key pair triggered a refill back to 4
+    wait_for(pool, 256, 4)
+    assert (pool.hits, pool.misses) == (3, 0)
+    pool.close()
+
+
+def test_miss():
+    """Testing an empty pool"""
+    with ThreadPoolExecutor(2) as executor:
+        pool = DHKeyPool([128, 256], low=0, high=0, executor=executor)
+        assert pool.take(128) is None
+        assert pool.misses == 1
+        assert pool.get(256).public_key
+        assert pool.get(512).public_key
+        pool.close()
+
+
+def test_shared_secret():
+    """Testing that pooled key pairs complete a key exchange"""
+    pool = DHKeyPool([256], low=1, high=2)
+    server = pool.get(256)
+    client = pool.get(256)
+    server.generate_shared_secret(client.public_key)
+    client.generate_shared_secret(server.public_key)
+    assert server.shared_key == client.shared_key
+    pool.close()
+
+
+def test_close_cancels(monkeypatch):
+    """Testing that closing cancels the queued generations, without Python 3.9's cancel_futures"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_keypair(key_size):
+        started.set()
+        release.wait(10)
+        return None
+
+    monkeypatch.setattr(dhpool, "generate_dh_keypair", slow_keypair)
+    pool = DHKeyPool([256], low=1, high=4)
+    assert started.wait(10)
+    futures = list(pool._futures)
+    pool.close()
+    release.set()
+    # Only the generation already running is left to finish
+    assert sum(future.cancelled() for future in futures) == 3
+
+
+def test_bad_watermarks():
+    """Testing watermark validation"""
+    with pytest.raises(ValueError):
+        DHKeyPool([256], low=4, high=2)
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_dhpool.py"])
@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+"""
+Testing the VPN framing layer
+"""
+
+import asyncio
+import socket
+import threading
+import pytest
+from src.projects.vpn import framing
+
+
+@pytest.fixture
+def pair():
+    """Connected pair of sockets"""
+    left, right = socket.socketpair()
+    yield left, right
+    left.close()
+    right.close()
+
+
+def test_round_trip(pair):
+    """Testing a few frames coalesced into a single read"""
+    left, right = pair
+    framing.send_frame(left, framing.PROPOSAL, b"ProposedCiphers:AES:[256]")
+    framing.send_frame(left, framing.DATA, b"")
+    framing.send_frame(left, framing.DATA, bytearray(b"hello"))
+    left.close()
+    reader = framing.FrameReader(right)
+    assert reader.read_frame() == (framing.PROPOSAL, b"ProposedCiphers:AES:[256]")
+    assert reader.read_frame() == (framing.DATA, b"")
+    msg_type, payload = reader.read_frame()
+    assert isinstance(payload, memoryview)
+    assert (msg_type, bytes(payload)) == (framing.DATA, b"hello")
+    assert reader.read_frame() is None
+
+
+def test_fragmented(pair):
+    """Testing a frame that arrives one byte at a time"""
+    left, right = pair
+    data = framing.pack_header(framing.DATA, 3) + b"abc"
+    for i in range(len(data)):
+        left.send(data[i : i + 1])
+    reader = framing.FrameReader(right, size=4)
+    assert reader.read_frame() == (framing.DATA, b"abc")
+
+
+def test_large_payload(pair):
+    """Testing payloads much larger than the socket and frame buffers"""
+    left, right = pair
+    payload = bytes(range(256)) * 4096
+    sender = threading.Thread(
+        target=lambda: [framing.send_frame(left, framing.DATA, payload) for _ in range(3)]
+    )
+    sender.start()
+    reader = framing.FrameReader(right, size=1024)
+    for _ in range(3):
+        assert reader.read_frame() == (framing.DATA, payload)
+    sender.join()
+
+
+def test_truncated(pair):
+    """Testing EOF in the middle of a frame"""
+    left, right = pair
+    left.sendall(framing.pack_header(framing.DATA, 10) + b"abc")
+    left.close()
+    with pytest.raises(ConnectionError):
+        framing.FrameReader(right).read_frame()
+
+
+def test_expect():
+    """Testing frame type checks"""
+    assert framing.expect((framing.DATA, b"x"), framing.DATA) == b"x"
+    with pytest.raises(ValueError) as err:
+        framing.expect((framing.ERROR, b"Could not agree on a cipher"), framing.DATA)
+    assert str(err.value) == "Could not agree on a cipher"
+    with pytest.raises(ValueError):
+        framing.expect((framing.DHMKE, b"x"), framing.DATA)
+    with pytest.raises(ConnectionError):
+        framing.expect(None, framing.DATA)
+
+
+def test_async_round_trip():
+    """Testing the asyncio reader and writer"""
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(framing.pack_header(framing.DATA, 5) + b"hello")
+        reader.feed_data(framing.pack_header(framing.DHMKE, 3))
+        reader.feed_data(b"101")
+        reader.feed_eof()
+        assert await framing.read_frame_async(reader) == (framing.DATA, b"hello")
+        assert await framing.read_frame_async(reader) == (framing.DHMKE, b"101")
+        assert await framing.read_frame_async(reader) is None
+
+    asyncio.run(run())
+
+
+def test_async_max_payload():
+    """Testing that a frame above the caller's limit is refused before its payload arrives"""
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(framing.pack_header(framing.PROPOSAL, framing.MAX_HANDSHAKE_PAYLOAD + 1))
+        with pytest.raises(ValueError):
+            await framing.read_frame_async(reader, framing.MAX_HANDSHAKE_PAYLOAD)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_framing.py"])
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+"""
+Testing the VPN server metrics
+"""
+
+import asyncio
+import threading
+import time
+from functools import partial
+from urllib.request import urlopen
+import pytest
+from Crypto.Cipher import AES
+from src.projects.vpn import client
+from src.projects.vpn.metrics import Histogram, Metrics, start_metrics_server
+from src.projects.vpn.record import GCMRecordLayer, RecordLayer
+from src.projects.vpn.server import handle_client
+
+
+def test_histogram():
+    """Testing bucket counts"""
+    histogram = Histogram([1, 10])
+    for value in [0.5, 1, 2, 10, 11, 100]:
+        histogram.observe(value)
+    assert histogram.counts == [2, 2, 2]
+    assert (histogram.sum, histogram.count) == (124.5, 6)
+
+
+def test_merge_render():
+    """Testing aggregation and the Prometheus text format"""
+    metrics = Metrics()
+    metrics.counters["handshakes"] += 2
+    metrics.observe("connection_messages", 5)
+    other = Metrics()
+    other.counters["handshakes"] += 1
+    other.observe("connection_messages", 50)
+    other.observe("decrypt_seconds", 0.002)
+    metrics.merge(other.snapshot())
+    text = metrics.render()
+    assert "# TYPE vpn_handshakes_total counter\nvpn_handshakes_total 3\n" in text
+    assert 'vpn_connection_messages_bucket{le="10"} 1\n' in text
+    assert 'vpn_connection_messages_bucket{le="+Inf"} 2\n' in text
+    assert "vpn_connection_messages_count 2\n" in text
+    assert 'vpn_decrypt_seconds_bucket{le="0.005"} 1\n' in text
+
+
+def test_record_metrics():
+    """Testing encrypt/decrypt timing and failed records"""
+    metrics = Metrics()
+    key, iv = b"k" * 16, b"i" * 16
+    sealed = bytes(RecordLayer(AES, key, iv, metrics=metrics).seal(b"hello"))
+    receiver = RecordLayer(AES, key, iv, metrics=metrics, initiator=False)
+    with pytest.raises(ValueError):
+        receiver.open(sealed[:-1] + (b"1" if sealed[-1:] == b"0" else b"0"))
+    # A record of the wrong length is malformed, not a failed authentication
+    with pytest.raises(ValueError):
+        receiver.open(sealed[1:])
+    assert bytes(receiver.open(sealed)) == b"hello"
+    assert metrics.histograms["encrypt_seconds"].count == 1
+    assert metrics.histograms["decrypt_seconds"].count == 3
+    assert metrics.counters["hmac_failures"] == 1
+
+
+def test_gcm_record_metrics():
+    """Testing that only a bad tag counts as a failed GCM record"""
+    metrics = Metrics()
+    key, iv = b"k" * 32, b"i" * 16
+    sealed = GCMRecordLayer(key, iv).seal(b"hello")
+    receiver = GCMRecordLayer(key, iv, initiator=False, metrics=metrics)
+    with pytest.raises(ValueError):
+        receiver.open(b"short")
+    with pytest.raises(ValueError):
+        receiver.open(sealed[:-1] + bytes([sealed[-1] ^ 1]))
+    assert receiver.open(sealed) == b"hello"
+    assert metrics.counters["hmac_failures"] == 1
+
+
+def test_server_metrics(monkeypatch):
+    """Testing the metrics of a session, served over HTTP"""
+    metrics = Metrics()
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        asyncio.start_server(
+            partial(handle_client, verbose=False, metrics=metrics), "127.0.0.1", 0
+        )
+    )
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    monkeypatch.setattr(client, "HOST", "127.0.0.1")
+    monkeypatch.setattr(client, "PORT", server.sockets[0].getsockname()[1])
+    http = start_metrics_server(metrics.render, 0)
+    try:
+        sckt, frames, record, _ = client.connect()
+        for message in [b"hello", b"world"]:
+            client.send_frame(sckt, client.DATA, record.seal(message))
+            frames.read_frame()
+        sckt.close()
+        deadline = time.monotonic() + 10
+        while "connection_messages" not in metrics.histograms:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        with urlopen(f"http://127.0.0.1:{http.server_address[1]}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            text = response.read().decode("utf-8")
+    finally:
+        http.shutdown()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        server.close()
+        loop.close()
+    assert "vpn_handshakes_total 1\n" in text
+    for phase in ["negotiation", "dhmke", "cryptosystem_init"]:
+        assert f"vpn_{phase}_seconds_count 1\n" in text
+    assert "vpn_decrypt_seconds_count 2\n" in text
+    assert metrics.counters["messages"] == 2
+    assert metrics.histograms["connection_messages"].count == 1
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_metrics.py"])
@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+"""
+Testing cipher negotiation and the asyncio server
+
+Kept apart from test_server.py, which imports the pycrypto-only XOR cipher.
+"""
+
+
+import asyncio
+from functools import partial
+import time
+import pytest
+from diffiehellman.diffiehellman import DiffieHellman
+from src.projects.vpn.server import parse_proposal
+from src.projects.vpn.server import get_key_and_iv
+from src.projects.vpn.server import handle_client
+from src.projects.vpn.server import CipherNegotiator
+from src.projects.vpn.dhpool import DHKeyPool
+from src.projects.vpn.record import RecordLayer
+from src.projects.vpn.framing import PROPOSAL, CHOSEN_CIPHER, DHMKE, DATA, TICKET
+from src.projects.vpn.framing import expect, read_frame_async, write_frame
+
+
+@pytest.mark.parametrize(
+    "proposal",
+    [
+        "ProposedCiphers:AES:[128",
+        "ProposedCiphers:AES",
+        "Proposed:AES:[128]",
+        "ProposedCiphers:AES:[x]",
+    ],
+)
+def test_parse_proposal_error(proposal):
+    """Testing malformed proposals"""
+    with pytest.raises(ValueError):
+        parse_proposal(proposal)
+
+
+def test_cipher_negotiator():
+    """Testing the negotiation cache"""
+    negotiator = CipherNegotiator({"AES": [128, 256], "Blowfish": [112, 224]}, cache_size=2)
+    proposal = "ProposedCiphers:AES:[128, 192, 256],Blowfish:[112,224,448],DES:[56]"
+    for _ in range(3):
+        assert negotiator.select(proposal) == ("AES", 256)
+    for _ in range(2):
+        with pytest.raises(ValueError) as err:
+            negotiator.select("ProposedCiphers:DES:[56]")
+        assert str(err.value) == "Could not agree on a cipher"
+    assert (negotiator.hits, negotiator.misses) == (3, 2)
+    # The least recently seen proposal is evicted
+    negotiator.select("ProposedCiphers:Blowfish:[112]")
+    negotiator.select(proposal)
+    assert (negotiator.hits, negotiator.misses) == (3, 4)
+
+
+def test_negotiator_not_cached():
+    """Testing that malformed and oversized proposals are not remembered"""
+    negotiator = CipherNegotiator({"AES": [128, 256]})
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            negotiator.select("ProposedCiphers:AES:[abc]")
+    padded = "ProposedCiphers:AES:[" + "128, " * 1000 + "256]"
+    for _ in range(2):
+        assert negotiator.select(padded) == ("AES", 256)
+    assert (negotiator.hits, negotiator.misses) == (0, 4)
+    assert not negotiator._cache
+
+
+def test_handle_client():
+    """Testing the asyncio server with concurrent clients"""
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        write_frame(writer, PROPOSAL, b"ProposedCiphers:AES:[128,256],DES:[56]")
+        frame = await read_frame_async(reader)
+        assert frame == (CHOSEN_CIPHER, b"ChosenCipher:AES,256")
+        client_diffiehellman = DiffieHellman(key_length=256)
+        client_diffiehellman.generate_public_key()
+        write_frame(writer, DHMKE, f"DHMKE:{client_diffiehellman.public_key}".encode())
+        dhm_in = expect(await read_frame_async(reader), DHMKE).decode("utf-8")
+        client_diffiehellman.generate_shared_secret(int(dhm_in.split(":")[1]))
+        assert await read_frame_async(reader) == (TICKET, b"")
+        record = RecordLayer(*get_key_and_iv(client_diffiehellman.shared_key, "AES", 256))
+        write_frame(writer, DATA, bytes(record.seal(b"hello")))
+        assert await read_frame_async(reader) == (DATA, b"Server says: olleh")
+        writer.close()
+
+    async def run(dh_pool):
+        server = await asyncio.start_server(
+            partial(handle_client, verbose=False, dh_pool=dh_pool), "127.0.0.1", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            await asyncio.gather(*(client(port) for _ in range(3)))
+
+    # Two pooled key pairs and one generated on demand
+    dh_pool = DHKeyPool([256], low=0, high=2)
+    while dh_pool.available(256) < 2:
+        time.sleep(0.01)
+    asyncio.run(run(dh_pool))
+    dh_pool.close()
+    assert (dh_pool.hits, dh_pool.misses) == (2, 1)
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_negotiation.py"])
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""
+Testing pipelined message sending
+"""
+
+import asyncio
+import threading
+from functools import partial
+from socket import SHUT_RDWR
+import pytest
+from src.projects.vpn import client
+from src.projects.vpn.pipeline import Pipeline
+from src.projects.vpn.server import handle_client
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Run the server in a background event loop and point the client at it"""
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        asyncio.start_server(partial(handle_client, verbose=False), "127.0.0.1", 0)
+    )
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    monkeypatch.setattr(client, "HOST", "127.0.0.1")
+    monkeypatch.setattr(client, "PORT", server.sockets[0].getsockname()[1])
+    yield server
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    server.close()
+    loop.close()
+
+
+def test_pipeline(server):
+    """Testing many in-flight messages"""
+    sckt, frames, record, _ = client.connect()
+    messages = [f"message {i}".encode() for i in range(500)] + [b"", b"x" * 100000]
+    # The record of an empty message with sequence number 256 ends in a NUL byte
+    messages[256] = b""
+    with Pipeline(sckt, frames, record, max_in_flight=64) as pipeline:
+        replies = [pipeline.submit(message) for message in messages]
+        assert pipeline.send(b"last") == b"Server says: tsal"
+    for message, reply in zip(messages, replies):
+        assert reply.result() == b"Server says: " + message[::-1]
+    assert pipeline.messages == len(messages) + 1
+    # Small messages were coalesced
+    assert pipeline.writes < pipeline.messages
+
+
+def test_pipeline_no_window(server):
+    """Testing that every message is written on its own without a window"""
+    sckt, frames, record, _ = client.connect()
+    with Pipeline(sckt, frames, record, window=0) as pipeline:
+        for i in range(10):
+            assert pipeline.send(str(i).encode()) == f"Server says: {i}".encode()
+    assert pipeline.writes == pipeline.messages == 10
+
+
+def test_pipeline_closed(server):
+    """Testing messages submitted after the connection failed"""
+    sckt, frames, record, _ = client.connect()
+    pipeline = Pipeline(sckt, frames, record)
+    server.close()
+    sckt.shutdown(SHUT_RDWR)
+    pipeline.close()
+    with pytest.raises(ConnectionError):
+        pipeline.submit(b"hello")
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_pipeline.py"])
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""
+Testing the pre-fork mode of the VPN server
+"""
+
+import os
+import signal
+import socket
+import threading
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+import pytest
+from src.projects.vpn import client
+from src.projects.vpn import prefork
+from src.projects.vpn.prefork import Supervisor
+from src.projects.vpn.tickets import SessionTickets
+
+
+def free_port():
+    """Find a port no one listens on"""
+    with socket.socket() as sckt:
+        sckt.bind(("127.0.0.1", 0))
+        return sckt.getsockname()[1]
+
+
+def wait_for(condition, timeout=30):
+    """Wait until `condition()` is true"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_shared_secret():
+    """Testing that processes sharing a secret open each other's tickets"""
+    secret = os.urandom(32)
+    ticket = SessionTickets(secret=secret).issue("AES", 256, "abc")
+    assert SessionTickets().redeem(ticket) is None
+    other = SessionTickets(secret=secret)
+    assert other.redeem(ticket) == ("AES", 256, "abc")
+    assert other.redeem(ticket) is None
+
+
+def test_worker_ticket_lifetime(monkeypatch):
+    """Testing that tickets shared between workers expire after the short pre-fork lifetime"""
+    secret = os.urandom(32)
+    issuer = SessionTickets(lifetime=prefork.TICKET_LIFETIME, secret=secret)
+    ticket = issuer.issue("AES", 256, "abc")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + prefork.TICKET_LIFETIME + 1)
+    assert SessionTickets(lifetime=prefork.TICKET_LIFETIME, secret=secret).redeem(ticket) is None
+
+
+def test_supervisor(monkeypatch):
+    """Testing workers sharing a port, stats aggregation, and restarts"""
+    port = free_port()
+    monkeypatch.setattr(client, "HOST", "127.0.0.1")
+    monkeypatch.setattr(client, "PORT", port)
+    supervisor = Supervisor(2, "127.0.0.1", port, stats_interval=0.1, verbose=False)
+    supervisor.start()
+    try:
+        wait_for(lambda: supervisor.stats()["connections"] == 0 and len(supervisor._latest) == 2)
+        sckt, frames, record, session = client.connect()
+        client.send_frame(sckt, client.DATA, record.seal(b"hello"))
+        assert frames.read_frame() == (client.DATA, b"Server says: olleh")
+        sckt.close()
+        wait_for(lambda: supervisor.stats()["messages"] == 1)
+
+        pids = supervisor.pids()
+        os.kill(pids[0], signal.SIGKILL)
+        wait_for(lambda: (supervisor.check(), supervisor.pids()[0] != pids[0])[1])
+        assert supervisor.restarts == 1
+        assert supervisor.pids()[1] == pids[1]
+
+        # Counters of the killed worker are kept, and any worker resumes the session
+        sckt, _, _, _ = client.connect(session)
+        sckt.close()
+        wait_for(lambda: supervisor.stats()["connections"] == 2)
+        stats = supervisor.stats()
+        assert (stats["handshakes"], stats["resumptions"], stats["messages"]) == (1, 1, 1)
+    finally:
+        supervisor.stop()
+    assert supervisor.status_line().startswith("0/2 workers, 1 restarts")
+
+
+def test_supervisor_metrics(monkeypatch):
+    """Testing the metrics endpoint, served by a process so the supervisor forks thread-free"""
+    port, metrics_port = free_port(), free_port()
+    monkeypatch.setattr(client, "HOST", "127.0.0.1")
+    monkeypatch.setattr(client, "PORT", port)
+    supervisor = Supervisor(
+        1, "127.0.0.1", port, stats_interval=0.1, verbose=False, metrics_port=metrics_port
+    )
+    threads = threading.active_count()
+    supervisor.start()
+
+    def scrape():
+        try:
+            with urlopen(f"http://127.0.0.1:{metrics_port}/metrics") as response:
+                return response.read().decode("utf-8")
+        except URLError:
+            return ""
+
+    try:
+        assert threading.active_count() == threads
+        wait_for(lambda: supervisor.stats()["connections"] == 0 and len(supervisor._latest) == 1)
+        sckt, _, _, _ = client.connect()
+        sckt.close()
+        wait_for(lambda: (supervisor.check(), "vpn_handshakes_total 1\n" in scrape())[1])
+
+        # A dead endpoint is restarted with the next check
+        os.kill(supervisor._metrics_process.pid, signal.SIGKILL)
+        supervisor._metrics_process.join()
+        wait_for(lambda: (supervisor.check(), "vpn_handshakes_total 1\n" in scrape())[1])
+        assert threading.active_count() == threads
+    finally:
+        supervisor.stop()
+    assert not supervisor._metrics_process.is_alive()
+
+
+def test_supervisor_port():
+    """Testing that workers cannot share an ephemeral port"""
+    with pytest.raises(ValueError):
+        Supervisor(2, "127.0.0.1", 0)
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_prefork.py"])
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""
+Testing the VPN record layer
+"""
+
+
+import pytest
+from Crypto.Cipher import AES, Blowfish, DES
+from Crypto.Hash import SHA256, HMAC
+from src.projects.vpn.client import encrypt_message
+from src.projects.vpn.client import get_key_and_iv
+from src.projects.vpn.record import HMAC_SIZE, TAG_SIZE, RecordLayer, padded_length, split_record
+from src.projects.vpn.record import GCMRecordLayer, new_record_layer
+from src.projects.vpn.server import read_message, validate_hmac
+
+KEY = b"49094793659111181547021843208480"
+IV = b"7a0b2d6c4f8e9a1d"
+
+
+@pytest.mark.parametrize(
+    "length, padded",
+    [(0, 0), (1, 16), (15, 16), (16, 16), (17, 32)],
+)
+def test_padded_length(length, padded):
+    """Testing the padded length"""
+    assert padded_length(length) == padded
+
+
+def test_seal_open():
+    """Testing records in both directions"""
+    client_side = RecordLayer(AES, KEY, IV, initiator=True)
+    server_side = RecordLayer(AES, KEY, IV, initiator=False)
+    sealed = []
+    messages = [b"hello", b"", b"x" * 16, "ünïcode".encode("utf-8"), b"ends\x00\x00", b"hello"]
+    for message in messages:
+        record = bytes(client_side.seal(message))
+        # IV, always at least one byte of padding, HMAC
+        assert len(record) == 16 + (len(message) // 16 + 1) * 16 + HMAC_SIZE
+        # A fresh IV for every record, even for the same message
+        assert record[:16] not in [previous[:16] for previous in sealed]
+        sealed.append(record)
+        assert bytes(server_side.open(record)) == message
+    reply = bytes(server_side.seal(b"olleh\x00"))
+    assert bytes(client_side.open(reply)) == b"olleh\x00"
+
+
+def test_blowfish_des():
+    """Testing ciphers with 8-byte blocks and other key sizes"""
+    for cipher, key in ((DES, KEY[:8]), (Blowfish, (KEY * 2)[:56])):
+        sender = RecordLayer(cipher, key, IV[:8], initiator=True)
+        receiver = RecordLayer(cipher, key, IV[:8], initiator=False)
+        record = bytes(sender.seal(b"\x00" * 9))
+        assert len(record) == 8 + 16 + HMAC_SIZE
+        assert bytes(receiver.open(record)) == b"\x00" * 9
+
+
+def test_legacy_functions():
+    """Testing that the functions of vpn.md still agree with each other"""
+    crypto = DES.new(KEY[:8], DES.MODE_CBC, IV[:8])
+    hashing = HMAC.new(KEY[:8], digestmod=SHA256)
+    decrypto = DES.new(KEY[:8], DES.MODE_CBC, IV[:8])
+    for message in ["first message", "second"]:
+        ciphertext, hmac = encrypt_message(message, crypto, hashing)
+        sealed = ciphertext + hmac.encode("ascii")
+        assert split_record(sealed) == (ciphertext, hmac.encode("ascii"))
+        assert validate_hmac(sealed, hmac, HMAC.new(KEY[:8], digestmod=SHA256))
+        assert read_message(sealed, decrypto) == (message, hmac)
+
+
+def test_large_message():
+    """Testing messages larger than the initial buffers"""
+    sender = RecordLayer(AES, KEY, IV, size=64, initiator=True)
+    receiver = RecordLayer(AES, KEY, IV, size=64, initiator=False)
+    message = bytes(range(256)) * 100
+    assert bytes(receiver.open(sender.seal(message))) == message
+
+
+@pytest.mark.parametrize(
+    "tamper",
+    [
+        lambda record: bytes([record[0] ^ 1]) + record[1:],
+        lambda record: record[:20] + bytes([record[20] ^ 1]) + record[21:],
+        lambda record: record[:-1] + b"0",
+        lambda record: record[1:],
+    ],
+)
+def test_open_err(tamper):
+    """Testing tampered records"""
+    record = bytes(RecordLayer(AES, KEY, IV, initiator=True).seal(b"hello"))
+    receiver = RecordLayer(AES, KEY, IV, initiator=False)
+    with pytest.raises(ValueError):
+        receiver.open(tamper(record))
+    # The rejected record did not disturb the receiver's state
+    assert bytes(receiver.open(record)) == b"hello"
+
+
+def test_open_replayed_reordered_reflected():
+    """Testing that records only open once, in order, and in their direction"""
+    sender = RecordLayer(AES, KEY, IV, initiator=True)
+    first, second = bytes(sender.seal(b"first")), bytes(sender.seal(b"second"))
+    receiver = RecordLayer(AES, KEY, IV, initiator=False)
+    with pytest.raises(ValueError):
+        receiver.open(second)
+    assert bytes(receiver.open(first)) == b"first"
+    with pytest.raises(ValueError):
+        receiver.open(first)
+    assert bytes(receiver.open(second)) == b"second"
+    # Reflected back to its sender, the direction keys do not match
+    with pytest.raises(ValueError):
+        RecordLayer(AES, KEY, IV, initiator=True).open(first)
+
+
+def test_gcm_seal_open():
+    """Testing AES-GCM records in both directions"""
+    shared_key = "0123456789abcdef" * 4
+    client_side = new_record_layer("AES-GCM", *get_key_and_iv(shared_key, "AES-GCM", 256), True)
+    server_side = new_record_layer("AES-GCM", *get_key_and_iv(shared_key, "AES-GCM", 256), False)
+    assert isinstance(client_side, GCMRecordLayer)
+    sealed = []
+    for message in [b"hello", b"", b"\x00" * 20, b"hello"]:
+        record = bytes(client_side.seal(message))
+        # No padding, and a fresh nonce for every record
+        assert len(record) == len(message) + TAG_SIZE
+        assert record not in sealed
+        sealed.append(record)
+        assert bytes(server_side.open(record)) == message
+    reply = bytes(server_side.seal(b"olleh"))
+    assert bytes(client_side.open(reply)) == b"olleh"
+
+
+def test_gcm_open_err():
+    """Testing tampered, replayed, and reflected AES-GCM records"""
+    key, iv = KEY, IV
+    sender = GCMRecordLayer(key, iv, initiator=True)
+    receiver = GCMRecordLayer(key, iv, initiator=False)
+    record = bytes(sender.seal(b"hello"))
+    with pytest.raises(ValueError):
+        receiver.open(bytes([record[0] ^ 1]) + record[1:])
+    with pytest.raises(ValueError):
+        receiver.open(record[: TAG_SIZE - 1])
+    # Reflected back to its sender, the direction bit does not match
+    with pytest.raises(ValueError):
+        GCMRecordLayer(key, iv, initiator=True).open(record)
+    assert bytes(receiver.open(record)) == b"hello"
+    # Replayed, the counter has moved on
+    with pytest.raises(ValueError):
+        receiver.open(record)
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_record.py"])
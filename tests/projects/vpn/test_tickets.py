@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+"""
+Testing VPN session resumption
+"""
+
+import asyncio
+import threading
+import time
+from functools import partial
+import pytest
+from src.projects.vpn import client
+from src.projects.vpn.server import handle_client
+from src.projects.vpn.tickets import SessionTickets, derive_session_key
+
+
+def test_issue_and_redeem():
+    """Testing that a ticket can be used exactly once"""
+    tickets = SessionTickets()
+    ticket = tickets.issue("AES", 256, "2e97c59d79d1b148")
+    assert len(tickets) == 1
+    assert tickets.redeem(ticket) == ("AES", 256, "2e97c59d79d1b148")
+    assert tickets.redeem(ticket) is None
+    assert len(tickets) == 0
+
+
+def test_forged_ticket():
+    """Testing tampered and foreign tickets"""
+    tickets = SessionTickets()
+    ticket = bytearray(tickets.issue("AES", 256, "2e97c59d79d1b148"))
+    ticket[-1] ^= 1
+    assert tickets.redeem(bytes(ticket)) is None
+    assert tickets.redeem(b"short") is None
+    assert SessionTickets().redeem(tickets.issue("DES", 56, "1234")) is None
+
+
+def test_rotation():
+    """Testing that tickets survive key rotation until they expire"""
+    tickets = SessionTickets(lifetime=0.2, rotation_interval=0)
+    old = tickets.issue("AES", 128, "abc")
+    tickets.rotate()
+    assert tickets.redeem(old) == ("AES", 128, "abc")
+    expired = tickets.issue("AES", 128, "abc")
+    time.sleep(0.3)
+    tickets.rotate()
+    assert tickets.redeem(expired) is None
+
+
+def test_lru_eviction():
+    """Testing the bounded session cache"""
+    tickets = SessionTickets(cache_size=2)
+    issued = [tickets.issue("AES", 256, str(i)) for i in range(3)]
+    assert len(tickets) == 2
+    assert tickets.redeem(issued[0]) is None
+    assert tickets.redeem(issued[2]) == ("AES", 256, "2")
+
+
+def test_derive_session_key():
+    """Testing that nonces change the resumed key"""
+    key = derive_session_key("abc", b"\x00" * 16, b"\x01" * 16)
+    assert len(key) == 64
+    assert key == derive_session_key("abc", b"\x00" * 16, b"\x01" * 16)
+    assert key != derive_session_key("abc", b"\x00" * 16, b"\x02" * 16)
+
+
+def test_resume(monkeypatch):
+    """Testing a reconnecting client against the server"""
+    loop = asyncio.new_event_loop()
+    tickets = SessionTickets()
+    server = loop.run_until_complete(
+        asyncio.start_server(
+            partial(handle_client, verbose=False, tickets=tickets), "127.0.0.1", 0
+        )
+    )
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    monkeypatch.setattr(client, "HOST", "127.0.0.1")
+    monkeypatch.setattr(client, "PORT", server.sockets[0].getsockname()[1])
+    try:
+        sckt, _, _, first = client.connect()
+        sckt.close()
+        sckt, frames, record, second = client.connect(first)
+        client.send_frame(sckt, client.DATA, record.seal(b"hello"))
+        assert frames.read_frame() == (client.DATA, b"Server says: olleh")
+        sckt.close()
+        assert second[1:3] == first[1:3]
+        assert second[3] != first[3]
+        # The first ticket has been used up, so the server runs the full handshake
+        sckt, _, _, third = client.connect(first)
+        sckt.close()
+        assert third[1:3] == first[1:3]
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        server.close()
+        loop.close()
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_tickets.py"])
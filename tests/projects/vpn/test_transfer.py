@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+"""
+Testing file transfer over the VPN
+"""
+
+import asyncio
+import os
+import threading
+import time
+from functools import partial
+import pytest
+from src.projects.vpn import client, transfer
+from src.projects.vpn.framing import DATA, FILE_OFFER, FILE_CHUNK, expect, send_frame
+from src.projects.vpn.server import handle_client
+from src.projects.vpn.transfer import parse_file_offer, generate_file_offer, send_file
+
+
+async def cancel_tasks():
+    """Cancel every other task of the running loop and wait for them"""
+    tasks = asyncio.all_tasks() - {asyncio.current_task()}
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """Run the server in a background event loop and point the client at it"""
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        asyncio.start_server(
+            partial(handle_client, verbose=False, upload_dir=str(tmp_path / "uploads")),
+            "127.0.0.1",
+            0,
+        )
+    )
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    monkeypatch.setattr(client, "HOST", "127.0.0.1")
+    monkeypatch.setattr(client, "PORT", server.sockets[0].getsockname()[1])
+    yield tmp_path / "uploads"
+    # Clients still being served are cancelled while the loop can close their streams
+    asyncio.run_coroutine_threadsafe(cancel_tasks(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    server.close()
+    loop.close()
+
+
+@pytest.fixture
+def slow_disk(monkeypatch):
+    """Server files whose writes wait for the test, as (writing, released) events"""
+    writing = threading.Event()
+    released = threading.Event()
+    open_partial = transfer._open_partial
+
+    class SlowFile:
+        """File whose writes wait until the test releases them"""
+
+        def __init__(self, target):
+            self.target = target
+
+        def write(self, data):
+            writing.set()
+            released.wait(10)
+            return self.target.write(data)
+
+        def __getattr__(self, name):
+            return getattr(self.target, name)
+
+    def slow_open_partial(*args):
+        target, offset = open_partial(*args)
+        return SlowFile(target), offset
+
+    monkeypatch.setattr(transfer, "_open_partial", slow_open_partial)
+    yield writing, released
+    released.set()
+
+
+@pytest.mark.parametrize(
+    "msg, name, size",
+    [
+        ("FileOffer:notes.txt:10", "notes.txt", 10),
+        ("FileOffer:a:b.bin:0", "a:b.bin", 0),
+        ("FileOffer:../../etc/passwd:5", "passwd", 5),
+    ],
+)
+def test_parse_file_offer(msg, name, size):
+    """Testing file offer parsing"""
+    assert parse_file_offer(msg) == (name, size)
+
+
+@pytest.mark.parametrize("msg", ["FileOffer:..:5", "FileOffer:dir/:5", "Offer:a:5"])
+def test_parse_file_offer_err(msg):
+    """Testing bad file offers"""
+    with pytest.raises(ValueError):
+        parse_file_offer(msg)
+
+
+@pytest.mark.parametrize("size", [0, 1000, 64 * 1024, 200 * 1024 + 7])
+def test_send_file(upload_dir, tmp_path, size):
+    """Testing uploads, including binary data ending with zero bytes"""
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(size)[:-16] + bytes(min(size, 16)))
+    sckt, frames, record, _ = client.connect()
+    assert send_file(sckt, frames, record, str(source), chunk_size=16 * 1024, depth=2) == size
+    sckt.close()
+    assert (upload_dir / "source.bin").read_bytes() == source.read_bytes()
+
+
+def test_send_file_resume(upload_dir, tmp_path):
+    """Testing that an interrupted upload continues at the server's offset"""
+    data = os.urandom(100000)
+    source = tmp_path / "source.bin"
+    source.write_bytes(data)
+    upload_dir.mkdir()
+    (upload_dir / "source.bin.part").write_bytes(data[:30000])
+    sckt, frames, record, _ = client.connect()
+    assert send_file(sckt, frames, record, str(source)) == 70000
+    sckt.close()
+    assert (upload_dir / "source.bin").read_bytes() == data
+    assert not (upload_dir / "source.bin.part").exists()
+
+
+def test_send_file_interrupted(upload_dir, tmp_path):
+    """Testing that the partial upload is kept when the client disconnects"""
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(1000))
+    sckt, frames, record, _ = client.connect()
+    offer = generate_file_offer("source.bin", 5000).encode()
+    send_frame(sckt, FILE_OFFER, record.seal(offer))
+    frames.read_frame()
+    send_frame(sckt, FILE_CHUNK, record.seal(source.read_bytes()[:992]))
+    sckt.close()
+    partial_file = upload_dir / "source.bin.part"
+    deadline = time.monotonic() + 10
+    while not partial_file.exists() or partial_file.stat().st_size < 992:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert partial_file.read_bytes() == source.read_bytes()[:992]
+
+
+def test_slow_disk(upload_dir, tmp_path, slow_disk):
+    """Testing that other clients are served while an upload waits for the disk"""
+    writing, released = slow_disk
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(100000))
+    sckt, frames, record, _ = client.connect()
+    uploader = threading.Thread(target=send_file, args=(sckt, frames, record, str(source)))
+    uploader.start()
+    assert writing.wait(10)
+    # The upload is stuck in a write, the loop still answers another client
+    other, other_frames, other_record, _ = client.connect()
+    send_frame(other, DATA, other_record.seal(b"hello"))
+    assert bytes(expect(other_frames.read_frame(), DATA)) == b"Server says: olleh"
+    other.close()
+    assert uploader.is_alive()
+    released.set()
+    uploader.join(10)
+    sckt.close()
+    assert (upload_dir / "source.bin").read_bytes() == source.read_bytes()
+
+
+def test_concurrent_offer(upload_dir, tmp_path, slow_disk):
+    """Testing that a second upload of the same name is refused while the first runs"""
+    writing, released = slow_disk
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(100000))
+    sckt, frames, record, _ = client.connect()
+    uploader = threading.Thread(target=send_file, args=(sckt, frames, record, str(source)))
+    uploader.start()
+    assert writing.wait(10)
+    other, other_frames, other_record, _ = client.connect()
+    with pytest.raises(ValueError) as err:
+        send_file(other, other_frames, other_record, str(source))
+    assert "being uploaded" in str(err.value)
+    other.close()
+    released.set()
+    uploader.join(10)
+    sckt.close()
+    assert (upload_dir / "source.bin").read_bytes() == source.read_bytes()
+    # Once the first upload is done the name is free again
+    sckt, frames, record, _ = client.connect()
+    assert send_file(sckt, frames, record, str(source)) == 100000
+    sckt.close()
+
+
+@pytest.mark.skipif(transfer.fcntl is None, reason="flock is not available")
+def test_partial_lock(tmp_path):
+    """Testing that the lock also holds for another open file, as in another worker"""
+    target, offset = transfer._open_partial(str(tmp_path), "a.bin", 10)
+    assert offset == 0
+    target.write(b"abc")
+    target.flush()
+    with pytest.raises(BlockingIOError):
+        transfer._open_partial(str(tmp_path), "a.bin", 10)
+    transfer._finish_partial(target, str(tmp_path / "a.bin"))
+    # A fresh upload of the name starts over instead of appending to the finished file
+    target, offset = transfer._open_partial(str(tmp_path), "a.bin", 10)
+    assert offset == 0
+    transfer._close_partial(target)
+    assert (tmp_path / "a.bin").read_bytes() == b"abc"
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_transfer.py"])